@@ -2,15 +2,22 @@
 
 # Given a bnet.out file produced by cons_all2bnet.py, and a ruleProb.txt file mapping each rule to its probability of
 # firing, this script produces a factorGraph.fg file accepted by LibDAI.
-# ./bnet2fg.py ruleProb.txt 0.99 < named_bnet.out > factorGraph.fg 2> bnet2fg.log
+# ./bnet2fg.py ruleProb.txt 0.99 [gzip | binary] < named_bnet.out > factorGraph.fg 2> bnet2fg.log
+# With the gzip option, the output is compressed. With the binary option, it is instead in the compact binary format of
+# fgfile.py. LibDAI only accepts the uncompressed text, but bp.py, and therefore the inproc engine, accepts all three.
 
+# The network is processed one line at a time, so that, except with the binary option, memory use does not grow with its
+# size. Only summary statistics are logged.
+
+import fgfile
+import io
 import logging
-import math
-import subprocess
 import sys
+import time
 
 ruleProbFileName = sys.argv[1]
 defaultProbability = float(sys.argv[2])
+fmt = sys.argv[3] if len(sys.argv) > 3 else 'text'
 
 logging.basicConfig(level=logging.INFO, \
                     format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s", \
@@ -19,9 +26,6 @@ logging.basicConfig(level=logging.INFO, \
 ########################################################################################################################
 # 1. Accept input
 
-# Read bayesian network
-bnetLines = [ line.strip() for line in sys.stdin ]
-
 # Load rule probabilities
 ruleProbs = [ line.strip().split(': ') for line in open(ruleProbFileName) ]
 ruleProbs = { line[0]: float(line[1]) for line in ruleProbs }
@@ -29,78 +33,42 @@ ruleProbs = { line[0]: float(line[1]) for line in ruleProbs }
 ########################################################################################################################
 # 2. Compute output
 
-# https://staff.fnwi.uva.nl/j.m.mooij/libDAI/doc/fileformats.html
-# It starts with a line containing the number of factors in that graph, followed by an empty line.
-numVars = int(bnetLines[0])
-
-outLines = [ numVars, '' ]
-logging.info(numVars)
-logging.info('')
-print(numVars)
-print('')
-
-factorLines = bnetLines[1:(numVars + 1)]
-assert len(factorLines) == numVars
-for varIndex in range(numVars):
-    outLines = []
-    # Then all factors are specified, using one block for each factor,
-
-    line = factorLines[varIndex]
-    components = [ c.strip() for c in line.split(' ') ]
-
-    factorType = components[0] # '*' or '+'
-    assert factorType == '*' or factorType == '+'
-    ruleName = components[1] if factorType == '*' else None
-    numParents = int(components[2]) if factorType == '*' else int(components[1])
-    parents = [ int(p) for p in components[3:] ] if factorType == '*' else [ int(p) for p in components[2:] ]
-
-    outLines.append('# Factor {0} of {1}. Finished printing {2}% of factors.'.format(varIndex, numVars, 100 * varIndex / numVars))
-    outLines.append('# {0}'.format(line))
-    # Each block describing a factor starts with a line containing the number of variables in that factor.
-    outLines.append(1 + numParents)
-    # The second line contains the labels of these variables, seperated by spaces
-    # (labels are nonnegative integers and to avoid confusion, it is suggested to start counting at 0).
-    factorVars = [ varIndex ] + parents
-    outLines.append(' '.join([ str(v) for v in factorVars ]))
-    # The third line contains the number of possible values of each of these variables, also seperated by spaces.
-    outLines.append(' '.join([ '2' for v in factorVars ]))
-
-    if factorType == '*':
-        # The fourth line contains the number of nonzero entries in the factor table.
-        tableSize = int(math.pow(2, 1 + numParents))
-        nonZeroEntries = int((tableSize / 2) + 1)
-        outLines.append(nonZeroEntries)
-
-        # The rest of the lines contain these nonzero entries;
-        # each line consists of a table index, followed by the value corresponding to that table index.
-        # The most difficult part is getting the indexing right.
-        # The convention that is used is that the left-most variables
-        # cycle through their values the fastest
-        # (similar to MatLab indexing of multidimensional arrays).
-        for i in range(0, tableSize - 2, 2):
-            outLines.append('{0} 1'.format(i))
-
-        probability = ruleProbs[ruleName] if (ruleName != None and ruleName in ruleProbs) else \
-                      1.0 if ruleName == 'Rnarrow' else \
-                      defaultProbability
-
-        outLines.append('{0} {1}'.format(tableSize - 2, 1 - probability))
-        outLines.append('{0} {1}'.format(tableSize - 1, probability))
-    else:
-        # The fourth line contains the number of nonzero entries in the factor table.
-        tableSize = int(math.pow(2, 1 + numParents))
-        nonZeroEntries = int((tableSize / 2))
-        outLines.append(nonZeroEntries)
-
-        outLines.append('0 1')
-        for i in range(3, tableSize, 2):
-            outLines.append('{0} 1'.format(i))
-
-    # where the blocks are seperated by empty lines.
-    outLines.append('')
-
-    # Print.
-    for line in outLines:
-        line = str(line)
-        logging.info(line)
-        if not line.startswith('#'): print(line)
+startTime = time.time()
+numVars = int(sys.stdin.readline())
+logging.info('Producing {0} factors.'.format(numVars))
+
+numConjunctions, numEdges, maxParents, numTableEntries = 0, 0, 0, 0
+defaultedRules = set()
+with io.BufferedWriter(sys.stdout.buffer, buffer_size=1 << 20) as outFile:
+    writer = fgfile.FactorGraphWriter(outFile, numVars, fmt)
+    for varIndex in range(numVars):
+        components = sys.stdin.readline().split()
+        factorType = components[0] # '*' or '+'
+        assert factorType == '*' or factorType == '+'
+        if factorType == '*':
+            ruleName = components[1]
+            parents = [ int(p) for p in components[3:] ]
+            assert len(parents) == int(components[2])
+            if ruleName in ruleProbs: probability = ruleProbs[ruleName]
+            elif ruleName == 'Rnarrow': probability = 1.0
+            else:
+                probability = defaultProbability
+                defaultedRules.add(ruleName)
+            numConjunctions = numConjunctions + 1
+        else:
+            parents = [ int(p) for p in components[2:] ]
+            assert len(parents) == int(components[1])
+            probability = 1.0
+        writer.add(factorType, parents, probability)
+
+        numEdges = numEdges + len(parents)
+        maxParents = max(maxParents, len(parents))
+        numTableEntries = numTableEntries + (1 << len(parents)) + (1 if factorType == '*' else 0)
+    writer.close()
+
+logging.info('Produced {0} conjunctions and {1} disjunctions, with {2} edges in all, in {3:.3f}s.'.format( \
+             numConjunctions, numVars - numConjunctions, numEdges, time.time() - startTime))
+logging.info('Largest factor has {0} parents. Nonzero table entries: {1}.'.format(maxParents, numTableEntries))
+if len(defaultedRules) > 0:
+    logging.info('Rules with default probability {0}: {1}.'.format(defaultProbability, \
+                                                                   ' '.join(sorted(defaultedRules))))
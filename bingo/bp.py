@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+
+# In-process loopy belief propagation over the Bayesian networks produced by cons_all2bnet.py, intended as a drop-in
+# replacement for LibDAI/wrapper.cpp. Every variable v of the network owns exactly one factor, which relates v to its
+# parents u1, ..., un in one of two ways:
+# 1. * (noisy-AND): v is true with probability p if all of u1, ..., un are true, and false otherwise.
+# 2. + (noisy-OR): v is true iff at least one of u1, ..., un is true.
+# The network is held as flat arrays with one entry per (factor, parent) edge, and all messages are updated together in
+# each sweep. Since all variables are binary, every message is stored as the normalized probability of its variable
+# being true.
+
+# To time inference in isolation:
+# ./bingo/bp.py factor-graph.fg tolerance minIters maxIters histLength
+# ./bingo/bp.py named-bnet.out tolerance minIters maxIters histLength new-rule-prob.txt defaultProbability
+
+import copy
+import fgfile
+import gzip
+import io
+import logging
+import sys
+import time
+
+import numpy as np
+
+AND = 0
+OR = 1
+
+########################################################################################################################
+# 1. Network structure
+
+class FactorGraph:
+    def __init__(self, factorTypes, factorProbs, edgeFactors, edgeVars, factorRules=None):
+        self.numVars = len(factorTypes)
+        self.factorRules = factorRules
+        self.factorTypes = np.asarray(factorTypes, dtype=np.int8)
+        self.factorProbs = np.asarray(factorProbs, dtype=np.float64)
+        self.isAnd = self.factorTypes == AND
+
+        # Edges are kept sorted by factor, so that the parents of factor f are
+        # edgeVars[factorOffsets[f]:factorOffsets[f + 1]].
+        edgeFactors = np.asarray(edgeFactors, dtype=np.int64)
+        edgeVars = np.asarray(edgeVars, dtype=np.int64)
+        order = np.argsort(edgeFactors, kind='stable')
+        self.edgeFactors = edgeFactors[order]
+        self.edgeVars = edgeVars[order]
+        self.numEdges = len(self.edgeFactors)
+        self.edgeIsAnd = self.isAnd[self.edgeFactors]
+        self.factorOffsets = np.concatenate(([ 0 ], np.cumsum(np.bincount(self.edgeFactors, minlength=self.numVars))))
+
+        # Similarly, the edges along which variable v is a parent are varEdges[varOffsets[v]:varOffsets[v + 1]].
+        self.varEdges = np.argsort(self.edgeVars, kind='stable')
+        self.varOffsets = np.concatenate(([ 0 ], np.cumsum(np.bincount(self.edgeVars, minlength=self.numVars))))
+
+        self.allVars = np.arange(self.numVars)
+        self.allEdges = np.arange(self.numEdges)
+
+    def withProbabilities(self, factorProbs):
+        # Returns a factor graph with the same structure but different factor probabilities. The structure is shared,
+        # and is never modified by either graph.
+        ans = copy.copy(self)
+        ans.factorProbs = np.asarray(factorProbs, dtype=np.float64)
+        assert ans.factorProbs.shape == self.factorProbs.shape
+        return ans
+
+    def withRuleProbabilities(self, ruleProbs, defaultProbability):
+        # Reassigns the probability of each conjunction from the name of its rule, as loadBayesianNetwork does.
+        assert self.factorRules is not None, 'Rule names are only known for networks read from named-bnet.out'
+        factorProbs = [ 1.0 if ruleName is None else ruleProbability(ruleName, ruleProbs, defaultProbability) \
+                        for ruleName in self.factorRules ]
+        return self.withProbabilities(factorProbs)
+
+def loadFactorGraph(fgFileName):
+    # Reads a factor graph in the LibDAI format, as produced by bnet2fg.py, and recovers the type of each factor from
+    # its table. The file may also be compressed, or in the binary format, see fgfile.py.
+    with open(fgFileName, 'rb') as fgFile:
+        magic = fgFile.peek(len(fgfile.MAGIC))[:len(fgfile.MAGIC)]
+        if magic == fgfile.MAGIC: return loadBinaryFactorGraph(fgFile.read())
+        if magic[:len(fgfile.GZIP_MAGIC)] == fgfile.GZIP_MAGIC: fgFile = gzip.GzipFile(fileobj=fgFile)
+        tokens = [ token for line in io.TextIOWrapper(fgFile) if not line.startswith('#') for token in line.split() ]
+    pos = 0
+    def nextToken():
+        nonlocal pos
+        pos = pos + 1
+        return tokens[pos - 1]
+
+    numFactors = int(nextToken())
+    factorTypes = [ None ] * numFactors
+    factorProbs = [ 1.0 ] * numFactors
+    edgeFactors, edgeVars = [], []
+    for _ in range(numFactors):
+        numFactorVars = int(nextToken())
+        factorVars = [ int(nextToken()) for _ in range(numFactorVars) ]
+        assert all(nextToken() == '2' for _ in range(numFactorVars))
+        numEntries = int(nextToken())
+        entries = {}
+        for _ in range(numEntries):
+            index = int(nextToken())
+            entries[index] = float(nextToken())
+
+        varIndex, parents = factorVars[0], factorVars[1:]
+        assert factorTypes[varIndex] is None, 'Variable {0} is the head of multiple factors'.format(varIndex)
+        tableSize = 1 << numFactorVars
+        if numEntries == tableSize // 2 + 1 and tableSize - 1 in entries:
+            factorTypes[varIndex] = AND
+            factorProbs[varIndex] = entries[tableSize - 1]
+        elif numEntries == tableSize // 2 and entries.get(0) == 1.0:
+            factorTypes[varIndex] = OR
+        else:
+            raise ValueError('Factor of variable {0} is neither a conjunction nor a disjunction'.format(varIndex))
+
+        edgeFactors.extend([ varIndex ] * len(parents))
+        edgeVars.extend(parents)
+
+    assert None not in factorTypes
+    return FactorGraph(factorTypes, factorProbs, edgeFactors, edgeVars)
+
+def loadBinaryFactorGraph(data):
+    numVars, numEdges = fgfile.HEADER.unpack_from(data, len(fgfile.MAGIC))
+    offset = len(fgfile.MAGIC) + fgfile.HEADER.size
+    factorProbs = np.frombuffer(data, dtype='<f8', count=numVars, offset=offset)
+    offset = offset + 8 * numVars
+    offsets = np.frombuffer(data, dtype='<u4', count=numVars + 1, offset=offset).astype(np.int64)
+    offset = offset + 4 * (numVars + 1)
+    edgeVars = np.frombuffer(data, dtype='<u4', count=numEdges, offset=offset)
+    offset = offset + 4 * numEdges
+    factorTypes = np.frombuffer(data, dtype=np.uint8, count=numVars, offset=offset)
+    edgeFactors = np.repeat(np.arange(numVars), np.diff(offsets))
+    return FactorGraph(factorTypes, factorProbs, edgeFactors, edgeVars)
+
+def loadRuleProbabilities(ruleProbFileName):
+    ruleProbs = [ line.strip().split(': ') for line in open(ruleProbFileName) ]
+    return { line[0]: float(line[1]) for line in ruleProbs }
+
+def ruleProbability(ruleName, ruleProbs, defaultProbability):
+    return ruleProbs[ruleName] if ruleName in ruleProbs else \
+           1.0 if ruleName == 'Rnarrow' else \
+           defaultProbability
+
+def loadBayesianNetwork(bnetFileName, ruleProbFileName, defaultProbability):
+    # Reads the named-bnet.out file produced by cons_all2bnet.py directly, assigning probabilities to rules exactly as
+    # bnet2fg.py does.
+    ruleProbs = loadRuleProbabilities(ruleProbFileName)
+
+    with open(bnetFileName) as bnetFile:
+        numVars = int(bnetFile.readline())
+        factorTypes = [ None ] * numVars
+        factorProbs = [ 1.0 ] * numVars
+        factorRules = [ None ] * numVars
+        edgeFactors, edgeVars = [], []
+        for varIndex in range(numVars):
+            components = bnetFile.readline().split()
+            if components[0] == '*':
+                ruleName = components[1]
+                factorTypes[varIndex] = AND
+                factorProbs[varIndex] = ruleProbability(ruleName, ruleProbs, defaultProbability)
+                factorRules[varIndex] = ruleName
+                parents = components[3:]
+            else:
+                assert components[0] == '+'
+                factorTypes[varIndex] = OR
+                parents = components[2:]
+            edgeFactors.extend([ varIndex ] * len(parents))
+            edgeVars.extend([ int(p) for p in parents ])
+
+    return FactorGraph(factorTypes, factorProbs, edgeFactors, edgeVars, factorRules)
+
+########################################################################################################################
+# 2. Message passing
+
+def _logProduct(values, groups, numGroups):
+    # Multiplies the values in each group, returning the logarithm of the product of the non-zero values, together with
+    # the number of zeros. Keeping zeros aside allows products which exclude one member to be recovered exactly.
+    isZero = values <= 0
+    logs = np.log(np.where(isZero, 1.0, values))
+    return np.bincount(groups, weights=logs, minlength=numGroups), \
+           np.bincount(groups, weights=isZero, minlength=numGroups)
+
+def _logValues(values):
+    isZero = values <= 0
+    return np.log(np.where(isZero, 1.0, values)), isZero
+
+def _toProbability(log1, zeros1, log0, zeros0):
+    # Normalizes the message (m0, m1), given as logarithms and zero counts, to m1 / (m0 + m1).
+    ans = 1 / (1 + np.exp(np.clip(log0 - log1, -700, 700)))
+    ans = np.where(zeros1 > 0, 0.0, ans)
+    ans = np.where(zeros0 > 0, 1.0, ans)
+    return np.where((zeros0 > 0) & (zeros1 > 0), 0.5, ans)
+
+def _ratio(m1, m0):
+    total = m0 + m1
+    return np.where(total > 0, m1 / np.where(total > 0, total, 1.0), 0.5)
+
+def _gather(offsets, items):
+    # Concatenates the ranges offsets[i]:offsets[i + 1] for each i in items. Also returns, for each element of the
+    # result, the position in items of the range to which it belongs.
+    starts = offsets[items]
+    counts = offsets[items + 1] - starts
+    groups = np.repeat(np.arange(len(items)), counts)
+    return np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(len(groups)), groups
+
+# The arrays which, together with pending and warm, make up the state of BeliefPropagation.
+STATE = [ 'clamped', 'clampValues', 'outFV', 'outVF', 'edgeFV', 'edgeVF', 'beliefs' ]
+
+class BeliefPropagation:
+    def __init__(self, graph):
+        self.graph = graph
+        self.clamped = np.zeros(graph.numVars, dtype=bool)
+        self.clampValues = np.zeros(graph.numVars)
+        self.pending = [] # Variables observed since the last run of BP
+        self.warm = False # Whether the messages are left over from a previous run of BP
+        self.numIters = None # Number of sweeps of the last run of BP
+        self.stopReason = None # Why the last run of BP stopped: converged, maxIters, stable or deadline
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def reset(self):
+        n, e = self.graph.numVars, self.graph.numEdges
+        self.outFV = np.full(n, 0.5)  # Factor v to its head variable v
+        self.outVF = np.full(n, 0.5)  # Variable v to its own factor
+        self.edgeFV = np.full(e, 0.5) # Factor to parent, along each edge
+        self.edgeVF = np.full(e, 0.5) # Parent to factor, along each edge
+        self.beliefs = np.full(n, 0.5)
+        self._updateVariables(self.graph.allVars, self.graph.allEdges, self.graph.edgeVars)
+
+    def _updateFactors(self, factors, edges, groups):
+        # Recomputes the messages sent by the given factors. edges are the edges of these factors, and groups maps each
+        # edge to the position of its factor in factors.
+        g = self.graph
+        # For conjunctions, the relevant quantity is the probability that all parents are true, and for disjunctions,
+        # the probability that all parents are false.
+        edgeIsAnd = g.edgeIsAnd[edges]
+        vf = self.edgeVF[edges]
+        x = np.where(edgeIsAnd, vf, 1 - vf)
+        logAll, zerosAll = _logProduct(x, groups, len(factors))
+        prodAll = np.where(zerosAll > 0, 0.0, np.exp(logAll))
+        logX, isZeroX = _logValues(x)
+        prodOthers = np.where(zerosAll[groups] - isZeroX > 0, 0.0, np.exp(logAll[groups] - logX))
+
+        p = g.factorProbs[factors]
+        self.outFV[factors] = np.where(g.isAnd[factors], p * prodAll, 1 - prodAll)
+
+        lam, pe = self.outVF[factors][groups], p[groups]
+        andM1 = (1 - lam) * (1 - pe * prodOthers) + lam * pe * prodOthers
+        andM0 = 1 - lam
+        orM1 = lam
+        orM0 = (1 - lam) * prodOthers + lam * (1 - prodOthers)
+        self.edgeFV[edges] = np.where(edgeIsAnd, _ratio(andM1, andM0), _ratio(orM1, orM0))
+
+    def _updateVariables(self, variables, edges, groups):
+        # Recomputes the messages sent and the beliefs of the given variables. edges are the edges along which these
+        # variables are parents, and groups maps each edge to the position of its parent in variables.
+        n = len(variables)
+        fv = self.edgeFV[edges]
+        childLog1, childZeros1 = _logProduct(fv, groups, n)
+        childLog0, childZeros0 = _logProduct(1 - fv, groups, n)
+        ownLog1, ownZero1 = _logValues(self.outFV[variables])
+        ownLog0, ownZero0 = _logValues(1 - self.outFV[variables])
+        log1, zeros1 = childLog1 + ownLog1, childZeros1 + ownZero1
+        log0, zeros0 = childLog0 + ownLog0, childZeros0 + ownZero0
+
+        edgeLog1, edgeZero1 = _logValues(fv)
+        edgeLog0, edgeZero0 = _logValues(1 - fv)
+        outVF = _toProbability(childLog1, childZeros1, childLog0, childZeros0)
+        edgeVF = _toProbability(log1[groups] - edgeLog1, zeros1[groups] - edgeZero1, \
+                                log0[groups] - edgeLog0, zeros0[groups] - edgeZero0)
+        beliefs = _toProbability(log1, zeros1, log0, zeros0)
+
+        clamped, clampValues = self.clamped[variables], self.clampValues[variables]
+        self.outVF[variables] = np.where(clamped, clampValues, outVF)
+        self.edgeVF[edges] = np.where(clamped[groups], clampValues[groups], edgeVF)
+        self.beliefs[variables] = np.where(clamped, clampValues, beliefs)
+
+    def sweep(self):
+        g = self.graph
+        self._updateFactors(g.allVars, g.allEdges, g.edgeFactors)
+        self._updateVariables(g.allVars, g.allEdges, g.edgeVars)
+
+    def earlyStop(self, watch, topK, stableSweeps, deadline):
+        # Returns a function, to be called after every sweep, which returns 'stable' once the order of the topK highest
+        # beliefs among the variables in watch has not changed for stableSweeps sweeps, 'deadline' once deadline
+        # seconds have passed, and None otherwise. Ties are broken by position in watch.
+        startTime = time.perf_counter()
+        watch = np.asarray(watch if watch is not None and stableSweeps is not None else [], dtype=np.int64)
+        last = { 'top': None, 'numStable': 0 }
+        def check():
+            if len(watch) > 0:
+                top = watch[np.argsort(-self.beliefs[watch], kind='stable')[:topK]]
+                if last['top'] is not None and np.array_equal(top, last['top']):
+                    last['numStable'] = last['numStable'] + 1
+                else:
+                    last['numStable'] = 0
+                last['top'] = top
+                if last['numStable'] >= stableSweeps: return 'stable'
+            if deadline is not None and time.perf_counter() - startTime >= deadline: return 'deadline'
+            return None
+        return check
+
+    def propagate(self, tolerance, maxIters, check):
+        # Warm-started BP: starting from the messages of the previous run, only the messages of recently observed
+        # variables are recomputed, and changes are then propagated outwards. A message is only passed on if it changed
+        # by more than tolerance, so propagation stops as soon as all residuals fall under tolerance, or check() asks to
+        # stop early. Returns the fraction of variables which still have pending changes.
+        g = self.graph
+        variables = np.unique(np.asarray(self.pending, dtype=np.int64))
+        self.pending = []
+        numIters = 0
+        self.stopReason = 'maxIters'
+        while len(variables) > 0 and numIters < maxIters:
+            edges, groups = _gather(g.varOffsets, variables)
+            edges = g.varEdges[edges]
+            oldOutVF, oldEdgeVF = self.outVF[variables], self.edgeVF[edges]
+            self._updateVariables(variables, edges, groups)
+            factors = np.unique(np.concatenate((variables[np.abs(self.outVF[variables] - oldOutVF) > tolerance], \
+                                                g.edgeFactors[edges[np.abs(self.edgeVF[edges] - oldEdgeVF) > tolerance]])))
+
+            edges, groups = _gather(g.factorOffsets, factors)
+            oldOutFV, oldEdgeFV = self.outFV[factors], self.edgeFV[edges]
+            self._updateFactors(factors, edges, groups)
+            variables = np.unique(np.concatenate((factors[np.abs(self.outFV[factors] - oldOutFV) > tolerance], \
+                                                  g.edgeVars[edges[np.abs(self.edgeFV[edges] - oldEdgeFV) > tolerance]])))
+            numIters = numIters + 1
+            reason = check()
+            if reason is not None and len(variables) > 0:
+                self.stopReason = reason
+                break
+        if len(variables) == 0: self.stopReason = 'converged'
+
+        if len(variables) > 0:
+            # Bring the beliefs of the variables with pending changes up to date, and leave them for the next run.
+            edges, groups = _gather(g.varOffsets, variables)
+            self._updateVariables(variables, g.varEdges[edges], groups)
+            self.pending = variables.tolist()
+        self.numIters = numIters
+        yetToConvergeFraction = len(variables) / g.numVars if g.numVars > 0 else 0.0
+        logging.info('Incremental BP finished after {0} sweeps ({1}). Yet to converge: {2}.'.format(numIters, \
+                     self.stopReason, yetToConvergeFraction))
+        return yetToConvergeFraction
+
+    ####################################################################################################################
+    # 3. Interface shared with the LibDAI wrapper
+
+    def observe(self, index, value):
+        self.clamped[index] = True
+        self.clampValues[index] = 1.0 if value else 0.0
+        self.pending.append(index)
+
+    def runBP(self, tolerance, minIters, maxIters, histLength, incremental=False, watch=None, topK=1, \
+              stableSweeps=None, deadline=None):
+        # Runs at least minIters and at most maxIters sweeps. A variable has converged once its belief has varied by at
+        # most tolerance over the last histLength sweeps, and BP stops as soon as all variables have converged. Returns
+        # the fraction of variables which have yet to converge.
+        # Rather than the last histLength beliefs, each variable keeps the least and greatest of its beliefs since the
+        # last sweep in which they spread by more than tolerance, and the number of that sweep. The test therefore costs
+        # O(numVars) time per sweep and memory in all, and is slightly stricter than a sliding window: a variable never
+        # counts as converged unless its last histLength beliefs are within tolerance of each other.
+        # If incremental is set and BP has been run before, the previous messages are reused instead, see propagate().
+        # BP may also stop early, even before minIters sweeps, once the topK highest beliefs among the variables in
+        # watch have kept their order for stableSweeps sweeps, or once deadline seconds have passed. The beliefs are
+        # then those of the last sweep. Either way, stopReason records why BP stopped.
+        assert 0 < histLength and histLength < minIters and minIters < maxIters
+        check = self.earlyStop(watch, topK, stableSweeps, deadline)
+        if incremental and self.warm:
+            return self.propagate(tolerance, maxIters, check)
+
+        self.reset()
+        self.pending = []
+        self.warm = True
+        self.numIters = 0
+        self.stopReason = 'converged'
+        if self.graph.numVars == 0: return 0.0
+
+        low, high = None, None
+        lastMoved = np.zeros(self.graph.numVars, dtype=np.int64)
+        yetToConvergeFraction = 1.0
+        self.stopReason = 'maxIters'
+        for numIters in range(maxIters):
+            self.sweep()
+            if low is None:
+                low, high = self.beliefs.copy(), self.beliefs.copy()
+            else:
+                np.minimum(low, self.beliefs, out=low)
+                np.maximum(high, self.beliefs, out=high)
+                moved = high - low > tolerance
+                low[moved] = self.beliefs[moved]
+                high[moved] = self.beliefs[moved]
+                lastMoved[moved] = numIters
+            if numIters + 1 >= minIters:
+                yetToConvergeFraction = np.count_nonzero(numIters - lastMoved < histLength - 1) / self.graph.numVars
+                if yetToConvergeFraction == 0:
+                    self.stopReason = 'converged'
+                    break
+            reason = check()
+            if reason is not None:
+                if numIters + 1 < minIters:
+                    # Measured over the sweeps so far, which may be fewer than histLength.
+                    window = min(numIters + 1, histLength)
+                    yetToConvergeFraction = np.count_nonzero(numIters - lastMoved < window - 1) / self.graph.numVars
+                self.stopReason = reason
+                break
+        self.numIters = numIters + 1
+        logging.info('BP finished after {0} sweeps ({1}). Yet to converge: {2}.'.format(numIters + 1, \
+                     self.stopReason, yetToConvergeFraction))
+        return yetToConvergeFraction
+
+    def marginals(self, indices):
+        return self.beliefs[np.asarray(indices, dtype=np.int64)].tolist()
+
+    def saveState(self, outFile):
+        # Writes the evidence and all messages to the binary file outFile, so that loadState() can continue exactly
+        # where this run left off. Returns True, since unlike the LibDAI wrapper, this engine can do so.
+        for name in STATE: np.save(outFile, getattr(self, name))
+        np.save(outFile, np.asarray(self.pending, dtype=np.int64))
+        np.save(outFile, np.asarray(self.warm))
+        return True
+
+    def loadState(self, inFile):
+        for name in STATE:
+            value = np.load(inFile)
+            assert value.shape == getattr(self, name).shape, 'Saved state does not match the factor graph'
+            setattr(self, name, value)
+        self.pending = np.load(inFile).tolist()
+        self.warm = bool(np.load(inFile))
+
+    def factorMarginal(self, f, i):
+        # Belief of entry i of the table of factor f, using the LibDAI convention that the head variable cycles fastest.
+        g = self.graph
+        parents = slice(g.factorOffsets[f], g.factorOffsets[f + 1])
+        pis = self.edgeVF[parents]
+        lam, p = self.outVF[f], g.factorProbs[f]
+
+        value = i & 1
+        bits = [ (i >> (k + 1)) & 1 for k in range(len(pis)) ]
+        weight = (lam if value else 1 - lam) * np.prod([ pi if b else 1 - pi for pi, b in zip(pis, bits) ])
+        if g.isAnd[f]:
+            allTrue = np.prod(pis)
+            weight = weight * ((p if value else 1 - p) if all(bits) else (0.0 if value else 1.0))
+            z = (1 - lam) * (1 - allTrue) + allTrue * ((1 - lam) * (1 - p) + lam * p)
+        else:
+            allFalse = np.prod(1 - pis)
+            weight = weight * (1.0 if value == any(bits) else 0.0)
+            z = (1 - lam) * allFalse + lam * (1 - allFalse)
+        return float(weight / z) if z > 0 else 0.0
+
+########################################################################################################################
+# 4. Benchmark
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, \
+                        format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s", \
+                        datefmt="%H:%M:%S")
+
+    networkFileName = sys.argv[1]
+    tolerance, minIters, maxIters, histLength = float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+
+    startTime = time.time()
+    if networkFileName.endswith('.fg'):
+        graph = loadFactorGraph(networkFileName)
+    else:
+        graph = loadBayesianNetwork(networkFileName, sys.argv[6], float(sys.argv[7]))
+    logging.info('Loaded {0} variables and {1} edges in {2:.3f}s.'.format(graph.numVars, graph.numEdges, \
+                                                                          time.time() - startTime))
+
+    startTime = time.time()
+    yetToConvergeFraction = BeliefPropagation(graph).runBP(tolerance, minIters, maxIters, histLength)
+    print('{0} {1:.3f}'.format(yetToConvergeFraction, time.time() - startTime))
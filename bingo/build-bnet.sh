@@ -56,31 +56,21 @@ export AUGMENT="noaugment"
        > $PROGRAM_PATH/${BNET}/named_cons_all.txt.pruned \
        2> $PROGRAM_PATH/${BNET}/prune-cons.log
 
-./bingo/derive-edb.py \
-      < $PROGRAM_PATH/${BNET}/named_cons_all.txt.pruned \
-      > $PROGRAM_PATH/${BNET}/named_cons_all.txt.edbderived \
-      2> $PROGRAM_PATH/${BNET}/derive-edb.log
+# Narrowing of wide factors, see build_bnet.py. NARROW_COST is the cost model, "table" or "message", MAX_AND_COST and
+# MAX_OR_COST bound the cost of each conjunction and disjunction under that model, and NARROW_SHAPE is "balanced" or
+# "chain". By default, clauses keep at most 14 antecedents, and tuples at most 9 proving clauses, in balanced trees.
+NARROW_OPTIONS="cost=${NARROW_COST:-table} shape=${NARROW_SHAPE:-balanced}"
+if [ -n "$MAX_AND_COST" ]; then NARROW_OPTIONS="$NARROW_OPTIONS maxand=$MAX_AND_COST"; fi
+if [ -n "$MAX_OR_COST" ]; then NARROW_OPTIONS="$NARROW_OPTIONS maxor=$MAX_OR_COST"; fi
 
-./bingo/elide-edb.py \
-      < $PROGRAM_PATH/${BNET}/named_cons_all.txt.edbderived \
-      > $PROGRAM_PATH/${BNET}/named_cons_all.txt.ep \
-      2> $PROGRAM_PATH/${BNET}/elide-edb.log
-
-./bingo/compress-cons-all.py \
-      $PROGRAM_PATH/${BNET}/named_cons_all.txt.ep \
+# derive-edb.py, elide-edb.py, compress-cons-all.py, cons_all2bnet.py and bnet2fg.py, run in a single process. Further
+# options to build_bnet.py (e.g. "intermediate", to also print the constraints after each stage) may be passed in the
+# environment variable BUILD_BNET_OPTIONS.
+./bingo/build_bnet.py $PROGRAM_PATH/${BNET}/named_cons_all.txt.pruned \
       $RULE_PROB_FILENAME \
       0.99 \
       $OP_TUPLE_FILENAME \
-      $PROGRAM_PATH/${BNET}/new-rule-prob.txt \
-      $PROGRAM_PATH/${BNET}/named_cons_all.txt.cep \
-      2> $PROGRAM_PATH/${BNET}/compress-cons-all.log
-
-./bingo/cons_all2bnet.py $PROGRAM_PATH/${BNET}/bnet-dict.out narrowand narrowor \
-      < $PROGRAM_PATH/${BNET}/named_cons_all.txt.cep \
-      > $PROGRAM_PATH/${BNET}/named-bnet.out \
-      2> $PROGRAM_PATH/${BNET}/cons_all2bnet.log
-
-./bingo/bnet2fg.py $PROGRAM_PATH/${BNET}/new-rule-prob.txt 0.99 \
-    < $PROGRAM_PATH/${BNET}/named-bnet.out \
-    > $PROGRAM_PATH/${BNET}/factor-graph.fg \
-    2> $PROGRAM_PATH/${BNET}/bnet2fg.log
+      $PROGRAM_PATH/${BNET} \
+      $NARROW_OPTIONS \
+      $BUILD_BNET_OPTIONS \
+      2> $PROGRAM_PATH/${BNET}/build_bnet.log
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+
+# Builds the Bayesian network from the pruned constraints in a single process. This performs, in order, the work of
+# derive-edb.py, elide-edb.py, compress-cons-all.py, cons_all2bnet.py (with narrowand and narrowor) and bnet2fg.py, but
+# parses the constraints only once, and passes them from one stage to the next in memory instead of through
+# intermediate files.
+
+# ./bingo/build_bnet.py named_cons_all.txt.pruned rule-prob.txt defaultProbability base_queries.txt outDir \
+#                       [intermediate] [binary] [fg=gzip | fg=binary] \
+#                       [cost=table | cost=message] [maxand=c] [maxor=c] [shape=balanced | shape=chain]
+# Produces new-rule-prob.txt, bnet-dict.out, named-bnet.out and factor-graph.fg in outDir, exactly as the separate
+# scripts would, up to the numbering of nodes and the names of the rules introduced by compression. With the
+# intermediate option, the constraints are also printed after each stage, to named_cons_all.txt.edbderived,
+# named_cons_all.txt.ep and named_cons_all.txt.cep in outDir, for debugging, or with the binary option, in the binary
+# format of clausefile.py. The constraints may themselves be given in either format. As with compress-cons-all.py, the
+# probability of the Repsilon and Rneps rules is taken from the environment variable EPS. The fg option selects another
+# format of factor-graph.fg, as with bnet2fg.py. The remaining options control narrowing, as described below: maxand and
+# maxor bound the cost of each conjunction and disjunction under the chosen cost model, and shape chooses between
+# balanced trees of new tuples, with fewer levels, and chains, with fewer new tuples. The resulting distribution of
+# factor widths is reported in the log.
+
+# The stages may also be run from other scripts:
+# clauses = build_bnet.ClauseGraph('named_cons_all.txt.pruned')
+# clauses.deriveEdb()
+# ...
+
+import clausefile
+import fgfile
+import logging
+import os
+import sys
+import time
+
+# Narrowing. Under the 'table' cost model, a factor with n parents costs the 2^(n + 1) entries of its table in
+# factor-graph.fg, and under the 'message' model, the (n + 1) 2^(n + 1) steps LibDAI takes to compute its n + 1 outgoing
+# messages from that table. Clauses with too many antecedents, and tuples with too many proving clauses, are split
+# through new tuples until no factor costs more than a given maximum. By default, clauses are left with at most
+# MAX_ANTECEDENTS antecedents, and tuples with at most MAX_DISJUNCTS proving clauses.
+
+FACTOR_COSTS = { 'table': lambda n: 2 ** (n + 1), 'message': lambda n: (n + 1) * 2 ** (n + 1) }
+MAX_ANTECEDENTS = 14
+MAX_DISJUNCTS = 9
+
+def maxWidth(maxCost, cost):
+    # Returns the largest number of parents of a factor which costs at most maxCost. At least two are needed to narrow.
+    n = 0
+    while FACTOR_COSTS[cost](n + 1) <= maxCost: n = n + 1
+    assert n >= 2, 'No factor with two parents costs at most {0} under the {1} model'.format(maxCost, cost)
+    return n
+
+def parseNarrowOptions(options):
+    # Parses the options "cost=table|message", "maxand=c", "maxor=c" and "shape=balanced|chain", and ignores any others.
+    # Returns the maximum numbers of antecedents and of proving clauses, and the shape of the trees of new tuples.
+    cost, maxAnd, maxOr, shape = 'table', None, None, 'balanced'
+    for option in options:
+        if option.startswith('cost='): cost = option[len('cost='):]
+        elif option.startswith('maxand='): maxAnd = int(option[len('maxand='):])
+        elif option.startswith('maxor='): maxOr = int(option[len('maxor='):])
+        elif option.startswith('shape='): shape = option[len('shape='):]
+    assert cost in FACTOR_COSTS, 'Unexpected cost model {0}'.format(cost)
+    assert shape in [ 'balanced', 'chain' ], 'Unexpected shape {0}'.format(shape)
+    maxAntecedents = MAX_ANTECEDENTS if maxAnd is None else maxWidth(maxAnd, cost)
+    maxDisjuncts = MAX_DISJUNCTS if maxOr is None else maxWidth(maxOr, cost)
+    return maxAntecedents, maxDisjuncts, shape
+
+def logFactorWidths(nodes):
+    # Reports the distribution of the widths of the factors of the nodes returned by ClauseGraph.bayesianNetwork(), and
+    # their total cost under each cost model.
+    histograms = { '*': {}, '+': {} }
+    for factorType, ruleName, parents in nodes:
+        histograms[factorType][len(parents)] = histograms[factorType].get(len(parents), 0) + 1
+    for factorType, name in [ ('*', 'Conjunctions'), ('+', 'Disjunctions') ]:
+        histogram = histograms[factorType]
+        logging.info('{0}: {1} factors. Widths: {2}. Table entries: {3}. Message cost: {4}.'.format(name, \
+                     sum(histogram.values()), \
+                     ' '.join([ '{0}:{1}'.format(n, histogram[n]) for n in sorted(histogram) ]), \
+                     sum([ FACTOR_COSTS['table'](n) * k for n, k in histogram.items() ]), \
+                     sum([ FACTOR_COSTS['message'](n) * k for n, k in histogram.items() ])))
+
+########################################################################################################################
+# 1. Interned clauses
+
+# Each tuple is identified by its index in ClauseGraph.tuples. A literal is 2 * t for the tuple t, and 2 * t + 1 for
+# 'NOT t'. A clause is a Python tuple of literals, the last of which is its consequent, and is mapped to its rule name
+# by ClauseGraph.clauses. As in the separate scripts, identical clauses are merged, and the rule name of the last wins.
+
+def lit2Tuple(literal):
+    return literal >> 1
+
+def clause2Antecedents(clause):
+    return [ literal >> 1 for literal in clause[:-1] ]
+
+def clause2Consequent(clause):
+    consequent = clause[-1]
+    assert consequent & 1 == 0
+    return consequent >> 1
+
+class RuleNames:
+    # The namespace of rule names, shared by the stages which introduce new rules: deriveEdb() and compress(). New rules
+    # are named R0, R1, ..., skipping every name in use, so that each name costs amortized constant time. Narrowing
+    # only introduces the fixed rule Rnarrow, which is never handed out.
+    def __init__(self, ruleNames=()):
+        self.used = set(ruleNames)
+        self.nextIndex = 0
+
+    def __contains__(self, ruleName):
+        return ruleName in self.used
+
+    def add(self, ruleName):
+        self.used.add(ruleName)
+
+    def update(self, ruleNames):
+        self.used.update(ruleNames)
+
+    def allocate(self):
+        while 'R{0}'.format(self.nextIndex) in self.used: self.nextIndex = self.nextIndex + 1
+        ruleName = 'R{0}'.format(self.nextIndex)
+        self.used.add(ruleName)
+        return ruleName
+
+class ClauseGraph:
+    def __init__(self, inFile):
+        # inFile is a file name, or a buffered binary file, holding the constraints in either format of clausefile.py.
+        # A binary file uses the same encoding of literals, which are therefore taken over as they are.
+        if isinstance(inFile, str): inFile = open(inFile, 'rb')
+        self.clauses = {}
+        if clausefile.isBinary(inFile):
+            clauses = clausefile.load(inFile)
+            self.tuples = clauses.tupleStrs()
+            self.tupleIds = None # Only built once new tuples are interned
+            for ruleName, clause in clauses.encodedClauses(): self.clauses[clause] = ruleName
+        else:
+            self.tuples = []
+            self.tupleIds = {}
+            for ruleName, literals in clausefile.readClauses(inFile):
+                self.clauses[tuple([ self.str2Lit(literal) for literal in literals ])] = ruleName
+        self.ruleNames = RuleNames(self.clauses.values())
+        logging.info('Loaded {0} clauses over {1} tuples.'.format(len(self.clauses), len(self.tuples)))
+
+    def intern(self, t):
+        if self.tupleIds is None: self.tupleIds = { t: i for i, t in enumerate(self.tuples) }
+        if t not in self.tupleIds:
+            self.tupleIds[t] = len(self.tuples)
+            self.tuples.append(t)
+        return self.tupleIds[t]
+
+    def str2Lit(self, literal):
+        if literal.startswith('NOT '): return 2 * self.intern(literal[len('NOT '):]) + 1
+        return 2 * self.intern(literal)
+
+    def lit2Str(self, literal):
+        return 'NOT ' + self.tuples[literal >> 1] if literal & 1 else self.tuples[literal >> 1]
+
+    def clause2Str(self, clause):
+        return ', '.join([ self.lit2Str(literal) for literal in clause ])
+
+    def allTuples(self):
+        return { literal >> 1 for clause in self.clauses for literal in clause }
+
+    def allConsequents(self):
+        return { clause2Consequent(clause) for clause in self.clauses }
+
+    def printClauses(self, outFile):
+        for clause, ruleName in self.clauses.items():
+            print('{0}: {1}'.format(ruleName, self.clause2Str(clause)), file=outFile)
+
+    def writeClauses(self, outFile):
+        # As printClauses(), but in the binary format of clausefile.py.
+        clausefile.writeClauses(outFile, [ (ruleName, [ self.lit2Str(literal) for literal in clause ]) \
+                                           for clause, ruleName in self.clauses.items() ])
+
+    def logSummary(self):
+        allTuples = self.allTuples()
+        allConsequents = self.allConsequents()
+        logging.info('{0} clauses, {1} tuples, {2} consequents, {3} input tuples.'.format(len(self.clauses), \
+                     len(allTuples), len(allConsequents), len(allTuples - allConsequents)))
+
+    ####################################################################################################################
+    # 2. Stages
+
+    def deriveEdb(self):
+        # As derive-edb.py: every input tuple of relation r is derived by a new clause, with no antecedents, of a new
+        # rule associated with r. Tuples of the Similar* relations are instead each their own rule. The input tuples
+        # are grouped by relation in one pass, and each relation then takes its rule name, in order of first appearance.
+        derived, used = set(), set()
+        for clause in self.clauses:
+            derived.add(clause[-1] >> 1)
+            used.update(clause)
+        relTuples = {}
+        for t in sorted({ literal >> 1 for literal in used } - derived):
+            tupleStr = self.tuples[t]
+            relName = tupleStr.split('(')[0].strip() if '(' in tupleStr else None
+            relTuples.setdefault(relName, []).append(t)
+
+        for relName, tuples in relTuples.items():
+            if relName is None:
+                logging.info('Leaving {0} tuples underived.'.format(len(tuples)))
+                continue
+            elif relName.startswith('Similar'):
+                logging.info('Associating each of {0} tuples of relation {1} with its own rule.'.format(len(tuples), \
+                             relName))
+                for t in tuples:
+                    self.clauses[(2 * t,)] = self.tuples[t]
+                    self.ruleNames.add(self.tuples[t])
+            else:
+                ruleName = self.ruleNames.allocate()
+                logging.info('Associating relation {0} with rule {1}.'.format(relName, ruleName))
+                for t in tuples: self.clauses[(2 * t,)] = ruleName
+        self.logSummary()
+
+    def elideEdb(self):
+        # As elide-edb.py: drops every literal over a tuple which is not derived by any clause.
+        allConsequents = self.allConsequents()
+        simplifiedClauses = {}
+        for clause, ruleName in self.clauses.items():
+            simplifiedClauses[tuple([ literal for literal in clause if literal >> 1 in allConsequents ])] = ruleName
+        self.clauses = simplifiedClauses
+        self.logSummary()
+
+    def compress(self, ruleProbs, defaultRuleProb, baseQueries, eps=None):
+        # As compress-cons-all.py: eliminates those tuples which are not base queries, and which are derived by exactly
+        # one clause, with antecedents, and used by exactly one clause, by merging the two clauses. Returns the rule
+        # probabilities, including the rules of the merged clauses.
+        ruleProbs = dict(ruleProbs)
+        for ruleName in dict.fromkeys(self.clauses.values()):
+            if ruleName == 'Repsilon' or ruleName == 'Rneps':
+                assert eps is not None, 'The probability of rule {0} is given by the variable EPS'.format(ruleName)
+                ruleProbs[ruleName] = eps if ruleName == 'Repsilon' else 1.0 - eps
+            elif ruleName not in ruleProbs: ruleProbs[ruleName] = defaultRuleProb
+
+        # New rules must not clash with those of the rule probabilities file either, even if they are not in use.
+        self.ruleNames.update(ruleProbs)
+        def makeNewRule(ruleProb):
+            ruleName = self.ruleNames.allocate()
+            ruleProbs[ruleName] = ruleProb
+            return ruleName
+
+        # Each clause c is numbered, and clauseLits[c] is None once it has been merged into another clause, forward[c].
+        # A source clause of a tuple t is a clause with t as its consequent, and a sink clause of t is a clause with t
+        # as one of its antecedents. sources[t] and sinks[t] list their numbers, possibly of clauses since merged away,
+        # and numSources[t] and numSinks[t] count the distinct clauses which remain.
+        clauseLits = list(self.clauses)
+        clauseRules = list(self.clauses.values())
+        clauseIds = { clause: c for c, clause in enumerate(clauseLits) }
+        forward = list(range(len(clauseLits)))
+        sources = [ [] for t in self.tuples ]
+        sinks = [ [] for t in self.tuples ]
+        for c, clause in enumerate(clauseLits):
+            sources[clause2Consequent(clause)].append(c)
+            for t in clause2Antecedents(clause):
+                if len(sinks[t]) == 0 or sinks[t][-1] != c: sinks[t].append(c)
+        numSources = [ len(cs) for cs in sources ]
+        numSinks = [ len(cs) for cs in sinks ]
+
+        def find(c):
+            root = c
+            while forward[root] != root: root = forward[root]
+            while forward[c] != root: forward[c], c = root, forward[c]
+            return root
+
+        def eliminable(t):
+            return numSources[t] == 1 and numSinks[t] == 1 and len(clauseLits[find(sources[t][0])]) != 1 \
+                   and self.tuples[t] not in baseQueries
+
+        def collapse(t):
+            # Follows the sink clauses of t up to the first clause whose consequent is not eliminable, and merges into
+            # it, in one step, every clause it reaches through eliminable antecedents. The antecedents of each merged
+            # clause take the place of the literal it derives. Returns the tuples which may have become eliminable.
+            root = find(sinks[t][0])
+            while eliminable(clause2Consequent(clauseLits[root])):
+                root = find(sinks[clause2Consequent(clauseLits[root])][0])
+
+            members = [ root ]
+            eliminated = set()
+            newLits = []
+            stack = [ iter(clauseLits[root][:-1]) ]
+            while len(stack) > 0:
+                literal = next(stack[-1], None)
+                if literal is None: stack.pop()
+                elif literal & 1 and literal >> 1 in eliminated: pass
+                elif literal & 1 and eliminable(literal >> 1):
+                    eliminated.add(literal >> 1)
+                    members.append(find(sources[literal >> 1][0]))
+                    stack.append(iter(clauseLits[members[-1]][:-1]))
+                else: newLits.append(literal)
+            newClause = tuple(newLits) + clauseLits[root][-1:]
+
+            # Each remaining antecedent now has one sink clause in place of as many members as it occurred in.
+            changed = []
+            newProb = 1.0
+            for c in members:
+                for tp in set(clause2Antecedents(clauseLits[c])) - eliminated: numSinks[tp] = numSinks[tp] - 1
+                newProb = newProb * ruleProbs[clauseRules[c]]
+                del clauseIds[clauseLits[c]]
+                clauseLits[c] = None
+                forward[c] = root
+            for tp in set(clause2Antecedents(newClause)):
+                numSinks[tp] = numSinks[tp] + 1
+                if numSinks[tp] == 1: changed.append(tp)
+            for tp in eliminated:
+                numSources[tp] = 0
+                numSinks[tp] = 0
+
+            # As before, identical clauses are merged, and the rule name of the last wins.
+            if newClause in clauseIds:
+                forward[root] = clauseIds[newClause]
+                root = forward[root]
+                numSources[clause2Consequent(newClause)] = numSources[clause2Consequent(newClause)] - 1
+                for tp in set(clause2Antecedents(newClause)): numSinks[tp] = numSinks[tp] - 1
+                changed.extend(clause2Antecedents(newClause))
+                changed.append(clause2Consequent(newClause))
+            clauseLits[root] = newClause
+            clauseRules[root] = makeNewRule(newProb)
+            clauseIds[newClause] = root
+            return changed
+
+        worklist = [ t for t in range(len(self.tuples)) if eliminable(t) ]
+        logging.info('Discovered {0} eliminable tuples.'.format(len(worklist)))
+        numUnderived = numSources.count(0)
+        numCollapsed = 0
+        for t in worklist:
+            if eliminable(t):
+                worklist.extend(collapse(t))
+                numCollapsed = numCollapsed + 1
+        numEliminated = numSources.count(0) - numUnderived
+        logging.info('Eliminated {0} tuples, in {1} chains.'.format(numEliminated, numCollapsed))
+
+        self.clauses = { clause: clauseRules[c] for c, clause in enumerate(clauseLits) if clause is not None }
+        logging.info('Maximum new clause length: {0}.'.format(max([ len(clause) for clause in self.clauses ])))
+        self.logSummary()
+        return ruleProbs
+
+    def newTuples(self, prefix, n):
+        # The two new tuples of each split are named after the number of clauses, n, as if the tree were built one
+        # split at a time.
+        return self.intern('{0}{1}'.format(prefix, n)), self.intern('{0}{1}'.format(prefix, n + 1))
+
+    def narrowAnd(self, maxAntecedents=MAX_ANTECEDENTS, shape='balanced'):
+        # The narrowand option of cons_all2bnet.py: splits every clause with more than maxAntecedents antecedents,
+        # building the whole tree of new tuples for each clause at once.
+        # 1. balanced: The antecedents are split in two halves, which derive new tuples t1 and t2, and a clause derives
+        #    the original consequent from t1 and t2, and so on.
+        # 2. chain: Each new tuple is derived from the previous one and as many further antecedents as fit, and the last
+        #    derives the original consequent with the remaining antecedents.
+        wideClauses = [ clause for clause in self.clauses if len(clause) - 1 > maxAntecedents ]
+        numTuples = len(self.tuples)
+        for oldClause in wideClauses:
+            antecedents = oldClause[:-1]
+            numClauses = len(self.clauses)
+            ruleName = self.clauses.pop(oldClause)
+            logging.debug('Splitting clause with {0} antecedents.'.format(len(antecedents)))
+
+            if shape == 'chain':
+                previous, lo = (), 0
+                while len(previous) + len(antecedents) - lo > maxAntecedents:
+                    hi = lo + maxAntecedents - len(previous)
+                    t = self.intern('C{0}'.format(numClauses))
+                    numClauses = numClauses + 1
+                    self.clauses[previous + antecedents[lo:hi] + (2 * t,)] = 'Rnarrow'
+                    previous, lo = (2 * t + 1,), hi
+                self.clauses[previous + antecedents[lo:] + oldClause[-1:]] = ruleName
+                continue
+
+            worklist = [ (oldClause[-1], ruleName, 0, len(antecedents)) ]
+            while len(worklist) > 0:
+                consequent, ruleName, lo, hi = worklist.pop()
+                if hi - lo <= maxAntecedents:
+                    self.clauses[antecedents[lo:hi] + (consequent,)] = ruleName
+                else:
+                    t1, t2 = self.newTuples('C', numClauses)
+                    numClauses = numClauses + 2
+                    mid = lo + (hi - lo) // 2
+                    self.clauses[(2 * t1 + 1, 2 * t2 + 1, consequent)] = ruleName
+                    worklist.append((2 * t1, 'Rnarrow', lo, mid))
+                    worklist.append((2 * t2, 'Rnarrow', mid, hi))
+        logging.info('Split {0} wide clauses, with {1} new tuples.'.format(len(wideClauses), \
+                     len(self.tuples) - numTuples))
+
+    def narrowOr(self, maxDisjuncts=MAX_DISJUNCTS, shape='balanced'):
+        # The narrowor option of cons_all2bnet.py: splits the clauses deriving every tuple t with more than maxDisjuncts
+        # such clauses, building the whole tree of new tuples for each tuple at once.
+        # 1. balanced: The clauses are split in two halves, which derive new tuples t1 and t2 instead, and clauses
+        #    derive t from each, and so on.
+        # 2. chain: t keeps as many clauses as fit, with room for one more, which derives t from a new tuple, which in
+        #    turn keeps as many of the remaining clauses as fit, and so on.
+        consequentClauses = {}
+        for clause in self.clauses: consequentClauses.setdefault(clause2Consequent(clause), []).append(clause)
+
+        def moveClauses(originalClauses, t):
+            for originalClause in originalClauses:
+                self.clauses[originalClause[:-1] + (2 * t,)] = self.clauses.pop(originalClause)
+
+        wideConsequents = [ t for t, clauses in consequentClauses.items() if len(clauses) > maxDisjuncts ]
+        numTuples = len(self.tuples)
+        for t in wideConsequents:
+            originalProvingClauses = consequentClauses[t]
+            logging.debug('Splitting {0} clauses proving {1}.'.format(len(originalProvingClauses), self.tuples[t]))
+
+            if shape == 'chain':
+                tp, lo = t, 0
+                while len(originalProvingClauses) - lo > maxDisjuncts:
+                    hi = lo + maxDisjuncts - 1
+                    if tp != t: moveClauses(originalProvingClauses[lo:hi], tp)
+                    tNext = self.intern('D{0}'.format(len(self.clauses)))
+                    self.clauses[(2 * tNext + 1, 2 * tp)] = 'Rnarrow'
+                    tp, lo = tNext, hi
+                moveClauses(originalProvingClauses[lo:], tp)
+                continue
+
+            worklist = [ (t, 0, len(originalProvingClauses)) ]
+            while len(worklist) > 0:
+                tp, lo, hi = worklist.pop()
+                if hi - lo <= maxDisjuncts:
+                    if tp != t: moveClauses(originalProvingClauses[lo:hi], tp)
+                else:
+                    t1, t2 = self.newTuples('D', len(self.clauses))
+                    self.clauses[(2 * t1 + 1, 2 * tp)] = 'Rnarrow'
+                    self.clauses[(2 * t2 + 1, 2 * tp)] = 'Rnarrow'
+                    mid = lo + (hi - lo + 1) // 2
+                    worklist.append((t1, lo, mid))
+                    worklist.append((t2, mid, hi))
+        logging.info('Split {0} wide disjunctions, with {1} new tuples.'.format(len(wideConsequents), \
+                     len(self.tuples) - numTuples))
+
+    ####################################################################################################################
+    # 3. Bayesian network
+
+    def bayesianNetwork(self):
+        # As cons_all2bnet.py: returns the names of the nodes, as printed in bnet-dict.out, and the nodes themselves, as
+        # (factorType, ruleName, parents), where factorType is '*' for clauses and '+' for tuples.
+        consequentClauses = {}
+        for clause in self.clauses: consequentClauses.setdefault(clause2Consequent(clause), []).append(clause)
+
+        nodeIndex = {}
+        for t in consequentClauses: nodeIndex[('t', t)] = len(nodeIndex)
+        for clause in self.clauses: nodeIndex[('c', clause)] = len(nodeIndex)
+
+        nodeNames = [ self.tuples[t] for t in consequentClauses ] + \
+                    [ self.clause2Str(clause) for clause in self.clauses ]
+        nodes = []
+        for t, clauses in consequentClauses.items():
+            nodes.append(('+', None, [ nodeIndex[('c', clause)] for clause in clauses ]))
+        for clause, ruleName in self.clauses.items():
+            parents = dict.fromkeys([ nodeIndex[('t', t)] for t in clause2Antecedents(clause) \
+                                      if ('t', t) in nodeIndex ])
+            nodes.append(('*', ruleName, list(parents)))
+        logging.info('Discovered {0} bayesian nodes.'.format(len(nodes)))
+        return nodeNames, nodes
+
+########################################################################################################################
+# 4. Output
+
+def printRuleProbabilities(outFile, ruleProbs):
+    for ruleName, ruleProb in ruleProbs.items():
+        print('{0}: {1}'.format(ruleName, ruleProb), file=outFile)
+
+def printDict(outFile, nodeNames):
+    for index, nodeName in enumerate(nodeNames):
+        print('{0}: {1}'.format(index, nodeName), file=outFile)
+
+def printBayesianNetwork(outFile, nodes):
+    print(len(nodes), file=outFile)
+    for factorType, ruleName, parents in nodes:
+        parentsStr = ' '.join([ str(p) for p in parents ])
+        if factorType == '*': print('* {0} {1} {2}'.format(ruleName, len(parents), parentsStr), file=outFile)
+        else: print('+ {0} {1}'.format(len(parents), parentsStr), file=outFile)
+
+def printFactorGraph(outFile, nodes, ruleProbs, defaultProbability, fgFormat='text'):
+    # As bnet2fg.py, in any of the formats of fgfile.py. outFile must be opened in binary mode.
+    writer = fgfile.FactorGraphWriter(outFile, len(nodes), fgFormat)
+    for factorType, ruleName, parents in nodes:
+        probability = 1.0 if factorType == '+' else \
+                      ruleProbs[ruleName] if ruleName in ruleProbs else \
+                      1.0 if ruleName == 'Rnarrow' else \
+                      defaultProbability
+        writer.add(factorType, parents, probability)
+    writer.close()
+
+########################################################################################################################
+# 5. Pipeline
+
+def loadRuleProbabilities(ruleProbFileName):
+    ruleProbs = [ line.strip().split(': ') for line in open(ruleProbFileName) ]
+    return { line[0]: float(line[1]) for line in ruleProbs }
+
+def build(clauses, ruleProbs, defaultProbability, baseQueries, outDir, eps=None, intermediate=False, binary=False, \
+          fgFormat='text', maxAntecedents=MAX_ANTECEDENTS, maxDisjuncts=MAX_DISJUNCTS, shape='balanced'):
+    # Runs every stage on clauses, a ClauseGraph, and prints the network to outDir.
+    def stage(name, fileName, f, *args):
+        startTime = time.time()
+        logging.info('Stage {0}.'.format(name))
+        ans = f(*args)
+        logging.info('Stage {0} finished in {1:.3f}s.'.format(name, time.time() - startTime))
+        if intermediate and fileName is not None:
+            with open(os.path.join(outDir, fileName), 'wb' if binary else 'w') as outFile:
+                if binary: clauses.writeClauses(outFile)
+                else: clauses.printClauses(outFile)
+        return ans
+
+    stage('derive-edb', 'named_cons_all.txt.edbderived', clauses.deriveEdb)
+    stage('elide-edb', 'named_cons_all.txt.ep', clauses.elideEdb)
+    ruleProbs = stage('compress-cons-all', 'named_cons_all.txt.cep', clauses.compress, ruleProbs, \
+                      defaultProbability, baseQueries, eps)
+    stage('narrowand', None, clauses.narrowAnd, maxAntecedents, shape)
+    stage('narrowor', None, clauses.narrowOr, maxDisjuncts, shape)
+    nodeNames, nodes = stage('cons_all2bnet', None, clauses.bayesianNetwork)
+    logFactorWidths(nodes)
+
+    with open(os.path.join(outDir, 'new-rule-prob.txt'), 'w') as outFile: printRuleProbabilities(outFile, ruleProbs)
+    with open(os.path.join(outDir, 'bnet-dict.out'), 'w') as outFile: printDict(outFile, nodeNames)
+    with open(os.path.join(outDir, 'named-bnet.out'), 'w') as outFile: printBayesianNetwork(outFile, nodes)
+    with open(os.path.join(outDir, 'factor-graph.fg'), 'wb') as outFile:
+        stage('bnet2fg', None, printFactorGraph, outFile, nodes, ruleProbs, defaultProbability, fgFormat)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, \
+                        format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s", \
+                        datefmt="%H:%M:%S")
+    logging.info('Hello!')
+
+    consAllFileName, ruleProbFileName, defaultProbability, baseQueriesFileName, outDir = sys.argv[1:6]
+    defaultProbability = float(defaultProbability)
+    assert 0 <= defaultProbability and defaultProbability <= 1
+    intermediate = 'intermediate' in sys.argv[6:]
+    binary = 'binary' in sys.argv[6:]
+    fgFormat = 'text'
+    for option in sys.argv[6:]:
+        if option.startswith('fg='): fgFormat = option[len('fg='):]
+    maxAntecedents, maxDisjuncts, shape = parseNarrowOptions(sys.argv[6:])
+
+    clauses = ClauseGraph(consAllFileName)
+    ruleProbs = loadRuleProbabilities(ruleProbFileName)
+    baseQueries = { line.strip() for line in open(baseQueriesFileName) if len(line.strip()) > 0 }
+    eps = float(os.environ['EPS']) if 'EPS' in os.environ else None
+
+    build(clauses, ruleProbs, defaultProbability, baseQueries, outDir, eps, intermediate, binary, fgFormat, \
+          maxAntecedents, maxDisjuncts, shape)
+    logging.info('Bye!')
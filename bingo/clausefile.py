@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+# Compact binary format for grounded constraints, such as named_cons_all.txt and the files derived from it. In the text
+# format, each line is a clause of the form 'ruleName: literal1, literal2, ..., consequent', where each literal is
+# either a tuple or 'NOT tuple'. In the binary format, every string is stored once, each tuple is a relation and an
+# array of arguments, and each clause is a rule and an array of literals. The arrays can be used directly from a
+# memory-mapped file, without parsing.
+
+# Layout (all integers are unsigned, 32 bits, little-endian):
+# 1. MAGIC, followed by the header: the numbers of strings, bytes of string data, tuples, arguments, clauses and
+#    literals.
+# 2. The string table: numStrings + 1 offsets into the string data, followed by the string data itself, in UTF-8,
+#    padded with zeros to a multiple of 4 bytes. String i is data[offsets[i]:offsets[i + 1]].
+# 3. The tuples: for each tuple, the string ID of its relation, then numTuples + 1 offsets into the arguments, then the
+#    string IDs of the arguments. A tuple 'Rel(a,b)' has relation 'Rel' and arguments 'a' and 'b'. A tuple without
+#    arguments, such as 'C12', is stored whole as its relation.
+# 4. The clauses: for each clause, the string ID of its rule, then numClauses + 1 offsets into the literals, then the
+#    literals. A literal is 2 * t for the tuple with ID t, and 2 * t + 1 for 'NOT t', as in build_bnet.py.
+
+# To convert between the two formats:
+# ./bingo/clausefile.py tobinary named_cons_all.txt named_cons_all.bin
+# ./bingo/clausefile.py totext named_cons_all.bin named_cons_all.txt
+
+import io
+import logging
+import mmap
+import re
+import struct
+import sys
+from array import array
+
+MAGIC = b'BGK1'
+HEADER = struct.Struct('<IIIIII')
+
+assert array('I').itemsize == 4 and sys.byteorder == 'little'
+
+def str2Tuple(t):
+    # Returns the relation and the arguments of a tuple.
+    if '(' in t and t.endswith(')'):
+        relName, args = t[:-1].split('(', 1)
+        return relName, args.split(',')
+    return t, []
+
+def tuple2Str(relName, args):
+    return '{0}({1})'.format(relName, ','.join(args)) if len(args) > 0 else relName
+
+def parseClause(line):
+    # Returns the rule name and the literals of a clause in the text format.
+    clause = [ literal.strip() for literal in re.split(':|, ', line.strip()) ]
+    return clause[0], clause[1:]
+
+########################################################################################################################
+# 1. Writing
+
+class ClauseWriter:
+    def __init__(self):
+        self.strings = []
+        self.stringIds = {}
+        self.tupleIds = {}
+        self.tupleRels = array('I')
+        self.tupleArgOffsets = array('I', [ 0 ])
+        self.args = array('I')
+        self.clauseRules = array('I')
+        self.clauseOffsets = array('I', [ 0 ])
+        self.literals = array('I')
+
+    def intern(self, s):
+        if s not in self.stringIds:
+            self.stringIds[s] = len(self.strings)
+            self.strings.append(s)
+        return self.stringIds[s]
+
+    def tupleId(self, t):
+        if t not in self.tupleIds:
+            self.tupleIds[t] = len(self.tupleRels)
+            relName, args = str2Tuple(t)
+            self.tupleRels.append(self.intern(relName))
+            self.args.extend([ self.intern(arg) for arg in args ])
+            self.tupleArgOffsets.append(len(self.args))
+        return self.tupleIds[t]
+
+    def add(self, ruleName, literals):
+        self.clauseRules.append(self.intern(ruleName))
+        for literal in literals:
+            if literal.startswith('NOT '): self.literals.append(2 * self.tupleId(literal[len('NOT '):]) + 1)
+            else: self.literals.append(2 * self.tupleId(literal))
+        self.clauseOffsets.append(len(self.literals))
+
+    def write(self, outFile):
+        # outFile must be opened in binary mode.
+        encoded = [ s.encode() for s in self.strings ]
+        stringOffsets = array('I', [ 0 ])
+        for s in encoded: stringOffsets.append(stringOffsets[-1] + len(s))
+        stringData = b''.join(encoded)
+        stringData = stringData + b'\0' * (-len(stringData) % 4)
+
+        outFile.write(MAGIC)
+        outFile.write(HEADER.pack(len(self.strings), len(stringData), len(self.tupleRels), len(self.args), \
+                                  len(self.clauseRules), len(self.literals)))
+        outFile.write(stringOffsets.tobytes())
+        outFile.write(stringData)
+        for column in [ self.tupleRels, self.tupleArgOffsets, self.args, \
+                        self.clauseRules, self.clauseOffsets, self.literals ]:
+            outFile.write(column.tobytes())
+
+def writeClauses(outFile, clauses):
+    # Writes clauses, given as (ruleName, literals) with every literal a string, in the binary format.
+    writer = ClauseWriter()
+    for ruleName, literals in clauses: writer.add(ruleName, literals)
+    writer.write(outFile)
+
+########################################################################################################################
+# 2. Reading
+
+class ClauseFile:
+    def __init__(self, data):
+        # data is any object supporting the buffer protocol, such as bytes or an mmap.
+        self.data = data
+        view = memoryview(data)
+        assert bytes(view[:len(MAGIC)]) == MAGIC, 'Not a binary clause file'
+        numStrings, stringBytes, self.numTuples, numArgs, self.numClauses, numLiterals = \
+            HEADER.unpack_from(view, len(MAGIC))
+        offset = len(MAGIC) + HEADER.size
+
+        def column(length):
+            nonlocal offset
+            ans = view[offset:(offset + 4 * length)].cast('I')
+            offset = offset + 4 * length
+            return ans
+
+        self.stringOffsets = column(numStrings + 1)
+        self.stringData = view[offset:(offset + stringBytes)]
+        offset = offset + stringBytes
+        self.tupleRels = column(self.numTuples)
+        self.tupleArgOffsets = column(self.numTuples + 1)
+        self.args = column(numArgs)
+        self.clauseRules = column(self.numClauses)
+        self.clauseOffsets = column(self.numClauses + 1)
+        self.literals = column(numLiterals)
+        self.stringCache = {}
+
+    def string(self, i):
+        if i not in self.stringCache:
+            self.stringCache[i] = str(self.stringData[self.stringOffsets[i]:self.stringOffsets[i + 1]], 'utf-8')
+        return self.stringCache[i]
+
+    def tuple2Str(self, t):
+        args = self.args[self.tupleArgOffsets[t]:self.tupleArgOffsets[t + 1]]
+        return tuple2Str(self.string(self.tupleRels[t]), [ self.string(arg) for arg in args ])
+
+    def strings(self):
+        data, offsets = self.stringData, self.stringOffsets.tolist()
+        return [ str(data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(len(offsets) - 1) ]
+
+    def tupleStrs(self):
+        # Returns the names of all tuples, in ID order. Much faster than calling tuple2Str() for each.
+        strings = self.strings()
+        args = [ strings[arg] for arg in self.args.tolist() ]
+        offsets = self.tupleArgOffsets.tolist()
+        return [ '{0}({1})'.format(strings[rel], ','.join(args[offsets[t]:offsets[t + 1]])) \
+                 if offsets[t + 1] > offsets[t] else strings[rel] for t, rel in enumerate(self.tupleRels.tolist()) ]
+
+    def encodedClauses(self):
+        # Yields (ruleName, literals) for each clause, with the literals as a Python tuple of integers.
+        strings = self.strings()
+        literals, offsets = self.literals, self.clauseOffsets.tolist()
+        for c, rule in enumerate(self.clauseRules.tolist()):
+            yield strings[rule], tuple(literals[offsets[c]:offsets[c + 1]])
+
+    def ruleName(self, c):
+        return self.string(self.clauseRules[c])
+
+    def clauseLiterals(self, c):
+        return self.literals[self.clauseOffsets[c]:self.clauseOffsets[c + 1]]
+
+    def __len__(self):
+        return self.numClauses
+
+    def __iter__(self):
+        # Yields (ruleName, literals), with every literal a string, as parseClause() would return.
+        tupleStrs = self.tupleStrs()
+        for ruleName, literals in self.encodedClauses():
+            yield ruleName, [ 'NOT ' + tupleStrs[l >> 1] if l & 1 else tupleStrs[l >> 1] for l in literals ]
+
+def isBinary(inFile):
+    # inFile is a buffered binary file, such as sys.stdin.buffer, or open(fileName, 'rb').
+    return inFile.peek(len(MAGIC))[:len(MAGIC)] == MAGIC
+
+def load(inFile):
+    # Maps the binary clause file inFile into memory, if possible, and reads it whole otherwise.
+    try:
+        return ClauseFile(mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, io.UnsupportedOperation):
+        return ClauseFile(inFile.read())
+
+def readClauses(inFile):
+    # Yields (ruleName, literals) for each clause of inFile, a file name or a buffered binary file, in either format.
+    if isinstance(inFile, str): inFile = open(inFile, 'rb')
+    if isBinary(inFile):
+        yield from load(inFile)
+    else:
+        for line in io.TextIOWrapper(inFile):
+            if len(line.strip()) > 0: yield parseClause(line)
+
+def printClauses(outFile, clauses):
+    # Prints clauses, given as (ruleName, literals), in the text format.
+    for ruleName, literals in clauses:
+        print('{0}: {1}'.format(ruleName, ', '.join(literals)), file=outFile)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, \
+                        format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s", \
+                        datefmt="%H:%M:%S")
+
+    command, inFileName, outFileName = sys.argv[1:4]
+    if command == 'tobinary':
+        with open(outFileName, 'wb') as outFile: writeClauses(outFile, readClauses(inFileName))
+    else:
+        assert command == 'totext', 'Unexpected command {0}'.format(command)
+        with open(outFileName, 'w') as outFile: printClauses(outFile, readClauses(inFileName))
+    logging.info('Bye!')
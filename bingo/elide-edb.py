@@ -5,9 +5,10 @@
 # script.
 
 # ./scripts/bnet/compressed/elide-edb < named_cons_all.txt.pruned > named_cons_all.txt.elided.pruned
+# The constraints may be given either as text, or in the binary format of clausefile.py.
 
+import clausefile
 import logging
-import re
 import sys
 
 logging.basicConfig(level=logging.INFO, \
@@ -20,10 +21,8 @@ logging.basicConfig(level=logging.INFO, \
 allClauses = set()
 allRuleNames = {}
 
-for line in sys.stdin:
-    line = line.strip()
-    clause = [ literal.strip() for literal in re.split(':|, ', line) ]
-    ruleName, clause = clause[0], tuple(clause[1:])
+for ruleName, clause in clausefile.readClauses(sys.stdin.buffer):
+    clause = tuple(clause)
 
     allRuleNames[clause] = ruleName
     allClauses.add(clause)
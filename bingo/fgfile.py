@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Writing factor graphs, as produced by bnet2fg.py and build_bnet.py, in one of three formats:
+# 1. text: The LibDAI format, https://staff.fnwi.uva.nl/j.m.mooij/libDAI/doc/fileformats.html, which is the only one
+#    accepted by LibDAI/wrapper.cpp.
+# 2. gzip: The same, compressed with gzip.
+# 3. binary: A compact format, which only records the type, probability and parents of each factor, exactly as in
+#    named-bnet.out, and which bp.py reads directly into arrays.
+# bp.loadFactorGraph() accepts all three.
+
+# Every variable v owns exactly one factor, relating v to its parents. The factor is either a noisy-AND ('*'), which
+# holds with the probability of its rule, or an OR ('+').
+
+# Binary layout (all integers little-endian):
+# 1. MAGIC, followed by the header: the numbers of variables and of edges.
+# 2. The probability of each factor, as a double. Disjunctions have probability 1.
+# 3. numVars + 1 offsets into the parents, as unsigned 32-bit integers. The parents of the factor of v are
+#    parents[offsets[v]:offsets[v + 1]].
+# 4. The parents, as unsigned 32-bit integers.
+# 5. The type of each factor, as a byte: AND or OR.
+
+import gzip
+import struct
+import sys
+from array import array
+
+MAGIC = b'BGF1'
+GZIP_MAGIC = b'\x1f\x8b'
+HEADER = struct.Struct('<II')
+AND = 0
+OR = 1
+
+assert array('I').itemsize == 4 and sys.byteorder == 'little'
+
+def factorLines(varIndex, factorType, parents, probability):
+    # Returns the block describing the factor of varIndex in the LibDAI format, as a list of lines.
+    # Each block starts with the number of variables in the factor, their labels, and the number of values of each.
+    numParents = len(parents)
+    tableSize = 2 << numParents
+    lines = [ str(1 + numParents), ' '.join([ str(v) for v in [ varIndex ] + parents ]), \
+              ' '.join([ '2' ] * (1 + numParents)) ]
+    # Then follow the number of nonzero entries in the factor table, and the entries themselves, each as a table index
+    # and its value. The left-most variables cycle through their values the fastest.
+    if factorType == '*':
+        lines.append(str(tableSize // 2 + 1))
+        lines.extend([ '{0} 1'.format(i) for i in range(0, tableSize - 2, 2) ])
+        lines.append('{0} {1}'.format(tableSize - 2, 1 - probability))
+        lines.append('{0} {1}'.format(tableSize - 1, probability))
+    else:
+        assert factorType == '+'
+        lines.append(str(tableSize // 2))
+        lines.append('0 1')
+        lines.extend([ '{0} 1'.format(i) for i in range(3, tableSize, 2) ])
+    # Blocks are separated by empty lines.
+    lines.append('')
+    return lines
+
+class FactorGraphWriter:
+    # Writes the factors of a graph with numVars variables, one at a time, in order, to outFile, which must be opened in
+    # binary mode. The text and gzip formats are streamed; the binary format is only written by close().
+    def __init__(self, outFile, numVars, fmt='text'):
+        assert fmt in [ 'text', 'gzip', 'binary' ]
+        self.numVars = numVars
+        self.fmt = fmt
+        self.numFactors = 0
+        if fmt == 'binary':
+            self.outFile = outFile
+            self.probs = array('d')
+            self.offsets = array('I', [ 0 ])
+            self.parents = array('I')
+            self.types = array('B')
+        else:
+            self.outFile = gzip.GzipFile(fileobj=outFile, mode='wb') if fmt == 'gzip' else outFile
+            self.outFile.write('{0}\n\n'.format(numVars).encode())
+
+    def add(self, factorType, parents, probability):
+        # parents is a list of integers. probability is ignored for disjunctions.
+        if self.fmt == 'binary':
+            self.probs.append(probability if factorType == '*' else 1.0)
+            self.parents.extend(parents)
+            self.offsets.append(len(self.parents))
+            self.types.append(AND if factorType == '*' else OR)
+        else:
+            lines = factorLines(self.numFactors, factorType, parents, probability)
+            self.outFile.write(('\n'.join(lines) + '\n').encode())
+        self.numFactors = self.numFactors + 1
+
+    def close(self):
+        assert self.numFactors == self.numVars, 'Expected {0} factors, got {1}'.format(self.numVars, self.numFactors)
+        if self.fmt == 'binary':
+            self.outFile.write(MAGIC)
+            self.outFile.write(HEADER.pack(self.numVars, len(self.parents)))
+            for column in [ self.probs, self.offsets, self.parents, self.types ]:
+                self.outFile.write(column.tobytes())
+        elif self.fmt == 'gzip':
+            self.outFile.close()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import json
+import nodefile
 import re
 import os.path
 import sys
@@ -31,19 +32,18 @@ with open(label_file) as f:
             label_set.add((src, sink))
         else: pass
 
-with open(node_file, 'rb') as f:
-    node = json.loads(f.read().decode('utf-8', 'ignore'))['nodes']
+node = nodefile.load(node_file)
 
 groundtruth_set = set()
 for line in open(alarm_file):
     line = line.strip()
     nodes = [ literal.strip() for literal in re.split("\t", line) ]
     if analysis == 'taint':
-        src = node[nodes[0]]['loc']
-        sink = node[nodes[1]]['loc']
+        src = node.loc(nodes[0])
+        sink = node.loc(nodes[1])
     else:
         src = None
-        sink = node[nodes[1]]['loc']
+        sink = node.loc(nodes[1])
     if (src, sink) in label_set:
         groundtruth_set.add((nodes[0], nodes[1]))
 
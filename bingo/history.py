@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+# Compact record of the rankings produced by the alarm carousel in driver.py.
+
+# Instead of printing the full ranked list of alarms at every iteration, the carousel can write a single history file.
+# The file opens with the list of alarms and the ground truth, and then holds one snapshot per iteration. Each snapshot
+# only contains the alarms whose confidence or label changed since the previous snapshot. Rank moves are not stored:
+# the ranking is a function of the confidences and labels, and is recomputed by the reader exactly as by
+# ranking.RankingIndex.
+
+# Layout (all integers little-endian, arrays in native byte order, which is assumed to be little-endian):
+# 1. MAGIC, followed by the header: the number of alarms, and the compressed lengths of the alarm and ground truth
+#    blocks.
+# 2. The alarms, in ID order, as a zlib-compressed newline-separated list.
+# 3. The ground truth, as a zlib-compressed array of bytes, one per alarm.
+# 4. Snapshots. Each snapshot has a header of (iteration, numChanged, numLabelled, compressed length), where the
+#    iteration of the initial ranking is INIT. Its body is a zlib-compressed block of four columns: the gaps between
+#    successive changed IDs, their new confidences, the gaps between successive newly labelled IDs, and their labels.
+
+# To export the history in the old format, with one file per iteration:
+# ./bingo/history.py history-file combinedPrefix combinedSuffix [iteration1 iteration2 ...]
+# The iterations may be numbers or 'init'. If none are given, every iteration is exported.
+
+import base64
+import logging
+import struct
+import sys
+import zlib
+from array import array
+
+import ranking
+
+MAGIC = b'BGH1'
+HEADER = struct.Struct('<III')
+SNAPSHOT = struct.Struct('<iIII')
+INIT = -1
+
+def _gaps(ids):
+    ans = array('I', ids)
+    for j in range(len(ans) - 1, 0, -1): ans[j] = ans[j] - ans[j - 1]
+    return ans
+
+def _ungaps(gaps):
+    ans = array('I', gaps)
+    for j in range(1, len(ans)): ans[j] = ans[j] + ans[j - 1]
+    return ans
+
+def iteration2Str(iteration):
+    return 'init' if iteration == INIT else str(iteration)
+
+def str2Iteration(s):
+    return INIT if s == 'init' else int(s)
+
+########################################################################################################################
+# 1. Writing
+
+class HistoryWriter:
+    def __init__(self, outFile, tuples, trueTuples, state=None):
+        # If state is given, as returned by state(), outFile is instead positioned at the end of an existing history,
+        # which is continued.
+        self.outFile = outFile
+        if state is not None:
+            self.confidences = array('d', base64.b64decode(state['confidences']))
+            self.groups = array('b', base64.b64decode(state['groups']))
+            assert len(self.confidences) == len(tuples) and len(self.groups) == len(tuples)
+            return
+
+        self.confidences = array('d', [ 0.0 ] * len(tuples))
+        self.groups = array('b', [ ranking.UNLABELLED ] * len(tuples))
+        tupleBlock = zlib.compress('\n'.join(tuples).encode())
+        groundBlock = zlib.compress(array('b', [ t in trueTuples for t in tuples ]).tobytes())
+        outFile.write(MAGIC)
+        outFile.write(HEADER.pack(len(tuples), len(tupleBlock), len(groundBlock)))
+        outFile.write(tupleBlock)
+        outFile.write(groundBlock)
+
+    def record(self, iteration, confidences, groups):
+        # Takes the confidences and labels of all alarms, in ID order, as held by ranking.RankingIndex.
+        changed = [ i for i, (old, new) in enumerate(zip(self.confidences, confidences)) if old != new ]
+        labelled = [ i for i, (old, new) in enumerate(zip(self.groups, groups)) if old != new ]
+        for i in changed: self.confidences[i] = confidences[i]
+        for i in labelled: self.groups[i] = groups[i]
+
+        body = _gaps(changed).tobytes() + array('d', [ confidences[i] for i in changed ]).tobytes() + \
+               _gaps(labelled).tobytes() + array('b', [ groups[i] for i in labelled ]).tobytes()
+        body = zlib.compress(body)
+        self.outFile.write(SNAPSHOT.pack(iteration, len(changed), len(labelled), len(body)))
+        self.outFile.write(body)
+        self.outFile.flush()
+
+    def state(self):
+        # The alarms as of the last snapshot, which is all that is needed to continue the history.
+        return { 'confidences': base64.b64encode(self.confidences.tobytes()).decode(), \
+                 'groups': base64.b64encode(self.groups.tobytes()).decode() }
+
+########################################################################################################################
+# 2. Reading
+
+class HistoryReader:
+    def __init__(self, fileName):
+        with open(fileName, 'rb') as inFile: data = inFile.read()
+        assert data[:len(MAGIC)] == MAGIC, '{0} is not a ranking history file'.format(fileName)
+        offset = len(MAGIC)
+
+        numTuples, tupleLength, groundLength = HEADER.unpack_from(data, offset)
+        offset = offset + HEADER.size
+        self.tuples = zlib.decompress(data[offset:(offset + tupleLength)]).decode().split('\n') if numTuples > 0 else []
+        offset = offset + tupleLength
+        self.ground = array('b', zlib.decompress(data[offset:(offset + groundLength)]))
+        offset = offset + groundLength
+        assert len(self.tuples) == numTuples and len(self.ground) == numTuples
+
+        # Snapshots are only decompressed when some iteration at or after them is materialized.
+        self.snapshots = []
+        while offset < len(data):
+            iteration, numChanged, numLabelled, length = SNAPSHOT.unpack_from(data, offset)
+            offset = offset + SNAPSHOT.size
+            self.snapshots.append((iteration, numChanged, numLabelled, data[offset:(offset + length)]))
+            offset = offset + length
+        self.iterations = [ snapshot[0] for snapshot in self.snapshots ]
+
+    def _apply(self, snapshot, confidences, groups):
+        _, numChanged, numLabelled, body = snapshot
+        body = zlib.decompress(body)
+        columns = [ ('I', numChanged), ('d', numChanged), ('I', numLabelled), ('b', numLabelled) ]
+        arrays = []
+        offset = 0
+        for typecode, length in columns:
+            column = array(typecode)
+            column.frombytes(body[offset:(offset + length * column.itemsize)])
+            offset = offset + length * column.itemsize
+            arrays.append(column)
+        changed, changedConfidences, labelled, labelledGroups = arrays
+
+        for i, confidence in zip(_ungaps(changed), changedConfidences): confidences[i] = confidence
+        for i, group in zip(_ungaps(labelled), labelledGroups): groups[i] = group
+
+    def _replay(self, iterations):
+        # Yields (iteration, confidences, groups) for each of the requested iterations, in file order, replaying every
+        # snapshot only once.
+        iterations = set(iterations)
+        confidences = array('d', [ 0.0 ] * len(self.tuples))
+        groups = array('b', [ ranking.UNLABELLED ] * len(self.tuples))
+        for snapshot in self.snapshots:
+            if len(iterations) == 0: break
+            self._apply(snapshot, confidences, groups)
+            if snapshot[0] in iterations:
+                iterations.remove(snapshot[0])
+                yield snapshot[0], confidences, groups
+        assert len(iterations) == 0, 'Iterations {0} not found in history'.format(sorted(iterations))
+
+    def _rank(self, confidences, groups):
+        keys = sorted([ (groups[i], -confidences[i], i) for i in range(len(self.tuples)) ])
+        return [ (self.tuples[i], -negConfidence, self.ground[i] != 0, group) for group, negConfidence, i in keys ]
+
+    def rankedAlarms(self, iteration):
+        # Returns the full ranking at the given iteration, as a list of (tuple, confidence, ground, group).
+        for _, confidences, groups in self._replay([ iteration ]):
+            return self._rank(confidences, groups)
+
+    def export(self, combinedPrefix, combinedSuffix, iterations=None):
+        # Prints the ranking at each of the given iterations to 'combinedPrefixN.combinedSuffix', in the format of
+        # combined.out, exactly as driver.py would have done.
+        iterations = self.iterations if iterations is None else iterations
+        for iteration, confidences, groups in self._replay(iterations):
+            outFileName = '{0}{1}.{2}'.format(combinedPrefix, iteration2Str(iteration), combinedSuffix)
+            with open(outFileName, 'w') as outFile:
+                printRankedAlarms(outFile, self._rank(confidences, groups))
+
+def printRankedAlarms(outFile, alarms):
+    print('Rank\tConfidence\tGround\tLabel\tComments\tTuple', file=outFile)
+    index = 0
+    for t, confidence, ground, group in alarms:
+        index = index + 1
+        ground = 'TrueGround' if ground else 'FalseGround'
+        label = ranking.group2Str(group)
+        print('{0}\t{1}\t{2}\t{3}\tSPOkGoodGood\t{4}'.format(index, confidence, ground, label, t), file=outFile)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, \
+                        format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s", \
+                        datefmt="%H:%M:%S")
+
+    historyFileName, combinedPrefix, combinedSuffix = sys.argv[1:4]
+    iterations = [ str2Iteration(s) for s in sys.argv[4:] ] if len(sys.argv) > 4 else None
+
+    reader = HistoryReader(historyFileName)
+    logging.info('Loaded history of {0} iterations over {1} alarms.'.format(len(reader.iterations), \
+                                                                         len(reader.tuples)))
+    reader.export(combinedPrefix, combinedSuffix, iterations)
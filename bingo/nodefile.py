@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+# Compact, columnar form of node.json, in which Sparrow describes the nodes of the control flow graph of a program and
+# the edges between them:
+# { "nodes": { "f-1": { "loc": "file.c:12", "cmd": [ "set", "x", "y" ] }, ... },
+#   "edges": [ [ "f-ENTRY", "f-1" ], ... ] }
+# The JSON file is streamed, one node or edge at a time, rather than parsed whole, into a table in which every string is
+# stored once. The table is cached in a binary sidecar, node.json.bin, next to the JSON file, which later runs map into
+# memory instead of parsing the JSON file again.
+
+# Layout (all integers are unsigned, 32 bits, little-endian, unless noted otherwise):
+# 1. MAGIC, followed by the header: the size of the JSON file, and its time of last modification in nanoseconds, both
+#    as unsigned 64-bit integers, and then the numbers of strings, bytes of string data, nodes and edges.
+# 2. The string table, as in clausefile.py: numStrings + 1 offsets into the string data, followed by the string data
+#    itself, padded with zeros to a multiple of 4 bytes.
+# 3. The nodes: for each node, the string IDs of its name, its function, its location, the file of its location and its
+#    command, and then the line of its location, as a signed integer, or BAD_LINE if the location has no numeric line.
+#    The command is stored in JSON, so that nodes with identical commands share one string.
+# 4. The edges, indexed by node: numNodes + 1 offsets into the parents, followed by the node IDs of the parents, and
+#    likewise for the children.
+
+# To build the sidecar ahead of time:
+# ./bingo/nodefile.py sparrow-out/node.json
+
+import io
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+MAGIC = b'BGN2'
+HEADER = struct.Struct('<QQIIII')
+SIDECAR_SUFFIX = '.bin'
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+BAD_LINE = -(1 << 31)
+
+assert array('I').itemsize == 4 and array('i').itemsize == 4 and sys.byteorder == 'little'
+
+def str2Location(loc):
+    # Returns the file and line of a location 'file.c:12'. Raises ValueError if it has no numeric line.
+    elements = loc.split(':')
+    if len(elements) < 2: raise ValueError('Location {0} has no line'.format(loc))
+    return elements[0], int(elements[1])
+
+########################################################################################################################
+# 1. Streaming JSON
+
+class JsonStream:
+    # Reads a JSON document from a text file, one value at a time. Objects and arrays can be entered with members() and
+    # elements(), so that only their members, and not the whole of them, need ever be held in memory.
+    def __init__(self, inFile, chunkSize=(1 << 20)):
+        self.inFile = inFile
+        self.chunkSize = chunkSize
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        # Reads another chunk, returning False at the end of the file.
+        if self.eof: return False
+        chunk = self.inFile.read(self.chunkSize)
+        if len(chunk) == 0:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Skips whitespace, and returns the next character, or '' at the end of the file.
+        self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+        while self.pos == len(self.buffer) and self.fill():
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+        return self.buffer[self.pos:(self.pos + 1)]
+
+    def expect(self, c):
+        assert self.peek() == c, 'Expected {0!r} at {1!r}'.format(c, self.buffer[self.pos:(self.pos + 20)])
+        self.pos = self.pos + 1
+
+    def value(self):
+        # Decodes the next value whole. A value which runs to the end of the buffer may be truncated, as may a number
+        # which appears to be complete, so more is read until it is not.
+        self.peek()
+        while True:
+            try:
+                ans, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return ans
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self.fill()
+
+    def separator(self, close):
+        # Consumes the separator after a member or element, returning False if it closes the object or array.
+        c = self.peek()
+        self.pos = self.pos + 1
+        if c == close: return False
+        assert c == ',', 'Expected {0!r} at {1!r}'.format(close, self.buffer[(self.pos - 1):(self.pos + 19)])
+        return True
+
+    def members(self):
+        # Yields the key of each member of the next object. The caller must consume its value before the next key.
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos = self.pos + 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if not self.separator('}'): return
+
+    def elements(self):
+        # Yields once for each element of the next array. The caller must consume each element.
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos = self.pos + 1
+            return
+        while True:
+            yield
+            if not self.separator(']'): return
+
+########################################################################################################################
+# 2. Writing
+
+class NodeTableWriter:
+    def __init__(self):
+        self.strings = []
+        self.stringIds = {}
+        self.nodeIds = {}
+        self.nodeNames = array('I')
+        self.nodeFuncs = array('I')
+        self.nodeLocs = array('I')
+        self.nodeFiles = array('I')
+        self.nodeCmds = array('I')
+        self.nodeLines = array('i')
+        self.edges = array('I')
+
+    def intern(self, s):
+        ans = self.stringIds.setdefault(s, len(self.strings))
+        if ans == len(self.strings): self.strings.append(s)
+        return ans
+
+    def addNode(self, name, loc, cmd):
+        # As with json.loads(), a node which appears twice is described by its last appearance.
+        nameId = self.intern(name)
+        # A location without a line is only an error if the location of the node is asked for, as by node_to_location()
+        # in translate-cons.py, and so is recorded here rather than raised.
+        try:
+            fileName, line = str2Location(loc)
+        except ValueError:
+            fileName, line = loc, BAD_LINE
+        values = [ self.intern(name.split('-')[0]), self.intern(loc), self.intern(fileName), \
+                   self.intern(json.dumps(cmd)), line ]
+        columns = [ self.nodeFuncs, self.nodeLocs, self.nodeFiles, self.nodeCmds, self.nodeLines ]
+        if nameId in self.nodeIds:
+            for column, value in zip(columns, values): column[self.nodeIds[nameId]] = value
+        else:
+            self.nodeIds[nameId] = len(self.nodeNames)
+            self.nodeNames.append(nameId)
+            for column, value in zip(columns, values): column.append(value)
+
+    def addEdge(self, src, dst):
+        # The endpoints are resolved in write(), since the edges may precede the nodes in the JSON file.
+        self.edges.extend([ self.intern(src), self.intern(dst) ])
+
+    def adjacency(self, keys, items):
+        # Returns the offsets and the items of a CSR array, given the key of each item.
+        offsets = array('I', [ 0 ] * (len(self.nodeNames) + 1))
+        for key in keys: offsets[key + 1] = offsets[key + 1] + 1
+        for v in range(len(self.nodeNames)): offsets[v + 1] = offsets[v + 1] + offsets[v]
+        nextOffsets = offsets[:-1]
+        sortedItems = array('I', [ 0 ] * len(items))
+        for key, item in zip(keys, items):
+            sortedItems[nextOffsets[key]] = item
+            nextOffsets[key] = nextOffsets[key] + 1
+        return offsets, sortedItems
+
+    def write(self, outFile, sourceSize, sourceMtime):
+        # outFile must be opened in binary mode.
+        srcs, dsts, numDropped = array('I'), array('I'), 0
+        for i in range(0, len(self.edges), 2):
+            if self.edges[i] in self.nodeIds and self.edges[i + 1] in self.nodeIds:
+                srcs.append(self.nodeIds[self.edges[i]])
+                dsts.append(self.nodeIds[self.edges[i + 1]])
+            else: numDropped = numDropped + 1
+        if numDropped > 0: logging.warning('Dropped {0} edges between unknown nodes'.format(numDropped))
+
+        encoded = [ s.encode() for s in self.strings ]
+        stringOffsets = array('I', [ 0 ])
+        for s in encoded: stringOffsets.append(stringOffsets[-1] + len(s))
+        stringData = b''.join(encoded)
+        stringData = stringData + b'\0' * (-len(stringData) % 4)
+
+        outFile.write(MAGIC)
+        outFile.write(HEADER.pack(sourceSize, sourceMtime, len(self.strings), len(stringData), len(self.nodeNames), \
+                                  len(srcs)))
+        outFile.write(stringOffsets.tobytes())
+        outFile.write(stringData)
+        for column in [ self.nodeNames, self.nodeFuncs, self.nodeLocs, self.nodeFiles, self.nodeCmds, self.nodeLines ]:
+            outFile.write(column.tobytes())
+        for column in self.adjacency(dsts, srcs) + self.adjacency(srcs, dsts):
+            outFile.write(column.tobytes())
+
+def parseJson(inFile):
+    # Streams node.json, from a text file, into a NodeTableWriter.
+    writer = NodeTableWriter()
+    stream = JsonStream(inFile)
+    for key in stream.members():
+        if key == 'nodes':
+            for name in stream.members():
+                info = stream.value()
+                writer.addNode(name, info['loc'], info['cmd'])
+        elif key == 'edges':
+            for _ in stream.elements():
+                edge = stream.value()
+                writer.addEdge(edge[0], edge[1])
+        else: stream.value()
+    return writer
+
+########################################################################################################################
+# 3. Reading
+
+class NodeTable:
+    # Nodes are named as in node.json. The command of a node is a list, which is shared between all nodes with the same
+    # command, and must not be modified.
+    def __init__(self, data):
+        # data is any object supporting the buffer protocol, such as bytes or an mmap.
+        self.data = data
+        view = memoryview(data)
+        assert bytes(view[:len(MAGIC)]) == MAGIC, 'Not a binary node table'
+        self.sourceSize, self.sourceMtime, numStrings, stringBytes, self.numNodes, numEdges = \
+            HEADER.unpack_from(view, len(MAGIC))
+        offset = len(MAGIC) + HEADER.size
+
+        def column(length, typecode='I'):
+            nonlocal offset
+            ans = view[offset:(offset + 4 * length)].cast(typecode)
+            offset = offset + 4 * length
+            return ans
+
+        stringOffsets = column(numStrings + 1).tolist()
+        stringData = view[offset:(offset + stringBytes)]
+        offset = offset + stringBytes
+        self.strings = [ str(stringData[stringOffsets[i]:stringOffsets[i + 1]], 'utf-8') for i in range(numStrings) ]
+        self.nodeNames = column(self.numNodes)
+        self.nodeFuncs = column(self.numNodes)
+        self.nodeLocs = column(self.numNodes)
+        self.nodeFiles = column(self.numNodes)
+        self.nodeCmds = column(self.numNodes)
+        self.nodeLines = column(self.numNodes, 'i')
+        self.parentOffsets = column(self.numNodes + 1)
+        self.parentIds = column(numEdges)
+        self.childOffsets = column(self.numNodes + 1)
+        self.childIds = column(numEdges)
+
+        self.names = [ self.strings[name] for name in self.nodeNames.tolist() ]
+        self.nodeIds = { name: v for v, name in enumerate(self.names) }
+        self.cmdCache = {}
+
+    def __len__(self):
+        return self.numNodes
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, node):
+        return node in self.nodeIds
+
+    def function(self, node):
+        return self.strings[self.nodeFuncs[self.nodeIds[node]]]
+
+    def loc(self, node):
+        return self.strings[self.nodeLocs[self.nodeIds[node]]]
+
+    def location(self, node):
+        # Returns the file and line of the node, as str2Location() would, and likewise raises ValueError if it has none.
+        v = self.nodeIds[node]
+        if self.nodeLines[v] == BAD_LINE:
+            raise ValueError('Node {0} has no line in its location {1}'.format(node, self.strings[self.nodeLocs[v]]))
+        return self.strings[self.nodeFiles[v]], self.nodeLines[v]
+
+    def cmd(self, node):
+        cmdId = self.nodeCmds[self.nodeIds[node]]
+        if cmdId not in self.cmdCache:
+            self.cmdCache[cmdId] = json.loads(self.strings[cmdId])
+        return self.cmdCache[cmdId]
+
+    def parents(self, node):
+        v = self.nodeIds[node]
+        return [ self.names[u] for u in self.parentIds[self.parentOffsets[v]:self.parentOffsets[v + 1]] ]
+
+    def children(self, node):
+        v = self.nodeIds[node]
+        return [ self.names[u] for u in self.childIds[self.childOffsets[v]:self.childOffsets[v + 1]] ]
+
+def loadSidecar(sidecarFileName, sourceStat):
+    # Returns the table in the sidecar, if it exists and was built from the JSON file as it is now, and None otherwise.
+    try:
+        with open(sidecarFileName, 'rb') as f:
+            table = NodeTable(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, TypeError, AssertionError, struct.error):
+        return None
+    if table.sourceSize != sourceStat.st_size or table.sourceMtime != sourceStat.st_mtime_ns: return None
+    return table
+
+def load(fileName):
+    # Loads node.json, from its sidecar if possible, and otherwise by streaming it, and then (re)builds the sidecar.
+    sidecarFileName = fileName + SIDECAR_SUFFIX
+    sourceStat = os.stat(fileName)
+    table = loadSidecar(sidecarFileName, sourceStat)
+    if table is not None:
+        logging.info('Loaded {0} nodes from {1}'.format(len(table), sidecarFileName))
+        return table
+
+    with open(fileName, 'rb') as f:
+        writer = parseJson(io.TextIOWrapper(f, encoding='utf-8', errors='ignore'))
+    outFile = io.BytesIO()
+    writer.write(outFile, sourceStat.st_size, sourceStat.st_mtime_ns)
+    data = outFile.getvalue()
+    del writer, outFile
+    try:
+        with open(sidecarFileName + '.tmp', 'wb') as f: f.write(data)
+        os.replace(sidecarFileName + '.tmp', sidecarFileName)
+    except OSError as e:
+        logging.warning('Unable to write {0}: {1}'.format(sidecarFileName, e))
+    table = NodeTable(data)
+    logging.info('Loaded {0} nodes from {1}'.format(len(table), fileName))
+    return table
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, \
+                        format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s", \
+                        datefmt="%H:%M:%S")
+
+    for fileName in sys.argv[1:]: load(fileName)
+    logging.info('Bye!')
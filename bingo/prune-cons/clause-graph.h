@@ -0,0 +1,216 @@
+#pragma once
+
+// Grounded constraints, interned at load time, for prune-cons and keep-derivable.
+
+// Each tuple is numbered in order of first appearance, and its name is stored once. A literal is 2 * t for the tuple t,
+// and 2 * t + 1 for "NOT t", as in build_bnet.py. Identical clauses are merged, and the rule name of the last wins. The
+// clauses are numbered in the order of their literals as strings, which is the order in which a set<vector<string>>
+// would hold them, and are stored in flat (CSR) arrays:
+// 1. The literals of clause c are lits[clauseOffsets[c]:clauseOffsets[c + 1]], the last of which is its consequent.
+// 2. The clauses in which t occurs as an antecedent are antecedentClauses[antecedentOffsets[t]:antecedentOffsets[t + 1]],
+//    once for each occurrence.
+// 3. The clauses of which t is the consequent are consequentClauses[consequentOffsets[t]:consequentOffsets[t + 1]].
+
+#include <algorithm>
+#include <cassert>
+#include <cstdint>
+#include <iostream>
+#include <limits>
+#include <sstream>
+#include <string>
+#include <unordered_map>
+#include <vector>
+using namespace std;
+
+const uint32_t UNBORN = numeric_limits<uint32_t>::max();
+
+struct ClauseGraph {
+    unordered_map<string, uint32_t> tupleIds;
+    vector<const string *> tupleNames; // Pointing into the keys of tupleIds
+    vector<string> ruleNames;
+
+    vector<uint32_t> clauseRules;
+    vector<uint32_t> clauseOffsets;
+    vector<uint32_t> lits;
+
+    vector<uint32_t> antecedentOffsets;
+    vector<uint32_t> antecedentClauses;
+    vector<uint32_t> consequentOffsets;
+    vector<uint32_t> consequentClauses;
+
+    size_t numTuples() const { return tupleNames.size(); }
+    size_t numClauses() const { return clauseRules.size(); }
+    uint32_t consequent(uint32_t c) const { return lits[clauseOffsets[c + 1] - 1] >> 1; }
+
+    uint32_t intern(const string& t) {
+        const auto it = tupleIds.emplace(t, tupleNames.size()).first;
+        if (it->second == tupleNames.size()) { tupleNames.push_back(&it->first); }
+        return it->second;
+    }
+
+    void printClause(ostream& stream, uint32_t c) const {
+        for (uint32_t i = clauseOffsets[c]; i < clauseOffsets[c + 1]; i++) {
+            stream << (i > clauseOffsets[c] ? ", " : "") << (lits[i] & 1 ? "NOT " : "") << *tupleNames[lits[i] >> 1];
+        }
+    }
+
+    // Compares two literals as the strings "t" or "NOT t" would be compared.
+    int compareLiterals(uint32_t l1, uint32_t l2) const {
+        const string& name1 = *tupleNames[l1 >> 1];
+        const string& name2 = *tupleNames[l2 >> 1];
+        const size_t prefix1 = l1 & 1 ? 4 : 0, prefix2 = l2 & 1 ? 4 : 0;
+        const size_t length1 = prefix1 + name1.size(), length2 = prefix2 + name2.size();
+        for (size_t i = 0; i < min(length1, length2); i++) {
+            const unsigned char c1 = i < prefix1 ? "NOT "[i] : name1[i - prefix1];
+            const unsigned char c2 = i < prefix2 ? "NOT "[i] : name2[i - prefix2];
+            if (c1 != c2) { return c1 < c2 ? -1 : 1; }
+        }
+        return length1 < length2 ? -1 : length1 > length2 ? 1 : 0;
+    }
+};
+
+// Builds the offsets and items of a CSR array, given the key of each occurrence, in order.
+void buildCsr(const vector<uint32_t>& keys, const vector<uint32_t>& items, size_t numKeys,
+              vector<uint32_t> *offsets, vector<uint32_t> *sortedItems) {
+    offsets->assign(numKeys + 1, 0);
+    for (const auto key : keys) { (*offsets)[key + 1]++; }
+    for (size_t k = 0; k < numKeys; k++) { (*offsets)[k + 1] += (*offsets)[k]; }
+    vector<uint32_t> next(offsets->begin(), offsets->end() - 1);
+    sortedItems->resize(items.size());
+    for (size_t i = 0; i < keys.size(); i++) { (*sortedItems)[next[keys[i]]++] = items[i]; }
+}
+
+// Reads clauses of the form "ruleName: literal1, literal2, ..., consequent", one per line.
+ClauseGraph loadClauses(istream& in) {
+    ClauseGraph g;
+    unordered_map<string, uint32_t> ruleIds;
+    vector<uint32_t> rawRules, rawOffsets(1, 0), rawLits;
+
+    string inputLine;
+    while (getline(in, inputLine)) {
+        istringstream inputLineStream(inputLine);
+
+        string ruleName;
+        inputLineStream >> ruleName;
+        ruleName.pop_back();
+        const auto ruleIt = ruleIds.emplace(ruleName, g.ruleNames.size()).first;
+        if (ruleIt->second == g.ruleNames.size()) { g.ruleNames.push_back(ruleName); }
+
+        string token;
+        bool lastNot = false;
+        while (inputLineStream >> token) {
+            if (token == "NOT") {
+                lastNot = true;
+            } else {
+                if (token[token.size() - 1] == ',') {
+                    token.pop_back();
+                }
+                rawLits.push_back(2 * g.intern(token) + (lastNot ? 1 : 0));
+                lastNot = false;
+            }
+        }
+
+        assert(rawLits.size() > rawOffsets.back());
+        rawRules.push_back(ruleIt->second);
+        rawOffsets.push_back(rawLits.size());
+    }
+
+    // Sort the clauses as their literals would be sorted as strings, by first ranking the literals themselves.
+    vector<uint32_t> litOrder(2 * g.numTuples());
+    for (size_t l = 0; l < litOrder.size(); l++) { litOrder[l] = l; }
+    sort(litOrder.begin(), litOrder.end(),
+         [&g](uint32_t l1, uint32_t l2) { return g.compareLiterals(l1, l2) < 0; });
+    vector<uint32_t> litRank(litOrder.size());
+    for (size_t r = 0; r < litOrder.size(); r++) { litRank[litOrder[r]] = r; }
+    vector<uint32_t>().swap(litOrder);
+
+    auto clauseLess = [&](uint32_t c1, uint32_t c2) {
+        return lexicographical_compare(rawLits.begin() + rawOffsets[c1], rawLits.begin() + rawOffsets[c1 + 1],
+                                       rawLits.begin() + rawOffsets[c2], rawLits.begin() + rawOffsets[c2 + 1],
+                                       [&litRank](uint32_t l1, uint32_t l2) { return litRank[l1] < litRank[l2]; });
+    };
+    vector<uint32_t> clauseOrder(rawRules.size());
+    for (size_t c = 0; c < clauseOrder.size(); c++) { clauseOrder[c] = c; }
+    stable_sort(clauseOrder.begin(), clauseOrder.end(), clauseLess);
+
+    // Of each run of identical clauses, the last is kept, being the last to appear in the input.
+    g.clauseOffsets.push_back(0);
+    for (size_t i = 0; i < clauseOrder.size(); i++) {
+        const uint32_t c = clauseOrder[i];
+        if (i + 1 < clauseOrder.size() && !clauseLess(c, clauseOrder[i + 1])) { continue; }
+        g.lits.insert(g.lits.end(), rawLits.begin() + rawOffsets[c], rawLits.begin() + rawOffsets[c + 1]);
+        g.clauseOffsets.push_back(g.lits.size());
+        g.clauseRules.push_back(rawRules[c]);
+    }
+    vector<uint32_t>().swap(rawLits);
+    vector<uint32_t>().swap(rawOffsets);
+
+    vector<uint32_t> keys, items;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        for (uint32_t i = g.clauseOffsets[c]; i + 1 < g.clauseOffsets[c + 1]; i++) {
+            keys.push_back(g.lits[i] >> 1);
+            items.push_back(c);
+        }
+    }
+    buildCsr(keys, items, g.numTuples(), &g.antecedentOffsets, &g.antecedentClauses);
+
+    keys.clear();
+    items.clear();
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        assert((g.lits[g.clauseOffsets[c + 1] - 1] & 1) == 0);
+        keys.push_back(g.consequent(c));
+        items.push_back(c);
+    }
+    buildCsr(keys, items, g.numTuples(), &g.consequentOffsets, &g.consequentClauses);
+
+    return g;
+}
+
+// Computes the date of birth of every tuple: 0 for the tuples in edb, and otherwise one more than the latest-born
+// antecedent of the earliest clause to derive it, or UNBORN if no clause ever does.
+// A Knuth-style worklist, which with unit weights is a breadth-first search. Each clause counts its antecedents which
+// are yet to be born. Since tuples leave the worklist in order of birth, a clause fires exactly when its last antecedent
+// is born, and its consequent, unless born already, is born in the next epoch. Each clause is thus visited once per
+// antecedent, however deep the derivations.
+vector<uint32_t> computeDob(const ClauseGraph& g, const vector<bool>& edb) {
+    vector<uint32_t> dob(g.numTuples(), UNBORN);
+    vector<uint32_t> unbornAntecedents(g.numClauses());
+    vector<uint32_t> worklist;
+    worklist.reserve(g.numTuples());
+
+    for (uint32_t t = 0; t < g.numTuples(); t++) {
+        if (edb[t]) {
+            dob[t] = 0;
+            worklist.push_back(t);
+        }
+    }
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        unbornAntecedents[c] = g.clauseOffsets[c + 1] - g.clauseOffsets[c] - 1;
+        if (unbornAntecedents[c] == 0 && dob[g.consequent(c)] == UNBORN) {
+            dob[g.consequent(c)] = 1;
+            worklist.push_back(g.consequent(c));
+        }
+    }
+
+    for (size_t head = 0; head < worklist.size(); head++) {
+        const uint32_t t = worklist[head];
+        for (uint32_t i = g.antecedentOffsets[t]; i < g.antecedentOffsets[t + 1]; i++) {
+            const uint32_t c = g.antecedentClauses[i];
+            unbornAntecedents[c]--;
+            if (unbornAntecedents[c] == 0 && dob[g.consequent(c)] == UNBORN) {
+                dob[g.consequent(c)] = dob[t] + 1;
+                worklist.push_back(g.consequent(c));
+            }
+        }
+    }
+
+    return dob;
+}
+
+uint32_t maxAntecedentDob(const ClauseGraph& g, uint32_t c, const vector<uint32_t>& dob) {
+    uint32_t ans = 0;
+    for (uint32_t i = g.clauseOffsets[c]; i + 1 < g.clauseOffsets[c + 1]; i++) {
+        ans = max(ans, dob[g.lits[i] >> 1]);
+    }
+    return ans;
+}
@@ -3,9 +3,6 @@
 // Given a set of constraints and a set of EDB tuples, filters those constraints which only produce those tuples which
 // are derivable. Needed because mb.py may make some tuples unreachable.
 
-#include <boost/algorithm/string/predicate.hpp>
-using boost::starts_with;
-
 #include <algorithm>
 #include <cassert>
 #include <chrono>
@@ -13,80 +10,27 @@ using boost::starts_with;
 #include <iostream>
 #include <iterator>
 #include <limits>
-#include <map>
-#include <set>
 #include <string>
-#include <unordered_map>
 #include <unordered_set>
 #include <vector>
 #include <fstream>
 using namespace std;
 
 #include "util.h"
-
-////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
-// 0. Prelude
-
-string lit2Tuple(const string& literal) {
-    if (starts_with(literal, "NOT ")) { return literal.substr(4); }
-    else { return literal; }
-}
-
-vector<string> clause2Antecedents(const vector<string>& clause) {
-    if (clause.size() > 1) {
-        vector<string> ans(&clause[0], &clause[clause.size() - 1]);
-        assert(clause.size() == ans.size() + 1);
-        transform(ans.begin(), ans.end(), ans.begin(), &lit2Tuple);
-        return ans;
-    } else { return vector<string>(); }
-}
-
-string clause2Consequent(const vector<string>& clause) {
-    string ans = clause[clause.size() - 1];
-    assert(!starts_with(ans, "NOT "));
-    return ans;
-}
-
-size_t maxAntecedentDob(const vector<string>& clause, const unordered_map<string, size_t>& tupleDob) {
-    size_t ans = 0;
-    for (const auto& literal : clause2Antecedents(clause)) {
-        ans = max(ans, tupleDob.at(lit2Tuple(literal)));
-    }
-    return ans;
-}
+#include "clause-graph.h"
 
 ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 // 1. Compute tuple DOB
 
-unordered_map<string, size_t> computeTupleDob(const set<vector<string>>& allClauses,
-                                              const unordered_set<string>& allTuples,
-                                              const unordered_set<string>& effectiveEDB) {
-    unordered_map<string, size_t> tupleDob;
-    for (const auto& t : allTuples) {
-        tupleDob[t] = effectiveEDB.find(t) == effectiveEDB.end() ? numeric_limits<size_t>::max() : 0;
-    }
-
-    size_t numChanged = 1;
-    while (numChanged > 0) {
-        numChanged = 0;
-        for (const auto& clause : allClauses) {
-            auto consequent = clause2Consequent(clause);
-            size_t newDob = maxAntecedentDob(clause, tupleDob);
-            if (newDob < numeric_limits<size_t>::max()) { newDob++; }
-            if (newDob < tupleDob[consequent]) {
-                numChanged++;
-                tupleDob[consequent] = newDob;
-            }
-        }
-    }
+vector<uint32_t> computeTupleDob(const ClauseGraph& g, const vector<bool>& effectiveEDB) {
+    const auto tupleDob = computeDob(g, effectiveEDB);
 
-    size_t maxDob = 0, unreachableTuples = 0;
-    for (const auto& tupleDobPair : tupleDob) {
-        if (tupleDobPair.second < numeric_limits<size_t>::max()) {
-            maxDob = max(maxDob, tupleDobPair.second);
+    uint32_t maxDob = 0;
+    for (uint32_t t = 0; t < g.numTuples(); t++) {
+        if (tupleDob[t] != UNBORN) {
+            maxDob = max(maxDob, tupleDob[t]);
         } else {
-            clog << __LOGSTR__ << "Discovered unreachable tuple " << tupleDobPair.first << "." << endl;
-            unreachableTuples++;
+            clog << __LOGSTR__ << "Discovered unreachable tuple " << *g.tupleNames[t] << "." << endl;
         }
     }
     clog << __LOGSTR__ << "Last (not necessarily useful) tuple birted at epoch " << maxDob << "." << endl;
@@ -112,62 +56,41 @@ int main(int argc, char *argv[]) {
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // M1. Load clauses
 
-    set<vector<string>> allClauses;
-    map<vector<string>, string> allRuleNames;
-
-    string inputLine;
-    while (getline(cin, inputLine)) {
-        istringstream inputLineStream(inputLine);
-
-        string ruleName;
-        inputLineStream >> ruleName;
-        ruleName.pop_back();
-
-        vector<string> clause;
-
-        string token;
-        bool lastNot = false;
-        while (inputLineStream >> token) {
-            if (token == "NOT") {
-                lastNot = true;
-            } else {
-                if (token[token.size() - 1] == ',') {
-                    token.pop_back();
-                }
-                clause.push_back(lastNot ? "NOT " + token : token);
-                lastNot = false;
-            }
-        }
-
-        assert(clause.size() >= 1);
-        allClauses.insert(clause);
-        allRuleNames[clause] = ruleName;
-    }
-    clog << __LOGSTR__ << "Loaded " << allClauses.size() << " clauses." << endl;
+    const ClauseGraph g = loadClauses(cin);
+    clog << __LOGSTR__ << "Loaded " << g.numClauses() << " clauses." << endl;
 
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // M2. Compute all tuples and consequents,
 
-    unordered_set<string> allTuples;
-    set<string> allConsequents;
-
-    for (const auto& clause : allClauses) {
-        for (const auto& literal : clause) {
-            allTuples.insert(lit2Tuple(literal));
+    vector<bool> isConsequent(g.numTuples(), false);
+    size_t numConsequents = 0;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        if (!isConsequent[g.consequent(c)]) {
+            isConsequent[g.consequent(c)] = true;
+            numConsequents++;
         }
-        allConsequents.insert(clause2Consequent(clause));
     }
 
-    clog << __LOGSTR__ << "Discovered " << allTuples.size() << " tuples." << endl;
-    clog << __LOGSTR__ << "Discovered " << allConsequents.size() << " consequents." << endl;
+    clog << __LOGSTR__ << "Discovered " << g.numTuples() << " tuples." << endl;
+    clog << __LOGSTR__ << "Discovered " << numConsequents << " consequents." << endl;
 
-    // and load all input tuples and new alarms.
+    // and load all input tuples and new alarms. Input tuples which appear in no clause are only counted.
 
-    unordered_set<string> allInputTuples;
+    vector<bool> isInputTuple(g.numTuples(), false);
+    size_t numInputTuples = 0;
+    unordered_set<string> otherInputTuples;
     ifstream edbTupleFile(edbTupleFileName);
     string tup;
-    while (edbTupleFile >> tup) allInputTuples.insert(tup);
-    clog << __LOGSTR__ << "Loaded " << allInputTuples.size() << " input tuples." << endl;
+    while (edbTupleFile >> tup) {
+        const auto it = g.tupleIds.find(tup);
+        if (it == g.tupleIds.end()) {
+            otherInputTuples.insert(tup);
+        } else if (!isInputTuple[it->second]) {
+            isInputTuple[it->second] = true;
+            numInputTuples++;
+        }
+    }
+    clog << __LOGSTR__ << "Loaded " << numInputTuples + otherInputTuples.size() << " input tuples." << endl;
 
     unordered_set<string> allNewAlarms;
     ifstream newAlarmsFile(newAlarmsFileName);
@@ -177,11 +100,11 @@ int main(int argc, char *argv[]) {
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 3. Compute dates of birth of each tuple, and the set of forward clauses
 
-    const auto tupleDob = computeTupleDob(allClauses, allTuples, allInputTuples);
-    unordered_set<vector<string>, vector_hash<string>> fwdClauses;
-    for (const auto& clause : allClauses) {
-        if (maxAntecedentDob(clause, tupleDob) < tupleDob.at(clause2Consequent(clause))) {
-            fwdClauses.insert(clause);
+    const auto tupleDob = computeTupleDob(g, isInputTuple);
+    vector<uint32_t> fwdClauses;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        if (maxAntecedentDob(g, c, tupleDob) < tupleDob[g.consequent(c)]) {
+            fwdClauses.push_back(c);
         }
     }
     clog << __LOGSTR__ << "Discovered " << fwdClauses.size() << " forward clauses." << endl;
@@ -190,7 +113,7 @@ int main(int argc, char *argv[]) {
     // NOTE: Not all new alarms need be derivable when keep-derivable.cpp is called with only the effective EDB set,
     // rather than all EDB nodes. The assertion has therefore been turned off.
     for (const auto& t : allNewAlarms) {
-        if (tupleDob.at(t) == numeric_limits<size_t>::max()) {
+        if (tupleDob[g.tupleIds.at(t)] == UNBORN) {
             clog << __LOGSTR__ << "Unable to derive new alarm " << t << "." << endl;
             // assert(false);
         }
@@ -199,10 +122,14 @@ int main(int argc, char *argv[]) {
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 4. Output the set of active clauses
 
-    for (const auto& clause : fwdClauses) {
-        if (tupleDob.at(clause2Consequent(clause)) < numeric_limits<size_t>::max()) {
-            cout << allRuleNames[clause] << ": " << clause << endl;
-            clog << __LOGSTR__ << "Emitting clause " << clause << endl;
+    for (const auto c : fwdClauses) {
+        if (tupleDob[g.consequent(c)] != UNBORN) {
+            cout << g.ruleNames[g.clauseRules[c]] << ": ";
+            g.printClause(cout, c);
+            cout << endl;
+            clog << __LOGSTR__ << "Emitting clause ";
+            g.printClause(clog, c);
+            clog << endl;
         }
     }
 
@@ -210,7 +137,7 @@ int main(int argc, char *argv[]) {
     ifstream allAlarmsFile(allAlarmsFileName);
     ofstream allDerivableAlarmsFile(allDerivableAlarmsFileName);
     while (allAlarmsFile >> tup) {
-        if (tupleDob.at(tup) < numeric_limits<size_t>::max()) {
+        if (tupleDob[g.tupleIds.at(tup)] != UNBORN) {
             allDerivableAlarmsFile << tup << endl;
         }
     }
@@ -50,25 +50,60 @@ size_t maxAntecedentDob(const vector<string>& clause, const unordered_map<string
 unordered_map<string, size_t> computeTupleDob(const set<vector<string>>& allClauses,
                                               const set<string>& allTuples,
                                               const set<string>& allInputTuples) {
-    unordered_map<string, size_t> tupleDob;
-    for (const auto& t : allTuples) {
-        tupleDob[t] = allInputTuples.find(t) == allInputTuples.end() ? numeric_limits<size_t>::max() : 0;
+    // A Knuth-style worklist, which with unit weights is a breadth-first search. Tuples are numbered, and each clause
+    // counts its antecedents which are yet to be born. Since tuples leave the worklist in order of birth, a clause fires
+    // exactly when its last antecedent is born, and its consequent, unless born already, is born in the next epoch.
+    // Each clause is thus visited once per antecedent, however deep the derivations.
+    vector<string> tupleNames(allTuples.begin(), allTuples.end());
+    unordered_map<string, size_t> tupleIds;
+    tupleIds.reserve(tupleNames.size());
+    for (size_t t = 0; t < tupleNames.size(); t++) { tupleIds[tupleNames[t]] = t; }
+
+    vector<size_t> clauseConsequents;
+    vector<size_t> unbornAntecedents;
+    vector<vector<size_t>> tuple2AntecedentClauses(tupleNames.size());
+    for (const auto& clause : allClauses) {
+        size_t c = clauseConsequents.size();
+        clauseConsequents.push_back(tupleIds.at(clause2Consequent(clause)));
+        unbornAntecedents.push_back(clause.size() - 1);
+        for (size_t i = 0; i + 1 < clause.size(); i++) {
+            tuple2AntecedentClauses[tupleIds.at(lit2Tuple(clause[i]))].push_back(c);
+        }
+    }
+
+    const size_t unborn = numeric_limits<size_t>::max();
+    vector<size_t> dob(tupleNames.size(), unborn);
+    vector<size_t> worklist;
+    worklist.reserve(tupleNames.size());
+    for (const auto& t : allInputTuples) {
+        const auto it = tupleIds.find(t);
+        if (it != tupleIds.end()) {
+            dob[it->second] = 0;
+            worklist.push_back(it->second);
+        }
+    }
+    for (size_t c = 0; c < clauseConsequents.size(); c++) {
+        if (unbornAntecedents[c] == 0 && dob[clauseConsequents[c]] == unborn) {
+            dob[clauseConsequents[c]] = 1;
+            worklist.push_back(clauseConsequents[c]);
+        }
     }
 
-    size_t numChanged = 1;
-    while (numChanged > 0) {
-        numChanged = 0;
-        for (const auto& clause : allClauses) {
-            auto consequent = clause2Consequent(clause);
-            size_t newDob = maxAntecedentDob(clause, tupleDob);
-            if (newDob < numeric_limits<size_t>::max()) { newDob++; }
-            if (newDob < tupleDob[consequent]) {
-                numChanged++;
-                tupleDob[consequent] = newDob;
+    for (size_t head = 0; head < worklist.size(); head++) {
+        const size_t t = worklist[head];
+        for (const size_t c : tuple2AntecedentClauses[t]) {
+            unbornAntecedents[c]--;
+            if (unbornAntecedents[c] == 0 && dob[clauseConsequents[c]] == unborn) {
+                dob[clauseConsequents[c]] = dob[t] + 1;
+                worklist.push_back(clauseConsequents[c]);
             }
         }
     }
 
+    unordered_map<string, size_t> tupleDob;
+    tupleDob.reserve(tupleNames.size());
+    for (size_t t = 0; t < tupleNames.size(); t++) { tupleDob[tupleNames[t]] = dob[t]; }
+
     size_t maxDob = 0, unreachableTuples = 0;
     for (const auto& tupleDobPair : tupleDob) {
         maxDob = max(maxDob, tupleDobPair.second);
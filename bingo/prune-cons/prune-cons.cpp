@@ -1,6 +1,3 @@
-#include <boost/algorithm/string/predicate.hpp>
-using boost::starts_with;
-
 #include <algorithm>
 #include <cassert>
 #include <chrono>
@@ -8,71 +5,25 @@ using boost::starts_with;
 #include <iostream>
 #include <iterator>
 #include <limits>
-#include <map>
-#include <set>
 #include <string>
-#include <unordered_map>
 #include <unordered_set>
 #include <vector>
 #include <fstream>
 using namespace std;
 
 #include "util.h"
+#include "clause-graph.h"
 
-string lit2Tuple(const string& literal) {
-    if (starts_with(literal, "NOT ")) { return literal.substr(4); }
-    else { return literal; }
-}
-
-vector<string> clause2Antecedents(const vector<string>& clause) {
-    if (clause.size() > 1) {
-        vector<string> ans(&clause[0], &clause[clause.size() - 1]);
-        assert(clause.size() == ans.size() + 1);
-        transform(ans.begin(), ans.end(), ans.begin(), &lit2Tuple);
-        return ans;
-    } else { return vector<string>(); }
-}
-
-string clause2Consequent(const vector<string>& clause) {
-    string ans = clause[clause.size() - 1];
-    assert(!starts_with(ans, "NOT "));
-    return ans;
-}
-
-size_t maxAntecedentDob(const vector<string>& clause, const unordered_map<string, size_t>& tupleDob) {
-    size_t ans = 0;
-    for (const auto& literal : clause2Antecedents(clause)) {
-        ans = max(ans, tupleDob.at(lit2Tuple(literal)));
-    }
-    return ans;
-}
+// The network is held as a ClauseGraph, over integer tuple and clause IDs, and sets of tuples and clauses as bitsets.
 
-unordered_map<string, size_t> computeTupleDob(const set<vector<string>>& allClauses,
-                                              const set<string>& allTuples,
-                                              const set<string>& allInputTuples) {
-    unordered_map<string, size_t> tupleDob;
-    for (const auto& t : allTuples) {
-        tupleDob[t] = allInputTuples.find(t) == allInputTuples.end() ? numeric_limits<size_t>::max() : 0;
-    }
-
-    size_t numChanged = 1;
-    while (numChanged > 0) {
-        numChanged = 0;
-        for (const auto& clause : allClauses) {
-            auto consequent = clause2Consequent(clause);
-            size_t newDob = maxAntecedentDob(clause, tupleDob);
-            if (newDob < numeric_limits<size_t>::max()) { newDob++; }
-            if (newDob < tupleDob[consequent]) {
-                numChanged++;
-                tupleDob[consequent] = newDob;
-            }
-        }
-    }
+vector<uint32_t> computeTupleDob(const ClauseGraph& g, const vector<bool>& isInputTuple) {
+    const auto tupleDob = computeDob(g, isInputTuple);
 
-    size_t maxDob = 0, unreachableTuples = 0;
-    for (const auto& tupleDobPair : tupleDob) {
-        maxDob = max(maxDob, tupleDobPair.second);
-        if (tupleDobPair.second == numeric_limits<size_t>::max()) {
+    uint32_t maxDob = 0;
+    size_t unreachableTuples = 0;
+    for (const auto dob : tupleDob) {
+        maxDob = max(maxDob, dob);
+        if (dob == UNBORN) {
             unreachableTuples++;
         }
     }
@@ -82,90 +33,123 @@ unordered_map<string, size_t> computeTupleDob(const set<vector<string>>& allClau
     return tupleDob;
 }
 
+// Marks tuples as ancestors or descendants during ancestorsDescendantsDisjoint(). Allocated once, and cleared after
+// each call by visiting only the tuples it touched, so that each call costs no more than the tuples it reaches.
+struct TraversalMarks {
+    static const uint8_t ANCESTOR = 1;
+    static const uint8_t DESCENDANT = 2;
+    vector<uint8_t> marks;
+    vector<uint32_t> touched;
+
+    explicit TraversalMarks(size_t numTuples) : marks(numTuples, 0) {}
+
+    bool has(uint32_t t, uint8_t mark) const { return marks[t] & mark; }
+
+    void add(uint32_t t, uint8_t mark) {
+        if (marks[t] == 0) { touched.push_back(t); }
+        marks[t] |= mark;
+    }
+
+    void clear() {
+        for (const auto t : touched) { marks[t] = 0; }
+        touched.clear();
+    }
+};
+
 // The ancestors of a clause includes its antecedents
 // The descendants of a clause includes its consequents
-template <typename T, typename U, typename V>
-bool ancestorsDescendantsDisjoint(
-        const vector<vector<string>>& rootClauses,
-        const unordered_set<vector<string>, T>& augFwdClauses,
-        const unordered_map<string, unordered_set<vector<string>, U>>& tuple2AntecedentClauses,
-        const unordered_map<string, unordered_set<vector<string>, V>>& tuple2ConsequentClauses,
-        __attribute__((unused)) const string& indent
+bool ancestorsDescendantsDisjointInt(
+        const ClauseGraph& g,
+        const vector<uint32_t>& rootClauses, size_t beginIndex, size_t endIndex,
+        const vector<bool>& augFwdClauses,
+        TraversalMarks *m
 ) {
-    unordered_set<string> processedAncestors;
-    unordered_set<string> unprocessedAncestors;
-    for (const auto& clause : rootClauses) {
-        for (const auto& t : clause2Antecedents(clause)) {
-            unprocessedAncestors.insert(t);
+    vector<uint32_t> unprocessedAncestors;
+    for (size_t i = beginIndex; i < endIndex; i++) {
+        const uint32_t c = rootClauses[i];
+        for (uint32_t j = g.clauseOffsets[c]; j + 1 < g.clauseOffsets[c + 1]; j++) {
+            const uint32_t t = g.lits[j] >> 1;
+            if (!m->has(t, TraversalMarks::ANCESTOR)) {
+                m->add(t, TraversalMarks::ANCESTOR);
+                unprocessedAncestors.push_back(t);
+            }
         }
     }
 
-    unordered_set<string> processedDescendants;
-    unordered_set<string> unprocessedDescendants;
-    for (const auto& clause : rootClauses) {
-        auto consequent = clause2Consequent(clause);
-        unprocessedDescendants.insert(consequent);
-        if (unprocessedAncestors.find(consequent) != unprocessedAncestors.end()) { return false; }
+    vector<uint32_t> unprocessedDescendants;
+    for (size_t i = beginIndex; i < endIndex; i++) {
+        const uint32_t consequent = g.consequent(rootClauses[i]);
+        if (m->has(consequent, TraversalMarks::ANCESTOR)) { return false; }
+        if (!m->has(consequent, TraversalMarks::DESCENDANT)) {
+            m->add(consequent, TraversalMarks::DESCENDANT);
+            unprocessedDescendants.push_back(consequent);
+        }
     }
 
+    size_t numAncestors = unprocessedAncestors.size();
+    size_t numDescendants = unprocessedDescendants.size();
     while (!unprocessedAncestors.empty() || !unprocessedDescendants.empty()) {
-        size_t numAncestors = processedAncestors.size() + unprocessedAncestors.size();
-        size_t numDescendants = processedDescendants.size() + unprocessedDescendants.size();
         bool dequeueAncestor = unprocessedDescendants.empty() ||
                              (!unprocessedAncestors.empty() && numAncestors < numDescendants);
 
         if (dequeueAncestor) {
-            const auto t = setPop(&unprocessedAncestors);
-
-            for (const auto& clause : tuple2ConsequentClauses.at(t)) {
-                if (augFwdClauses.find(clause) != augFwdClauses.end()) {
-                    for (const auto& antecedent : clause2Antecedents(clause)) {
-                        if (processedAncestors.find(antecedent) == processedAncestors.end() &&
-                            unprocessedAncestors.find(antecedent) == unprocessedAncestors.end()) {
-                            if (processedDescendants.find(antecedent) != processedDescendants.end() ||
-                                unprocessedDescendants.find(antecedent) != unprocessedDescendants.end()) {
-                                return false;
-                            }
-                            unprocessedAncestors.insert(antecedent);
+            const uint32_t t = unprocessedAncestors.back();
+            unprocessedAncestors.pop_back();
+
+            for (uint32_t i = g.consequentOffsets[t]; i < g.consequentOffsets[t + 1]; i++) {
+                const uint32_t c = g.consequentClauses[i];
+                if (augFwdClauses[c]) {
+                    for (uint32_t j = g.clauseOffsets[c]; j + 1 < g.clauseOffsets[c + 1]; j++) {
+                        const uint32_t antecedent = g.lits[j] >> 1;
+                        if (!m->has(antecedent, TraversalMarks::ANCESTOR)) {
+                            if (m->has(antecedent, TraversalMarks::DESCENDANT)) { return false; }
+                            m->add(antecedent, TraversalMarks::ANCESTOR);
+                            unprocessedAncestors.push_back(antecedent);
+                            numAncestors++;
                         }
                     }
                 }
             }
-
-            processedAncestors.insert(t);
         } else {
-            const auto t = setPop(&unprocessedDescendants);
-
-            for (const auto& clause : tuple2AntecedentClauses.at(t)) {
-                if (augFwdClauses.find(clause) != augFwdClauses.end()) {
-                    const auto consequent = clause2Consequent(clause);
-                    if (processedDescendants.find(consequent) == processedDescendants.end() &&
-                        unprocessedDescendants.find(consequent) == unprocessedDescendants.end()) {
-                        if (processedAncestors.find(consequent) != processedAncestors.end() ||
-                            unprocessedAncestors.find(consequent) != unprocessedAncestors.end()) {
-                            return false;
-                        }
-                        unprocessedDescendants.insert(consequent);
+            const uint32_t t = unprocessedDescendants.back();
+            unprocessedDescendants.pop_back();
+
+            for (uint32_t i = g.antecedentOffsets[t]; i < g.antecedentOffsets[t + 1]; i++) {
+                const uint32_t c = g.antecedentClauses[i];
+                if (augFwdClauses[c]) {
+                    const uint32_t consequent = g.consequent(c);
+                    if (!m->has(consequent, TraversalMarks::DESCENDANT)) {
+                        if (m->has(consequent, TraversalMarks::ANCESTOR)) { return false; }
+                        m->add(consequent, TraversalMarks::DESCENDANT);
+                        unprocessedDescendants.push_back(consequent);
+                        numDescendants++;
                     }
                 }
             }
-
-            processedDescendants.insert(t);
         }
     }
 
     return true;
 }
 
-template <typename T1, typename T2, typename T3, typename T4>
+bool ancestorsDescendantsDisjoint(
+        const ClauseGraph& g,
+        const vector<uint32_t>& rootClauses, size_t beginIndex, size_t endIndex,
+        const vector<bool>& augFwdClauses,
+        TraversalMarks *m
+) {
+    bool ans = ancestorsDescendantsDisjointInt(g, rootClauses, beginIndex, endIndex, augFwdClauses, m);
+    m->clear();
+    return ans;
+}
+
 void augmentInt(
-        const set<vector<string>>& allClauses,
-        const unordered_set<vector<string>, T1>& fwdClauses,
-        const unordered_map<string, unordered_set<vector<string>, T2>>& tuple2AntecedentClauses,
-        const unordered_map<string, unordered_set<vector<string>, T3>>& tuple2ConsequentClauses,
-        const vector<vector<string>>& nonFwdClauses,
+        const ClauseGraph& g,
+        const vector<uint32_t>& nonFwdClauses,
         size_t beginIndex, size_t endIndex,
-        unordered_set<vector<string>, T4> *augmentedFwdClauses,
+        vector<bool> *augmentedFwdClauses,
+        size_t *numAugmentedFwdClauses,
+        TraversalMarks *m,
         string indent = ""
 ) {
     assert(beginIndex < nonFwdClauses.size());
@@ -174,47 +158,41 @@ void augmentInt(
     clog << __LOGSTR__ << indent << "augmentInt(" << beginIndex << ", "
                                                   << endIndex << ": "
                                                   << endIndex - beginIndex << ")" << endl;
-    clog << __LOGSTR__ << indent << "augmentedFwdClauses->size(): " << augmentedFwdClauses->size() << endl;
+    clog << __LOGSTR__ << indent << "augmentedFwdClauses->size(): " << *numAugmentedFwdClauses << endl;
 
     if (beginIndex == endIndex) { return; }
 
-    vector<vector<string>> rootClauses(nonFwdClauses.begin() + beginIndex, nonFwdClauses.begin() + endIndex);
-
-    if (ancestorsDescendantsDisjoint(rootClauses, *augmentedFwdClauses,
-                                     tuple2AntecedentClauses, tuple2ConsequentClauses, indent)) {
+    if (ancestorsDescendantsDisjoint(g, nonFwdClauses, beginIndex, endIndex, *augmentedFwdClauses, m)) {
         clog << __LOGSTR__ << indent << "augFwdClauses remains non-circular." << endl;
-        copy(rootClauses.begin(), rootClauses.end(), inserter(*augmentedFwdClauses, augmentedFwdClauses->end()));
+        for (size_t i = beginIndex; i < endIndex; i++) {
+            (*augmentedFwdClauses)[nonFwdClauses[i]] = true;
+        }
+        *numAugmentedFwdClauses += endIndex - beginIndex;
     } else {
         clog << __LOGSTR__ << indent << "augFwdClauses would become circular." << endl;
         if (beginIndex + 1 == endIndex) {
-            clog << __LOGSTR__ << indent << "Discovered backward clause: " << nonFwdClauses[beginIndex] << endl;
+            clog << __LOGSTR__ << indent << "Discovered backward clause: ";
+            g.printClause(clog, nonFwdClauses[beginIndex]);
+            clog << endl;
             return;
         }
 
         size_t mid = (beginIndex + endIndex) / 2;
-        augmentInt(allClauses, fwdClauses, tuple2AntecedentClauses, tuple2ConsequentClauses, nonFwdClauses,
-                   beginIndex, mid, augmentedFwdClauses, indent + "  ");
-        augmentInt(allClauses, fwdClauses, tuple2AntecedentClauses, tuple2ConsequentClauses, nonFwdClauses,
-                   mid, endIndex, augmentedFwdClauses, indent + "  ");
+        augmentInt(g, nonFwdClauses, beginIndex, mid, augmentedFwdClauses, numAugmentedFwdClauses, m, indent + "  ");
+        augmentInt(g, nonFwdClauses, mid, endIndex, augmentedFwdClauses, numAugmentedFwdClauses, m, indent + "  ");
     }
 }
 
-template <typename T1, typename T2, typename T3>
-unordered_set<vector<string>, vector_hash<string>> augment(
-        const set<vector<string>>& allClauses,
-        const unordered_set<vector<string>, T1>& fwdClauses,
-        const unordered_map<string, unordered_set<vector<string>, T2>>& tuple2AntecedentClauses,
-        const unordered_map<string, unordered_set<vector<string>, T3>>& tuple2ConsequentClauses
-) {
-    vector<vector<string>> nonFwdClauses;
-    for (const auto& clause : allClauses) {
-        if (fwdClauses.find(clause) == fwdClauses.end()) { nonFwdClauses.push_back(clause); }
+vector<bool> augment(const ClauseGraph& g, const vector<bool>& fwdClauses, size_t numFwdClauses) {
+    vector<uint32_t> nonFwdClauses;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        if (!fwdClauses[c]) { nonFwdClauses.push_back(c); }
     }
 
-    unordered_set<vector<string>, vector_hash<string>> augmentedFwdClauses(fwdClauses.begin(), fwdClauses.end());
-    // for (const auto& clause : fwdClauses) { ans.insert(clause); }
-    augmentInt(allClauses, fwdClauses, tuple2AntecedentClauses, tuple2ConsequentClauses, nonFwdClauses,
-               0, nonFwdClauses.size(), &augmentedFwdClauses);
+    vector<bool> augmentedFwdClauses = fwdClauses;
+    size_t numAugmentedFwdClauses = numFwdClauses;
+    TraversalMarks m(g.numTuples());
+    augmentInt(g, nonFwdClauses, 0, nonFwdClauses.size(), &augmentedFwdClauses, &numAugmentedFwdClauses, &m);
     return augmentedFwdClauses;
 }
 
@@ -233,63 +211,29 @@ int main(int argc, char *argv[]) {
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 1. Accept input
 
-    set<vector<string>> allClauses;
-    map<vector<string>, string> allRuleNames;
-
-    string inputLine;
-    while (getline(cin, inputLine)) {
-        istringstream inputLineStream(inputLine);
-
-        string ruleName;
-        inputLineStream >> ruleName;
-        ruleName.pop_back();
-
-        vector<string> clause;
-
-        string token;
-        bool lastNot = false;
-        while (inputLineStream >> token) {
-            if (token == "NOT") {
-                lastNot = true;
-            } else {
-                if (token[token.size() - 1] == ',') {
-                    token.pop_back();
-                }
-                clause.push_back(lastNot ? "NOT " + token : token);
-                lastNot = false;
-            }
-        }
-
-        assert(clause.size() >= 1);
-        allClauses.insert(clause);
-        allRuleNames[clause] = ruleName;
-    }
-    clog << __LOGSTR__ << "Loaded " << allClauses.size() << " clauses." << endl;
+    const ClauseGraph g = loadClauses(cin);
+    clog << __LOGSTR__ << "Loaded " << g.numClauses() << " clauses." << endl;
 
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 2. Compute all tuples and consequents,
 
-    set<string> allTuples;
-    set<string> allConsequents;
-
-    for (const auto& clause : allClauses) {
-        for (const auto& literal : clause) {
-            allTuples.insert(lit2Tuple(literal));
+    vector<bool> isConsequent(g.numTuples(), false);
+    size_t numConsequents = 0;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        if (!isConsequent[g.consequent(c)]) {
+            isConsequent[g.consequent(c)] = true;
+            numConsequents++;
         }
-
-        allConsequents.insert(clause2Consequent(clause));
     }
 
-    clog << __LOGSTR__ << "Discovered " << allTuples.size() << " tuples." << endl;
-    clog << __LOGSTR__ << "Discovered " << allConsequents.size() << " consequents." << endl;
+    clog << __LOGSTR__ << "Discovered " << g.numTuples() << " tuples." << endl;
+    clog << __LOGSTR__ << "Discovered " << numConsequents << " consequents." << endl;
 
-    // all input and output tuples,
+    // all input and output tuples.
 
-    set<string> allInputTuples;
-    set_difference(allTuples.begin(), allTuples.end(),
-                   allConsequents.begin(), allConsequents.end(),
-                   inserter(allInputTuples, allInputTuples.end()));
-    clog << __LOGSTR__ << "Discovered " << allInputTuples.size() << " input tuples." << endl;
+    vector<bool> isInputTuple(g.numTuples());
+    for (uint32_t t = 0; t < g.numTuples(); t++) { isInputTuple[t] = !isConsequent[t]; }
+    clog << __LOGSTR__ << "Discovered " << g.numTuples() - numConsequents << " input tuples." << endl;
 
     unordered_set<string> allOutputTuples;
     ifstream opTupleFile(opTupleFileName);
@@ -297,88 +241,85 @@ int main(int argc, char *argv[]) {
     while (opTupleFile >> tup) allOutputTuples.insert(tup);
     clog << __LOGSTR__ << "Loaded " << allOutputTuples.size() << " output tuples." << endl;
 
+    vector<uint32_t> outputTuples;
     for (const auto& t : allOutputTuples) {
-        if(allConsequents.find(t) == allConsequents.end()) {
+        const auto it = g.tupleIds.find(t);
+        if (it == g.tupleIds.end() || !isConsequent[it->second]) {
             clog << __LOGSTR__ << "Unable to find output tuple " << t << "." << endl;
         }
-        assert(allConsequents.find(t) != allConsequents.end());
-    }
-
-    // and map each tuple to the clauses in which it appears.
-
-    unordered_map<string, unordered_set<vector<string>, vector_hash<string>>> tuple2AntecedentClauses;
-    unordered_map<string, unordered_set<vector<string>, vector_hash<string>>> tuple2ConsequentClauses;
-
-    for (const auto& t : allTuples) {
-        tuple2AntecedentClauses[t] = unordered_set<vector<string>, vector_hash<string>>();
-        tuple2ConsequentClauses[t] = unordered_set<vector<string>, vector_hash<string>>();
-    }
-
-    for (const auto& clause : allClauses) {
-        for (size_t i = 0; i + 1 < clause.size(); i++) {
-            const auto& t = lit2Tuple(clause[i]);
-            tuple2AntecedentClauses[t].insert(clause);
-        }
-        tuple2ConsequentClauses[clause2Consequent(clause)].insert(clause);
+        assert(it != g.tupleIds.end() && isConsequent[it->second]);
+        outputTuples.push_back(it->second);
     }
 
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 3. Compute dates of birth of each tuple, and the set of forward clauses
 
-    const auto tupleDob = computeTupleDob(allClauses, allTuples, allInputTuples);
-    unordered_set<vector<string>, vector_hash<string>> fwdClauses;
-    for (const auto& clause : allClauses) {
-        if (maxAntecedentDob(clause, tupleDob) < tupleDob.at(clause2Consequent(clause))) {
-            fwdClauses.insert(clause);
+    const auto tupleDob = computeTupleDob(g, isInputTuple);
+    vector<bool> fwdClauses(g.numClauses(), false);
+    size_t numFwdClauses = 0;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        if (maxAntecedentDob(g, c, tupleDob) < tupleDob[g.consequent(c)]) {
+            fwdClauses[c] = true;
+            numFwdClauses++;
         }
     }
-    clog << __LOGSTR__ << "Discovered " << fwdClauses.size() << " forward clauses." << endl;
+    clog << __LOGSTR__ << "Discovered " << numFwdClauses << " forward clauses." << endl;
 
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 4. Augment the set of forward clauses
 
-    const auto augFwdClauses = doAugment ?
-                               augment(allClauses, fwdClauses, tuple2AntecedentClauses, tuple2ConsequentClauses) :
-                               fwdClauses;
-    clog << __LOGSTR__ << "Discovered " << augFwdClauses.size() << " augmented forward clauses." << endl;
+    const auto augFwdClauses = doAugment ? augment(g, fwdClauses, numFwdClauses) : fwdClauses;
+    clog << __LOGSTR__ << "Discovered " << count(augFwdClauses.begin(), augFwdClauses.end(), true)
+                       << " augmented forward clauses." << endl;
 
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 5. Compute the set of coreachable tuples
 
-    unordered_set<string> coreachableTuples = allOutputTuples;
+    vector<bool> coreachableTuples(g.numTuples(), false);
+    size_t numCoreachableTuples = 0;
+    vector<uint32_t> unprocessedTuples;
+    for (const auto t : outputTuples) {
+        coreachableTuples[t] = true;
+        numCoreachableTuples++;
+        unprocessedTuples.push_back(t);
+    }
 
-    unordered_set<string> unprocessedTuples = coreachableTuples;
     while (!unprocessedTuples.empty()) {
-        const auto t = setPop(&unprocessedTuples);
-        for (const auto& clause : tuple2ConsequentClauses.at(t)) {
-            assert(t == clause2Consequent(clause));
-            if (augFwdClauses.find(clause) != augFwdClauses.end()) {
-                for (const auto& tPrime : clause2Antecedents(clause)) {
-                    if (coreachableTuples.find(tPrime) == coreachableTuples.end()) {
-                        unprocessedTuples.insert(tPrime);
+        const uint32_t t = unprocessedTuples.back();
+        unprocessedTuples.pop_back();
+        for (uint32_t i = g.consequentOffsets[t]; i < g.consequentOffsets[t + 1]; i++) {
+            const uint32_t c = g.consequentClauses[i];
+            assert(t == g.consequent(c));
+            if (augFwdClauses[c]) {
+                for (uint32_t j = g.clauseOffsets[c]; j + 1 < g.clauseOffsets[c + 1]; j++) {
+                    const uint32_t tPrime = g.lits[j] >> 1;
+                    if (!coreachableTuples[tPrime]) {
+                        coreachableTuples[tPrime] = true;
+                        numCoreachableTuples++;
+                        unprocessedTuples.push_back(tPrime);
                     }
                 }
             }
         }
-        coreachableTuples.insert(t);
     }
 
-    clog << __LOGSTR__ << "Discovered " << coreachableTuples.size() << " coreachable tuples." << endl;
+    clog << __LOGSTR__ << "Discovered " << numCoreachableTuples << " coreachable tuples." << endl;
 
     ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
     // 6. Compute the set of active clauses
 
-    unordered_set<vector<string>, vector_hash<string>> activeClauses;
-    for (const auto& clause : augFwdClauses) {
-        const auto consequent = clause2Consequent(clause);
-        if (coreachableTuples.find(consequent) != coreachableTuples.end()) {
-            activeClauses.insert(clause);
+    vector<uint32_t> activeClauses;
+    for (uint32_t c = 0; c < g.numClauses(); c++) {
+        if (augFwdClauses[c] && coreachableTuples[g.consequent(c)]) {
+            activeClauses.push_back(c);
         }
     }
     clog << __LOGSTR__ << "Discovered " << activeClauses.size() << " active clauses." << endl;
 
-    for (const auto& clause : activeClauses) {
-        cout << allRuleNames[clause] << ": " << clause << endl;
+    for (const auto c : activeClauses) {
+        cout << g.ruleNames[g.clauseRules[c]] << ": ";
+        g.printClause(cout, c);
+        cout << endl;
     }
 
     clog << __LOGSTR__ << "Bye!" << endl;
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# Incrementally maintained ranking of alarms, for use by the alarm carousel in driver.py.
+
+# Alarms are identified by integer IDs, assigned in lexicographic order of the tuples, so that ties in confidence are
+# broken exactly as by the sort in driver.py. Alarms are ranked by the key (group, -confidence, id), where group is POS,
+# UNLABELLED or NEG, so that positively labelled alarms come first. confidences holds the values by which the alarms are
+# ranked: update() only repositions the alarms whose marginal has moved by more than the given tolerance since they
+# were last ranked, so each confidence is within tolerance of the marginal it was last given.
+
+# The ranking is held in three structures, each updated in O(log n) when an alarm is repositioned or labelled:
+# 1. An indexed binary heap of the unlabelled alarms, ordered by (-confidence, id), whose root is the top unlabelled
+#    alarm. heapPos maps each alarm to its position in the heap, or to -1 once it has been labelled.
+# 2. The keys of all alarms, bucketed by group and confidence into slots, in ranking order. Each slot holds the sorted
+#    keys (-confidence, id) of its alarms, and separately of its true alarms. Slots are small unless many alarms share
+#    nearly the same confidence, as negatively labelled alarms often do.
+# 3. Fenwick trees over the slots, counting all alarms and true alarms, from which the number of true or false alarms
+#    ranked above any key follows. The inversion count is kept up to date as alarms move, using these counts.
+# If more than 1 / REBUILD_FRACTION of the alarms move at once, as in the first round, all three are instead rebuilt in
+# one pass over the slots.
+
+import bisect
+from array import array
+
+POS = 0
+UNLABELLED = 1
+NEG = 2
+
+NUM_BUCKETS = 1 << 12
+REBUILD_FRACTION = 16
+
+def group2Str(group):
+    return 'Unlabelled' if group == UNLABELLED else 'PosLabel' if group == POS else 'NegLabel'
+
+class FenwickTree:
+    # Counts over the positions 0, 1, ..., n - 1, with updates and prefix sums in O(log n).
+    def __init__(self, counts):
+        self.tree = array('l', [ 0 ]) + array('l', counts)
+        for p in range(1, len(self.tree)):
+            parent = p + (p & -p)
+            if parent < len(self.tree): self.tree[parent] = self.tree[parent] + self.tree[p]
+
+    def add(self, pos, delta):
+        pos = pos + 1
+        while pos < len(self.tree):
+            self.tree[pos] = self.tree[pos] + delta
+            pos = pos + (pos & -pos)
+
+    def prefix(self, pos):
+        # The sum of the counts at positions before pos.
+        ans = 0
+        while pos > 0:
+            ans = ans + self.tree[pos]
+            pos = pos & (pos - 1)
+        return ans
+
+class RankingIndex:
+    def __init__(self, tuples, trueTuples):
+        self.tuples = sorted(tuples)
+        self.ids = { t: i for i, t in enumerate(self.tuples) }
+        self.confidences = array('d', [ 0.0 ] * len(self.tuples))
+        self.groups = array('b', [ UNLABELLED ] * len(self.tuples))
+        self.isTrue = array('b', [ t in trueTuples for t in self.tuples ])
+        self.numTrueAlarms = sum(self.isTrue)
+        self.numUnlabelled = len(self.tuples)
+        self.rebuild()
+
+    def key(self, i):
+        return (-self.confidences[i], i)
+
+    def slot(self, i):
+        bucket = int((1.0 - self.confidences[i]) * NUM_BUCKETS)
+        return self.groups[i] * NUM_BUCKETS + min(max(bucket, 0), NUM_BUCKETS - 1)
+
+    def rebuild(self):
+        self.slots = [ [] for _ in range(3 * NUM_BUCKETS) ]
+        self.trueSlots = [ [] for _ in range(3 * NUM_BUCKETS) ]
+        for i in range(len(self.tuples)):
+            s = self.slot(i)
+            self.slots[s].append(self.key(i))
+            if self.isTrue[i]: self.trueSlots[s].append(self.key(i))
+        for keys in self.slots: keys.sort()
+        for keys in self.trueSlots: keys.sort()
+        self.allCounts = FenwickTree([ len(keys) for keys in self.slots ])
+        self.trueCounts = FenwickTree([ len(keys) for keys in self.trueSlots ])
+
+        # The unlabelled alarms, in ranking order, already form a heap.
+        unlabelledSlots = self.slots[(UNLABELLED * NUM_BUCKETS):((UNLABELLED + 1) * NUM_BUCKETS)]
+        self.heap = [ i for keys in unlabelledSlots for _, i in keys ]
+        self.heapPos = array('l', [ -1 ] * len(self.tuples))
+        for p, i in enumerate(self.heap): self.heapPos[i] = p
+
+        self.numInversions = 0
+        numFalseAbove = 0
+        for keys in self.slots:
+            for _, i in keys:
+                if self.isTrue[i]: self.numInversions = self.numInversions + numFalseAbove
+                else: numFalseAbove = numFalseAbove + 1
+
+    ####################################################################################################################
+    # 1. Slots and inversions
+
+    def _countAbove(self, s, k):
+        # Returns the numbers of alarms and of true alarms ranked above the key k in slot s.
+        numAll = self.allCounts.prefix(s) + bisect.bisect_left(self.slots[s], k)
+        numTrue = self.trueCounts.prefix(s) + bisect.bisect_left(self.trueSlots[s], k)
+        return numAll, numTrue
+
+    def _inversionsOf(self, i, s, k):
+        # The number of inversions in which alarm i, with key k in slot s, takes part, not counting itself.
+        numAll, numTrue = self._countAbove(s, k)
+        return numAll - numTrue if self.isTrue[i] else self.numTrueAlarms - numTrue
+
+    def _remove(self, i):
+        s, k = self.slot(i), self.key(i)
+        del self.slots[s][bisect.bisect_left(self.slots[s], k)]
+        self.allCounts.add(s, -1)
+        if self.isTrue[i]:
+            del self.trueSlots[s][bisect.bisect_left(self.trueSlots[s], k)]
+            self.trueCounts.add(s, -1)
+        self.numInversions = self.numInversions - self._inversionsOf(i, s, k)
+
+    def _insert(self, i):
+        s, k = self.slot(i), self.key(i)
+        self.numInversions = self.numInversions + self._inversionsOf(i, s, k)
+        bisect.insort(self.slots[s], k)
+        self.allCounts.add(s, 1)
+        if self.isTrue[i]:
+            bisect.insort(self.trueSlots[s], k)
+            self.trueCounts.add(s, 1)
+
+    ####################################################################################################################
+    # 2. Heap of unlabelled alarms
+
+    def _heapBefore(self, i, j):
+        return self.confidences[i] > self.confidences[j] or (self.confidences[i] == self.confidences[j] and i < j)
+
+    def _heapSet(self, p, i):
+        self.heap[p] = i
+        self.heapPos[i] = p
+
+    def _siftUp(self, p):
+        i = self.heap[p]
+        while p > 0 and self._heapBefore(i, self.heap[(p - 1) // 2]):
+            self._heapSet(p, self.heap[(p - 1) // 2])
+            p = (p - 1) // 2
+        self._heapSet(p, i)
+
+    def _siftDown(self, p):
+        i = self.heap[p]
+        while 2 * p + 1 < len(self.heap):
+            c = 2 * p + 1
+            if c + 1 < len(self.heap) and self._heapBefore(self.heap[c + 1], self.heap[c]): c = c + 1
+            if not self._heapBefore(self.heap[c], i): break
+            self._heapSet(p, self.heap[c])
+            p = c
+        self._heapSet(p, i)
+
+    def _heapRemove(self, i):
+        p = self.heapPos[i]
+        last = self.heap.pop()
+        self.heapPos[i] = -1
+        if last != i:
+            self._heapSet(p, last)
+            self._siftUp(p)
+            self._siftDown(self.heapPos[last])
+
+    ####################################################################################################################
+    # 3. Interface
+
+    def update(self, confidences, tolerance=0.0):
+        # Takes the marginals of all alarms, in ID order, and returns the IDs of the alarms whose confidence moved by
+        # more than tolerance, and which have therefore been repositioned.
+        changed = [ i for i, (old, new) in enumerate(zip(self.confidences, confidences)) if abs(new - old) > tolerance ]
+        if len(changed) * REBUILD_FRACTION > len(self.tuples):
+            for i in changed: self.confidences[i] = confidences[i]
+            self.rebuild()
+        else:
+            for i in changed:
+                self._remove(i)
+                self.confidences[i] = confidences[i]
+                self._insert(i)
+                if self.heapPos[i] >= 0:
+                    self._siftUp(self.heapPos[i])
+                    self._siftDown(self.heapPos[i])
+        return changed
+
+    def label(self, t, value):
+        i = self.ids[t]
+        assert self.groups[i] == UNLABELLED, 'Attempting to relabel alarm {0}'.format(t)
+        self._remove(i)
+        self.groups[i] = POS if value else NEG
+        self._insert(i)
+        self._heapRemove(i)
+        self.numUnlabelled = self.numUnlabelled - 1
+
+    def label2Str(self, t):
+        return group2Str(self.groups[self.ids[t]])
+
+    def topUnlabelled(self):
+        assert self.numUnlabelled > 0
+        i = self.heap[0]
+        return self.tuples[i], self.confidences[i]
+
+    def rankedAlarms(self):
+        for keys in self.slots:
+            for negConfidence, i in keys:
+                yield self.tuples[i], -negConfidence
+
+    def inversionCount(self):
+        # The number of pairs (f, t) of a false alarm f ranked above a true alarm t.
+        return self.numInversions
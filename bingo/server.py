@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+# Serves the commands of driver.py over a socket, so that clients need not pay to start the driver and load the network
+# for every interaction. The network is loaded once, and shared by any number of named sessions, each of which holds
+# its own evidence, exactly as a separate invocation of driver.py would.
+
+# ./bingo/server.py bnet-dict.out factor-graph.fg base_queries.txt oracle_queries.txt wrapperExecutable address \
+#                   [oldLabels.txt]
+# The first five arguments, and the last, are as accepted by driver.py. The address is either the path of a Unix socket,
+# or host:port to listen on TCP.
+
+# Protocol: Clients send one command per line, and receive its output, exactly as driver.py prints it on stdout. Each
+# connection starts in the session named "default". In addition to the commands of driver.py (see Session.execute in
+# session.py), the server accepts:
+# 1. SESSION name: Switch this connection to the session with the given name, creating it if necessary.
+#    Output: 'SESSION name new' or 'SESSION name existing'.
+# 2. CLOSE name: Discard the session with the given name, and all its evidence.
+#    Output: 'CLOSE name'.
+# If a command fails, the output is instead a single line 'ERROR message'. A command which driver.py would answer with
+# no output at all is acknowledged instead, so that clients can tell when it has finished: AC by 'AC done', and a blank
+# line by a blank line. A command which was waiting for its session while another connection closed it fails.
+# Example:
+# ./bingo/server.py .../bnet-dict.out .../factor-graph.fg .../Alarm.txt .../GroundTruth.txt inproc /tmp/bingo.sock &
+# printf 'SESSION alice\nBP 1e-6 500 1000 100\nHA\n' | nc -U -q 1 /tmp/bingo.sock
+
+import io
+import logging
+import os
+import session
+import socketserver
+import sys
+import threading
+
+dictFileName = sys.argv[1]
+fgFileName = sys.argv[2]
+baseQueriesFileName = sys.argv[3]
+oracleQueriesFileName = sys.argv[4]
+wrapperExecutable = sys.argv[5]
+address = sys.argv[6]
+oldLabelsFileName = sys.argv[7] if len(sys.argv) > 7 else None
+
+logging.basicConfig(level=logging.INFO, \
+                    format="[%(asctime)s] %(levelname)s [%(threadName)s %(name)s.%(funcName)s:%(lineno)d] %(message)s", \
+                    datefmt="%H:%M:%S")
+
+########################################################################################################################
+# 1. Load the network
+
+bnetDict = session.loadBnetDict(dictFileName)
+oracleQueries = session.loadTuples(oracleQueriesFileName)
+baseQueries = session.loadTuples(baseQueriesFileName)
+oldLabels = session.loadTuples(oldLabelsFileName) if oldLabelsFileName != None else set()
+
+logging.info('Populated {} oracle queries.'.format(len(oracleQueries)))
+logging.info('Populated {} base queries.'.format(len(baseQueries)))
+logging.info('Loaded {} old labels'.format(len(oldLabels)))
+
+if wrapperExecutable == 'inproc':
+    import bp
+    fg = bp.loadFactorGraph(fgFileName)
+    logging.info('Loaded factor graph with {0} variables in-process.'.format(fg.numVars))
+    def startEngine():
+        return bp.BeliefPropagation(fg)
+else:
+    # LibDAI holds its own copy of the network, so each session needs its own wrapper.
+    def startEngine():
+        return session.Wrapper(wrapperExecutable, fgFileName)
+
+########################################################################################################################
+# 2. Sessions
+
+class SessionEntry:
+    # A named session, and the lock which serializes its commands. interaction is None until its engine has started,
+    # and closed is set, while holding lock, once the session has been discarded. Commands must therefore check closed
+    # after acquiring lock.
+    def __init__(self):
+        self.interaction = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+sessions = {} # name -> SessionEntry
+sessionsLock = threading.Lock()
+
+def getSession(name):
+    # Returns the session with the given name, and whether it was newly created.
+    with sessionsLock:
+        if name in sessions: return sessions[name], False
+        entry = SessionEntry()
+        entry.lock.acquire()
+        sessions[name] = entry
+
+    # With LibDAI, starting the engine spawns a wrapper and loads the network into it, so this is done outside
+    # sessionsLock, and only commands for this session wait for it.
+    try:
+        engine = startEngine()
+        engine.__enter__()
+        entry.interaction = session.Session(engine, bnetDict, baseQueries, oracleQueries, oldLabels)
+        logging.info('Started session {0}.'.format(name))
+    except:
+        entry.closed = True
+        with sessionsLock:
+            if sessions.get(name) is entry: del sessions[name]
+        raise
+    finally:
+        entry.lock.release()
+    return entry, True
+
+def closeSession(name):
+    with sessionsLock:
+        entry = sessions.pop(name)
+    with entry.lock:
+        if not entry.closed: entry.interaction.engine.__exit__(None, None, None)
+        entry.closed = True
+    logging.info('Closed session {0}.'.format(name))
+
+########################################################################################################################
+# 3. Serve
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        name = 'default'
+        for line in self.rfile:
+            command = line.decode().strip()
+            components = command.split()
+            outFile = io.StringIO()
+            try:
+                if len(components) == 2 and components[0] == 'SESSION':
+                    name = components[1]
+                    _, isNew = getSession(name)
+                    print('SESSION {0} {1}'.format(name, 'new' if isNew else 'existing'), file=outFile)
+                elif len(components) == 2 and components[0] == 'CLOSE':
+                    closeSession(components[1])
+                    print('CLOSE {0}'.format(components[1]), file=outFile)
+                else:
+                    entry, _ = getSession(name)
+                    with entry.lock:
+                        if entry.closed: raise RuntimeError('Session {0} was closed'.format(name))
+                        entry.interaction.execute(command, outFile)
+                    if len(components) == 0: print(file=outFile)
+                    elif components[0] == 'AC': print('AC done', file=outFile)
+            except Exception as e:
+                # A failed command is reported to its client, rather than bringing down every other session.
+                logging.exception('Command {0} failed in session {1}'.format(command, name))
+                outFile = io.StringIO()
+                print('ERROR {0}'.format(repr(e)), file=outFile)
+            self.wfile.write(outFile.getvalue().encode())
+            self.wfile.flush()
+
+class ThreadingUnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if ':' in address and not os.path.sep in address:
+    host, port = address.rsplit(':', 1)
+    server = ThreadingTCPServer((host, int(port)), Handler)
+else:
+    if os.path.exists(address): os.remove(address)
+    server = ThreadingUnixStreamServer(address, Handler)
+
+logging.info('Listening on {0}.'.format(address))
+try:
+    with server: server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    for name in list(sessions.keys()): closeSession(name)
+    logging.info('Bye!')
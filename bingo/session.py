@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+
+# The state of one interaction with the inference engine: the evidence observed so far, the ranking of alarms, and the
+# alarm carousel. Used by driver.py, which reads commands from stdin, and by sweep.py, which runs several carousels at
+# once.
+
+import graph
+import history
+import json
+import logging
+import os
+import ranking
+import re
+import subprocess
+import time
+import timing
+
+# Maximum number of marginal queries pipelined to the wrapper in a single batch.
+MAX_QUERY_BATCH = 1024
+
+# First line of every checkpoint file written by Session.saveCheckpoint.
+CHECKPOINT_MAGIC = b'BGC1\n'
+
+########################################################################################################################
+# 1. Input files
+
+def loadBnetDict(dictFileName):
+    # Reads the named-dict.out file produced by cons_all2bnet.py, mapping each tuple to its variable index.
+    bnetDict = {}
+    for line in open(dictFileName):
+        line = line.strip()
+        if len(line) == 0: continue
+        components = [ c.strip() for c in line.split(': ') if len(c.strip()) > 0 ]
+        assert len(components) == 2
+        bnetDict[components[1]] = int(components[0])
+    return bnetDict
+
+def loadTuples(fileName):
+    return set([ line.strip() for line in open(fileName) if len(line.strip()) > 0 ])
+
+def loadDFile(dfilename):
+    # Reads the supplementary feedback dictionary, which maps an alarm to the tuples to be labelled false along with it.
+    dfile = {}
+    for line in open(dfilename):
+        key, val = line.split(': ')
+        val = { v.strip() for v in val.split(' ') if len(v.strip()) > 0 }
+        dfile[key] = val
+    return dfile
+
+def parseCarouselOptions(options):
+    # Parses the trailing options of the AC command into keyword arguments of Session.runAlarmCarouselToFiles:
+    # "incremental", "history", "batch=k", "checkpoint=fileName", "checkpointEvery=k", "resume", "timing=fileName",
+    # "stable=k", "top=n" and "deadline=seconds".
+    ans = { 'incremental': False, 'recordHistory': False, 'batchSize': 1, \
+            'checkpointFileName': None, 'checkpointEvery': 1, 'resume': False, 'timingFileName': None, \
+            'stableSweeps': None, 'topK': 1, 'deadline': None }
+    for option in options:
+        if option == 'incremental': ans['incremental'] = True
+        elif option == 'history': ans['recordHistory'] = True
+        elif option.startswith('batch='): ans['batchSize'] = int(option[len('batch='):])
+        elif option.startswith('checkpoint='): ans['checkpointFileName'] = option[len('checkpoint='):]
+        elif option.startswith('checkpointEvery='): ans['checkpointEvery'] = int(option[len('checkpointEvery='):])
+        elif option == 'resume': ans['resume'] = True
+        elif option.startswith('timing='): ans['timingFileName'] = option[len('timing='):]
+        elif option.startswith('stable='): ans['stableSweeps'] = int(option[len('stable='):])
+        elif option.startswith('top='): ans['topK'] = int(option[len('top='):])
+        elif option.startswith('deadline='): ans['deadline'] = float(option[len('deadline='):])
+        else: raise ValueError('Unexpected carousel option {0}'.format(option))
+    assert ans['batchSize'] > 0 and ans['checkpointEvery'] > 0 and ans['topK'] > 0
+    assert ans['stableSweeps'] is None or ans['stableSweeps'] > 0
+    assert ans['deadline'] is None or ans['deadline'] > 0
+    assert not ans['resume'] or ans['checkpointFileName'] is not None, 'Cannot resume without a checkpoint file'
+    return ans
+
+########################################################################################################################
+# 2. Inference engines
+
+class Wrapper:
+    # Runs LibDAI/wrapper.cpp as a subprocess, and talks to it over text pipes. Offers the same interface as
+    # bp.BeliefPropagation.
+
+    def __init__(self, executable, fgFileName):
+        self.numIters = None
+        self.stopReason = None
+        self.proc = subprocess.Popen([executable, fgFileName], \
+                                     stdin=subprocess.PIPE, \
+                                     stdout=subprocess.PIPE, \
+                                     universal_newlines=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.proc.__exit__(*args)
+
+    def execCmd(self, fwdCmd):
+        logging.info('Driver to wrapper: ' + fwdCmd)
+        print(fwdCmd, file=self.proc.stdin)
+        self.proc.stdin.flush()
+        response = self.proc.stdout.readline().strip()
+        logging.info('Wrapper to driver: ' + response)
+        return response
+
+    def execBatch(self, fwdCmds):
+        # Pipelines a batch of commands: all of them are written to the wrapper at once, and the responses are then read
+        # back in order. This costs one round trip per batch instead of one per command.
+        logging.info('Driver to wrapper: {0} commands, starting with {1}'.format(len(fwdCmds), fwdCmds[0]))
+        print('\n'.join(fwdCmds), file=self.proc.stdin)
+        self.proc.stdin.flush()
+        responses = [ self.proc.stdout.readline().strip() for fwdCmd in fwdCmds ]
+        logging.info('Wrapper to driver: {0} responses'.format(len(responses)))
+        return responses
+
+    def observe(self, index, value):
+        self.execCmd('O {0} {1}'.format(index, 'true' if value else 'false'))
+
+    def runBP(self, tolerance, minIters, maxIters, histLength, incremental=False, watch=None, topK=1, \
+              stableSweeps=None, deadline=None):
+        # The wrapper always runs BP from scratch and to convergence, so incremental and the early stopping options are
+        # only hints. LibDAI does not report the number of sweeps, or why it stopped, so numIters and stopReason stay
+        # None.
+        return float(self.execCmd('BP {0} {1} {2} {3}'.format(tolerance, minIters, maxIters, histLength)))
+
+    def marginals(self, indices):
+        # Batches are bounded by MAX_QUERY_BATCH so that neither pipe buffer fills up while the other end is blocked.
+        ans = []
+        for i in range(0, len(indices), MAX_QUERY_BATCH):
+            fwdCmds = [ 'Q {0}'.format(index) for index in indices[i:(i + MAX_QUERY_BATCH)] ]
+            ans.extend([ float(response) for response in self.execBatch(fwdCmds) ])
+        return ans
+
+    def factorMarginal(self, f, i):
+        return float(self.execCmd('FQ {0} {1}'.format(f, i)))
+
+    def saveState(self, outFile):
+        # LibDAI does not expose its messages. Returns False, so that the evidence is instead replayed on resumption.
+        return False
+
+def startEngine(wrapperExecutable, fgFileName):
+    if wrapperExecutable == 'inproc':
+        import bp
+        engine = bp.BeliefPropagation(bp.loadFactorGraph(fgFileName))
+        logging.info('Loaded factor graph with {0} variables in-process.'.format(engine.graph.numVars))
+        return engine
+    else:
+        return Wrapper(wrapperExecutable, fgFileName)
+
+########################################################################################################################
+# 3. Sessions
+
+def getAlpha(confidence):
+    if confidence > 0.75:
+        return '{:02X}'.format(int(255 * 1.0))
+    elif confidence > 0.5:
+        return '{:02X}'.format(int(255 * 0.75))
+    elif confidence > 0.25:
+        return '{:02X}'.format(int(255 * 0.5))
+    else:
+        return '{:02X}'.format(int(255 * 0.25))
+
+class Session:
+    # bnetDict, baseQueries and oracleQueries are only read, and may be shared between sessions. The engine holds the
+    # evidence, and must not.
+
+    def __init__(self, engine, bnetDict, baseQueries, oracleQueries, oldLabels=frozenset(), network=None):
+        assert(oracleQueries.issubset(baseQueries))
+        assert(all(t in bnetDict for t in baseQueries))
+        self.engine = engine
+        self.bnetDict = bnetDict
+        self.baseQueries = baseQueries
+        self.oracleQueries = oracleQueries
+        self.oldLabels = oldLabels
+        self.network = network
+
+        # Labelled tuples are remembered to confirm that they are not being relabelled.
+        self.labelledTuples = {}
+        self.rankingIndex = ranking.RankingIndex(baseQueries, oracleQueries)
+        self.timer = timing.NullTimer()
+
+    def observe(self, t, value):
+        assert t not in self.labelledTuples, 'Attempting to relabel alarm {0}'.format(t)
+        if not value == (t in self.oracleQueries):
+            logging.warning('Labelling alarm {0} with value {1}, which does not match ground truth.'.format(t, value))
+
+        self.engine.observe(self.bnetDict[t], value)
+        self.labelledTuples[t] = value
+        if t in self.rankingIndex.ids: self.rankingIndex.label(t, value)
+
+    def queryMarginals(self, tuples):
+        return self.engine.marginals([ self.bnetDict[t] for t in tuples ])
+
+    def refreshRanking(self, tolerance=0.0):
+        # Only alarms whose marginal moved by more than tolerance are repositioned, see ranking.RankingIndex.update().
+        with self.timer.phase('marginals'): confidences = self.queryMarginals(self.rankingIndex.tuples)
+        with self.timer.phase('ranking'): changed = self.rankingIndex.update(confidences, tolerance)
+        logging.info('Confidence changed for {0} alarms.'.format(len(changed)))
+
+    def getRankedAlarms(self):
+        self.refreshRanking()
+        return list(self.rankingIndex.rankedAlarms())
+
+    def printNetwork(self, outFile, latestLabel=None):
+        alarmList = self.getRankedAlarms()
+        name2idx = self.network['name2idx']
+        v_prop = self.network['graph'].vertex_properties['info']
+        v_color = self.network['graph'].vertex_properties['color']
+        v_shape = self.network['graph'].vertex_properties['shape']
+
+        for t, confidence in alarmList:
+            v_shape[name2idx[t]] = 'circle'
+            if t == latestLabel:
+                v_color[name2idx[t]] = 'green'
+            elif t in self.oracleQueries:
+                v_color[name2idx[t]] = 'red'
+            elif t not in self.labelledTuples:
+                alpha = getAlpha(confidence)
+                v_color[name2idx[t]] = '#0000FF' + alpha
+            elif not self.labelledTuples[t]:
+                v_color[name2idx[t]] = 'black' # negative label
+        graph.draw(self.network['graph'], outFile)
+
+    def printRankedAlarms(self, outFile, refresh=True):
+        if refresh: self.refreshRanking()
+        print('Rank\tConfidence\tGround\tLabel\tComments\tTuple', file=outFile)
+        index = 0
+        for t, confidence in self.rankingIndex.rankedAlarms():
+            index = index + 1
+            ground = 'TrueGround' if t in self.oracleQueries else 'FalseGround'
+            label = self.rankingIndex.label2Str(t)
+            print('{0}\t{1}\t{2}\t{3}\tSPOkGoodGood\t{4}'.format(index, confidence, ground, label, t), file=outFile)
+
+    def execute(self, command, outFile):
+        # Executes one of the commands accepted by driver.py, printing its output to outFile.
+        command = command.strip()
+        logging.info('Read command {0}'.format(command))
+
+        components = [ c.strip() for c in re.split(' |\t', command) if len(c.strip()) > 0 ]
+        if len(components) == 0: return
+
+        cmdType = components[0]
+        components = components[1:]
+
+        if cmdType == 'Q':
+            # 2a. Marginal probability query.
+            # Syntax: Q t.
+            # Output: t belief(t).
+            t = components[0]
+            print('{0} {1}'.format(t, self.queryMarginals([ t ])[0]), file=outFile)
+
+        elif cmdType == 'QA':
+            # 2a'. Bulk marginal probability query.
+            # Syntax: QA [t1 t2 ... tn]. If no tuples are given, all base queries are queried.
+            # Output: n, followed by n lines of the form 't belief(t)'.
+            tuples = components if len(components) > 0 else sorted(self.baseQueries)
+            print(len(tuples), file=outFile)
+            for t, belief in zip(tuples, self.queryMarginals(tuples)):
+                print('{0} {1}'.format(t, belief), file=outFile)
+
+        elif cmdType == 'FQ':
+            # 2b. Factor marginal.
+            # Syntax: FQ f i.
+            # Output: belief(f, i).
+            # Note: No encoding or decoding is performed for this command. It is intended to be used by em.py, which can
+            # do these things on its own.
+            print(self.engine.factorMarginal(int(components[0]), int(components[1])), file=outFile)
+
+        elif cmdType == 'BP':
+            # 2c. Run belief propagation.
+            # Syntax: BP tolerance minIters maxIters histLength [incremental].
+            # Output: The fraction of variables whose beliefs have yet to converge.
+            # With the incremental option, the in-process engine propagates the effect of new observations from the
+            # messages of the previous run instead of starting over.
+            tolerance = float(components[0])
+            minIters = int(components[1])
+            maxIters = int(components[2])
+            histLength = int(components[3])
+
+            assert 0 < tolerance and tolerance < 1
+            assert 0 < histLength and histLength < minIters and minIters < maxIters
+
+            incremental = 'incremental' in components[4:]
+            print(self.engine.runBP(tolerance, minIters, maxIters, histLength, incremental=incremental), file=outFile)
+
+        elif cmdType == 'OO':
+            # 2d. Observe oracle data. Read tuple and infer value from oracle_queries.txt
+            # Syntax: OO t.
+            # Output: 'O t value'. Value assigned to the tuple. Merely an acknowledgment that the command was received.
+            t = components[0]
+            value = t in self.oracleQueries
+            self.observe(t, value)
+            print('O {0} {1}'.format(t, 'true' if value else 'false'), file=outFile)
+
+        elif cmdType == 'O':
+            # 2e. Observe oracle data.
+            # Syntax: O t value.
+            # Output: 'O t value'. Merely an acknowledgment that the command was received.
+            t = components[0]
+            assert components[1] == 'true' or components[1] == 'false'
+            value = (components[1] == 'true')
+            self.observe(t, value)
+            print('O {0} {1}'.format(t, 'true' if value else 'false'), file=outFile)
+
+        elif cmdType == 'P':
+            # 2f. Printing ranked list of alarms to file
+            # Syntax: P filename.
+            # Output: Ranked list of alarms, in the format of combined.out. Printed to filename. Acknowledgment printed
+            # to stdout.
+            outFileName = components[0]
+            with open(outFileName, 'w') as rankFile: self.printRankedAlarms(rankFile)
+            print('P {0}'.format(outFileName), file=outFile)
+
+        elif cmdType == 'HA':
+           # 2g. Get the alarm with the highest ranking and maximum confidence.
+           # Syntax: HA.
+           # Output: A tuple t
+           alarmList = self.getRankedAlarms()
+           topAlarm, confidence = alarmList[0]
+           groundTruth = 'TrueGround' if topAlarm in self.oracleQueries else 'FalseGround'
+           print('{0} {1} {2}'.format(topAlarm, confidence, groundTruth), file=outFile)
+
+        elif cmdType == 'AC':
+            # 2h. Run alarm carousel
+            # Syntax: AC dfilename tolerance minIters maxIters histLength statsFileName combinedPrefix combinedSuffix
+            #         [incremental] [history] [batch=k] [checkpoint=fileName [checkpointEvery=k] [resume]]
+            #         [timing=fileName] [stable=k [top=n]] [deadline=seconds].
+            # Output: Alarm carousel statistics, in the format of stats.txt, printed to statsFileName. Static ranked
+            # list of alarms at step n, in the format of combined.out, is printed to file named
+            # 'combinedPrefixn.combinedSuffix'. Nothing printed to stdout.
+            # An alarm whose marginal moves by no more than tolerance keeps the confidence by which it was last ranked,
+            # so the confidences printed, and by which alarms are ranked, are each within tolerance of their marginal.
+            # With the incremental option, every round after the first warm-starts BP from the previous round, as in
+            # the BP command.
+            # With the history option, the ranked lists are instead recorded as deltas in a single file named
+            # 'combinedPrefixhistory.combinedSuffix'. history.py reads it back, and can export any of the steps in
+            # the format of combined.out.
+            # With the batch=k option, each round of BP is followed by labelling the k highest ranked unlabelled
+            # alarms, as if by k reviewers working in parallel. The statistics still have one line per alarm.
+            # With the checkpoint option, the labels, the progress of the carousel and the messages of the in-process
+            # engine are saved to fileName before every k rounds (by default, every round). If the same command is
+            # then run again with the resume option, it continues from the checkpoint, if one exists, without repeating
+            # earlier rounds. With LibDAI, the labels are observed again, and BP is rerun from scratch.
+            # With the timing option, the wall-clock and CPU time spent in each phase (bp, marginals, ranking, output,
+            # observe and checkpoint) is printed to fileName, one line of JSON per alarm, together with the number of
+            # sweeps of BP (null with LibDAI) and the fraction of messages yet to converge. The phases of each round are
+            # counted towards its first alarm, and those before the first round towards a line for iteration 'init'.
+            # With the stable=k option, each round of BP with the in-process engine stops as soon as the order of the n
+            # highest ranked unlabelled alarms (by default, n = 1, or as given by top=n) has not changed for k sweeps,
+            # even before minIters sweeps. With the deadline=seconds option, each round stops once it has run for that
+            # long, and the alarms are ranked by the beliefs of its last sweep. Either way, the statistics gain two
+            # columns, the number of sweeps of each round and why it stopped (converged, maxIters, stable or deadline),
+            # so that the effect on the ranking can be audited.
+
+            dfile = loadDFile(components[0])
+
+            tolerance = float(components[1])
+            minIters = int(components[2])
+            maxIters = int(components[3])
+            histLength = int(components[4])
+
+            statsFileName = components[5]
+            combinedPrefix = components[6]
+            combinedSuffix = components[7]
+            options = parseCarouselOptions(components[8:])
+
+            assert 0 < tolerance and tolerance < 1
+            assert 0 < histLength and histLength < minIters and minIters < maxIters
+
+            self.runAlarmCarouselToFiles(dfile, tolerance, minIters, maxIters, histLength, statsFileName, \
+                                         combinedPrefix, combinedSuffix, **options)
+
+        else:
+            assert cmdType == 'NL', 'Unexpected command {0}!'.format(command)
+            print(file=outFile)
+
+    def saveCheckpoint(self, fileName, carouselState):
+        # Writes the labels, the given state of the carousel, and the state of the engine, if it offers one. The file is
+        # replaced atomically, so that an interruption leaves the previous checkpoint intact.
+        state = dict(carouselState)
+        state['labels'] = list(self.labelledTuples.items())
+        with open(fileName + '.tmp', 'wb') as outFile:
+            outFile.write(CHECKPOINT_MAGIC)
+            outFile.write(json.dumps(state).encode())
+            outFile.write(b'\n')
+            saved = self.engine.saveState(outFile)
+            outFile.write(b'1' if saved else b'0')
+        os.replace(fileName + '.tmp', fileName)
+
+    def loadCheckpoint(self, fileName):
+        # Restores the labels and the engine from a checkpoint, and returns the state of the carousel. If the engine
+        # state was not saved, the labels are instead observed again, and take effect at the next run of BP.
+        assert len(self.labelledTuples) == 0, 'Cannot resume a session which already holds evidence'
+        with open(fileName, 'rb') as inFile:
+            assert inFile.readline() == CHECKPOINT_MAGIC, '{0} is not a checkpoint file'.format(fileName)
+            state = json.loads(inFile.readline().decode())
+            engineStatePos = inFile.tell()
+            inFile.seek(-1, os.SEEK_END)
+            saved = inFile.read(1) == b'1'
+            inFile.seek(engineStatePos)
+            if saved: self.engine.loadState(inFile)
+
+        for t, value in state['labels']:
+            if not saved: self.engine.observe(self.bnetDict[t], value)
+            self.labelledTuples[t] = value
+            if t in self.rankingIndex.ids: self.rankingIndex.label(t, value)
+        logging.info('Loaded checkpoint with {0} labels from {1}.'.format(len(state['labels']), fileName))
+        return state
+
+    def runAlarmCarousel(self, dfile, tolerance, minIters, maxIters, histLength, statsFile, combinedPrefix, \
+                         combinedSuffix, incremental=False, historyWriter=None, batchSize=1, checkpointFileName=None, \
+                         checkpointEvery=1, resumeState=None, stableSweeps=None, topK=1, deadline=None):
+        # Each round runs BP once, and then labels the batchSize highest ranked unlabelled alarms, one after the other,
+        # without updating the confidence of the others in between.
+        # If checkpointFileName is given, a checkpoint is saved before every checkpointEvery rounds. If resumeState is
+        # given, as restored by loadCheckpoint(), the carousel continues from that checkpoint instead of starting over.
+        # stableSweeps, topK and deadline are passed to the engine, to stop each round of BP early.
+        assert 0 < tolerance and tolerance < 1
+        assert 0 < histLength and histLength < minIters and minIters < maxIters
+        assert 0 < batchSize
+
+        engine = self.engine
+        rankingIndex = self.rankingIndex
+        oracleQueries = self.oracleQueries
+        printGraph = self.network is not None
+        timer = self.timer
+        earlyStop = stableSweeps is not None or deadline is not None
+        stopOptions = { 'topK': topK, 'stableSweeps': stableSweeps, 'deadline': deadline }
+
+        def printSnapshot(iteration, refresh):
+            # Either prints the full ranking to 'combinedPrefixN.combinedSuffix', or records it in the history.
+            if refresh: self.refreshRanking(tolerance)
+            with timer.phase('output'):
+                if historyWriter is not None:
+                    historyWriter.record(iteration, rankingIndex.confidences, rankingIndex.groups)
+                else:
+                    outFileName = '{0}{1}.{2}'.format(combinedPrefix, history.iteration2Str(iteration), \
+                                                      combinedSuffix)
+                    with open(outFileName, 'w') as outFile:
+                        self.printRankedAlarms(outFile, refresh=False)
+
+        if resumeState is not None:
+            numTrue = resumeState['numTrue']
+            numFalse = resumeState['numFalse']
+            numRounds = resumeState['numRounds']
+            latestLabel = resumeState['latestLabel']
+            logging.info('Carousel resumed after {0} alarms!'.format(numTrue + numFalse))
+        else:
+            numTrue = 0
+            numFalse = 0
+            numRounds = 0
+            latestLabel = None
+            with timer.phase('bp'):
+                watch = [ self.bnetDict[t] for t in rankingIndex.tuples ] if stableSweeps is not None else None
+                yetToConvergeFraction = engine.runBP(tolerance, minIters, maxIters, histLength, watch=watch, \
+                                                     **stopOptions)
+            printSnapshot(history.INIT, True)
+
+            if printGraph:
+                with timer.phase('output'):
+                    outFile = '{0}{1}.{2}.svg'.format(combinedPrefix, 'init', combinedSuffix)
+                    self.printNetwork(outFile)
+                    graph.print_node_id(self.network['graph'], '{}init.{}.map'.format(combinedPrefix, combinedSuffix))
+
+            numMasked = 0
+            with timer.phase('observe'):
+                for oldLabel in self.oldLabels: # not necessarily queries
+                    logging.info('Masking: O {0} False'.format(oldLabel))
+                    self.observe(oldLabel, False)
+                    numMasked = numMasked + 1
+
+            logging.info('Carousel start! {} alarms masked'.format(numMasked))
+            print('Tuple\tConfidence\tGround\tNumTrue\tNumFalse\tFraction\tInversionCount\tYetToConvergeFraction\t' + \
+                  'Time(s)' + ('\tSweeps\tStopReason' if earlyStop else ''), file=statsFile)
+            timer.record(iteration='init', bpIters=engine.numIters, yetToConvergeFraction=yetToConvergeFraction)
+
+        lastTime = time.time()
+        while rankingIndex.numUnlabelled > 0:
+            if checkpointFileName is not None and numRounds % checkpointEvery == 0:
+                with timer.phase('checkpoint'):
+                    statsFile.flush()
+                    self.saveCheckpoint(checkpointFileName, \
+                                        { 'numTrue': numTrue, 'numFalse': numFalse, 'numRounds': numRounds, \
+                                          'latestLabel': latestLabel, 'statsOffset': statsFile.tell(), \
+                                          'historyOffset': historyWriter.outFile.tell() if historyWriter else None, \
+                                          'history': historyWriter.state() if historyWriter else None, \
+                                          'timingOffset': timer.tell() })
+            numRounds = numRounds + 1
+
+            with timer.phase('bp'):
+                watch = None
+                if stableSweeps is not None:
+                    watch = [ self.bnetDict[t] for t, group in zip(rankingIndex.tuples, rankingIndex.groups) \
+                              if group == ranking.UNLABELLED ]
+                yetToConvergeFraction = engine.runBP(tolerance, minIters, maxIters, histLength, \
+                                                     incremental=incremental, watch=watch, **stopOptions)
+            self.refreshRanking(tolerance)
+            for _ in range(batchSize):
+                if rankingIndex.numUnlabelled == 0: break
+                with timer.phase('ranking'):
+                    t0, conf0 = rankingIndex.topUnlabelled()
+                    inversionCount = rankingIndex.inversionCount()
+
+                ground = 'TrueGround' if t0 in oracleQueries else 'FalseGround'
+                if t0 in oracleQueries: numTrue = numTrue + 1
+                else: numFalse = numFalse + 1
+                fraction = numTrue / (numTrue + numFalse)
+                thisTime = int(time.time() - lastTime)
+                lastTime = time.time()
+                with timer.phase('output'):
+                    print('{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}'.format(t0, conf0, ground, numTrue, \
+                                                                               numFalse, fraction, inversionCount, \
+                                                                               yetToConvergeFraction, thisTime) + \
+                          ('\t{0}\t{1}'.format(engine.numIters, engine.stopReason) if earlyStop else ''), \
+                          file=statsFile)
+                    statsFile.flush()
+
+                printSnapshot(numTrue + numFalse - 1, False)
+
+                if printGraph:
+                    with timer.phase('output'):
+                        outFile = '{0}{1}.{2}.svg'.format(combinedPrefix, numTrue + numFalse - 1, combinedSuffix)
+                        self.printNetwork(outFile, latestLabel=latestLabel)
+
+                with timer.phase('observe'):
+                    logging.info('Setting tuple {0} to value {1}'.format(t0, t0 in oracleQueries))
+                    self.observe(t0, t0 in oracleQueries)
+                    if t0 not in oracleQueries and t0 in dfile:
+                        for td in dfile[t0]: self.observe(td, False)
+                timer.record(iteration=numTrue + numFalse - 1, tuple=t0, round=numRounds, bpIters=engine.numIters, \
+                             stopReason=engine.stopReason, yetToConvergeFraction=yetToConvergeFraction)
+                latestLabel = t0
+                if numTrue == len(oracleQueries): break
+            if numTrue == len(oracleQueries): break
+
+    def runAlarmCarouselToFiles(self, dfile, tolerance, minIters, maxIters, histLength, statsFileName, combinedPrefix, \
+                                combinedSuffix, incremental=False, recordHistory=False, batchSize=1, \
+                                checkpointFileName=None, checkpointEvery=1, resume=False, timingFileName=None, \
+                                stableSweeps=None, topK=1, deadline=None):
+        # Runs the alarm carousel, printing statistics to statsFileName, and the ranked lists either to
+        # 'combinedPrefixN.combinedSuffix' or, with recordHistory, to 'combinedPrefixhistory.combinedSuffix'.
+        # With resume, if the checkpoint file exists, the carousel continues from it, and the output files are cut back
+        # to where they were when the checkpoint was saved. With timingFileName, the time spent in each phase of each
+        # iteration is printed there, as by timing.PhaseTimer.
+        historyFileName = '{0}history.{1}'.format(combinedPrefix, combinedSuffix)
+        resumeState = None
+        if resume and os.path.exists(checkpointFileName):
+            resumeState = self.loadCheckpoint(checkpointFileName)
+            assert (resumeState['history'] is not None) == recordHistory, 'The checkpoint was saved with other options'
+
+        def openOutput(fileName, offsetKey, binary):
+            if resumeState is None: return open(fileName, 'wb' if binary else 'w')
+            if resumeState.get(offsetKey) is None: return open(fileName, 'ab' if binary else 'a')
+            outFile = open(fileName, 'r+b' if binary else 'r+')
+            outFile.truncate(resumeState[offsetKey])
+            outFile.seek(resumeState[offsetKey])
+            return outFile
+
+        runArgs = (dfile, tolerance, minIters, maxIters, histLength)
+        runOptions = { 'incremental': incremental, 'batchSize': batchSize, 'checkpointFileName': checkpointFileName, \
+                       'checkpointEvery': checkpointEvery, 'resumeState': resumeState, 'stableSweeps': stableSweeps, \
+                       'topK': topK, 'deadline': deadline }
+        timingFile = openOutput(timingFileName, 'timingOffset', False) if timingFileName is not None else None
+        self.timer = timing.PhaseTimer(timingFile) if timingFile is not None else timing.NullTimer()
+        try:
+            with openOutput(statsFileName, 'statsOffset', False) as statsFile:
+                if recordHistory:
+                    with openOutput(historyFileName, 'historyOffset', True) as historyFile:
+                        historyState = resumeState['history'] if resumeState is not None else None
+                        historyWriter = history.HistoryWriter(historyFile, self.rankingIndex.tuples, \
+                                                              self.oracleQueries, historyState)
+                        self.runAlarmCarousel(*runArgs, statsFile, combinedPrefix, combinedSuffix, \
+                                              historyWriter=historyWriter, **runOptions)
+                else:
+                    self.runAlarmCarousel(*runArgs, statsFile, combinedPrefix, combinedSuffix, **runOptions)
+        finally:
+            if timingFile is not None: timingFile.close()
+            self.timer = timing.NullTimer()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Runs several alarm carousels concurrently, such as the runs of delta.sh for each value of epsilon. Each carousel runs
+# in its own process, with in-process belief propagation (bp.py). Networks are loaded once, before the processes are
+# forked, so that carousels over the same network share its structure, and only differ in their factor probabilities
+# and evidence.
+
+# ./bingo/sweep.py configs.json [numProcesses]
+
+# configs.json contains a list of configurations, each of which is an object with the following fields:
+# 1. bnet: Directory containing bnet-dict.out, named-bnet.out and new-rule-prob.txt, as produced by build-bnet.sh.
+# 2. alarms, groundTruth: Base queries file and oracle queries file, as accepted by driver.py.
+# 3. oldLabels (optional): File containing tuples to be labelled false before the carousel starts, as accepted by
+#    driver.py.
+# 4. dfile (default: /dev/null): Supplementary feedback dictionary, as accepted by the AC command.
+# 5. eps (optional): Probability of the Repsilon rule, overriding new-rule-prob.txt. As in compress-cons-all.py, the
+#    Rneps rule then has probability 1 - eps.
+# 6. defaultProb (default: 0.99): Probability of rules missing from new-rule-prob.txt, as accepted by bnet2fg.py.
+# 7. tolerance (default: 1e-6), minIters (default: 500), maxIters (default: minIters + 500), histLength (default: 100):
+#    BP parameters, as accepted by the AC command. The defaults are those of accmd.
+# 8. stats, combinedPrefix, combinedSuffix (default: out): Output files, as accepted by the AC command.
+# 9. options (optional): List of further options to the AC command, such as "incremental", "history" or "batch=4".
+# 10. log (optional): File to which the carousel is logged. Otherwise, it is logged to stderr.
+# Example:
+# [ { "bnet": "benchmark/grep-2.19/sparrow-out/interval/merged_bnet_0.001",
+#     "alarms": "benchmark/grep-2.19/sparrow-out/interval/merged_bnet_0.001/RankingAlarms.txt",
+#     "groundTruth": "benchmark/grep-2.19/sparrow-out/interval/merged_bnet_0.001/SemGroundTruth.txt",
+#     "oldLabels": "benchmark/grep-2.19/sparrow-out/interval/merged_bnet_0.001/fb0Strong.txt.pruned",
+#     "eps": 0.005,
+#     "stats": "benchmark/grep-2.19/sparrow-out/interval/bingo_delta_sem-eps_strong_0.005_stats.txt",
+#     "combinedPrefix": "benchmark/grep-2.19/sparrow-out/interval/bingo_delta_sem-eps_strong_0.005_combined/" },
+#   ... ]
+
+import bp
+import json
+import logging
+import multiprocessing
+import os
+import session
+import sys
+import time
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)s [%(processName)s %(name)s.%(funcName)s:%(lineno)d] %(message)s"
+
+########################################################################################################################
+# 1. Load networks
+
+# Everything here is read before the worker processes are forked, and is never modified afterwards, so that the pages
+# holding it are shared by all workers.
+configs = []
+networks = {} # bnet directory -> (bnetDict, FactorGraph, ruleProbs)
+tupleFiles = {} # file name -> set of tuples
+
+def loadConfigs(configFileName):
+    for config in json.load(open(configFileName)):
+        config.setdefault('dfile', '/dev/null')
+        config.setdefault('defaultProb', 0.99)
+        config.setdefault('tolerance', 1e-6)
+        config.setdefault('minIters', 500)
+        config.setdefault('maxIters', config['minIters'] + 500)
+        config.setdefault('histLength', 100)
+        config.setdefault('combinedSuffix', 'out')
+        config.setdefault('options', [])
+        configs.append(config)
+
+def loadNetworks():
+    for config in configs:
+        bnetDir = config['bnet']
+        if bnetDir not in networks:
+            startTime = time.time()
+            bnetDict = session.loadBnetDict(os.path.join(bnetDir, 'bnet-dict.out'))
+            ruleProbFileName = os.path.join(bnetDir, 'new-rule-prob.txt')
+            graph = bp.loadBayesianNetwork(os.path.join(bnetDir, 'named-bnet.out'), ruleProbFileName, \
+                                           config['defaultProb'])
+            networks[bnetDir] = (bnetDict, graph, bp.loadRuleProbabilities(ruleProbFileName))
+            logging.info('Loaded network {0} with {1} variables in {2:.3f}s.'.format(bnetDir, graph.numVars, \
+                                                                                    time.time() - startTime))
+        for key in [ 'alarms', 'groundTruth', 'oldLabels' ]:
+            if key in config and config[key] not in tupleFiles:
+                tupleFiles[config[key]] = session.loadTuples(config[key])
+
+########################################################################################################################
+# 2. Run carousels
+
+def runConfig(index):
+    config = configs[index]
+    if 'log' in config:
+        for handler in logging.getLogger().handlers[:]: logging.getLogger().removeHandler(handler)
+        logging.basicConfig(level=logging.INFO, filename=config['log'], filemode='w', format=LOG_FORMAT, \
+                            datefmt="%H:%M:%S")
+
+    bnetDict, graph, ruleProbs = networks[config['bnet']]
+    if 'eps' in config:
+        ruleProbs = dict(ruleProbs)
+        ruleProbs['Repsilon'] = float(config['eps'])
+        ruleProbs['Rneps'] = 1.0 - float(config['eps'])
+    graph = graph.withRuleProbabilities(ruleProbs, config['defaultProb'])
+
+    baseQueries = tupleFiles[config['alarms']]
+    oracleQueries = tupleFiles[config['groundTruth']]
+    oldLabels = tupleFiles[config['oldLabels']] if 'oldLabels' in config else set()
+    dfile = session.loadDFile(config['dfile'])
+
+    combinedDir = os.path.dirname(config['combinedPrefix'])
+    if len(combinedDir) > 0: os.makedirs(combinedDir, exist_ok=True)
+
+    startTime = time.time()
+    with bp.BeliefPropagation(graph) as engine:
+        interaction = session.Session(engine, bnetDict, baseQueries, oracleQueries, oldLabels)
+        interaction.runAlarmCarouselToFiles(dfile, config['tolerance'], config['minIters'], config['maxIters'], \
+                                            config['histLength'], config['stats'], config['combinedPrefix'], \
+                                            config['combinedSuffix'], **session.parseCarouselOptions(config['options']))
+    return index, time.time() - startTime
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, datefmt="%H:%M:%S")
+
+    loadConfigs(sys.argv[1])
+    numProcesses = int(sys.argv[2]) if len(sys.argv) > 2 else min(len(configs), os.cpu_count())
+    loadNetworks()
+    logging.info('Running {0} carousels over {1} networks in {2} processes.'.format(len(configs), len(networks), \
+                                                                                 numProcesses))
+
+    # Forking, rather than spawning, is what lets the workers share the networks loaded above.
+    with multiprocessing.get_context('fork').Pool(numProcesses) as pool:
+        for index, elapsedTime in pool.imap_unordered(runConfig, range(len(configs))):
+            logging.info('Finished carousel {0} ({1}) in {2:.3f}s.'.format(index, configs[index]['stats'], \
+                                                                          elapsedTime))
+
+    logging.info('Bye!')
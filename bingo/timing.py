@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+# Per-phase timing of the alarm carousel. Each record is a line of JSON, holding the monotonic wall-clock time and the
+# CPU time, both in seconds, spent in each phase since the previous record, together with any other fields the caller
+# supplies.
+
+import contextlib
+import json
+import time
+
+class PhaseTimer:
+    def __init__(self, outFile):
+        self.outFile = outFile
+        self.wall = {}
+        self.cpu = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.wall[name] = self.wall.get(name, 0.0) + time.perf_counter() - wall
+            self.cpu[name] = self.cpu.get(name, 0.0) + time.process_time() - cpu
+
+    def tell(self):
+        return self.outFile.tell()
+
+    def record(self, **fields):
+        fields['wall'] = self.wall
+        fields['cpu'] = self.cpu
+        print(json.dumps(fields), file=self.outFile)
+        self.outFile.flush()
+        self.wall = {}
+        self.cpu = {}
+
+class NullTimer:
+    # Used when no timing is requested, so that the carousel need not check.
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        yield
+
+    def tell(self):
+        return None
+
+    def record(self, **fields):
+        pass
@@ -6,9 +6,11 @@
 #                           new/line_matching.json \
 #                           new/sparrow-out/bnet
 
+import clausefile
 import codecs
 import logging
 import json
+import nodefile
 import os
 import re
 import sys
@@ -38,67 +40,64 @@ def read_alarm_set(filename):
     return alarm_set
 
 def read_cons(filename):
+    # Accepts either text, or the binary format of clausefile.py.
     all_clauses = []
-    for line in open(filename):
-        line = line.strip()
-        clause = [literal.strip() for literal in re.split(':|, ', line)]
-        all_clauses.append(clause)
+    for rule_name, literals in clausefile.readClauses(filename):
+        all_clauses.append([rule_name] + literals)
     return all_clauses
 
+# node.json, as a nodefile.NodeTable, with the caches of the commands and signatures of its nodes
+def read_node_info(filename):
+    return {'nodes': nodefile.load(filename), 'neighbour_cmds': {}, 'signatures': {}}
+
 def node_to_location(node, node_info):
-    elements = node_info['nodes'][node]['loc'].split(':')
-    return (elements[0], int(elements[1]))
+    return node_info['nodes'].location(node)
+
+# line_matching, indexed once: every location in a changed file, and every location in location_map, mapped to its set
+# of new locations, or to None if it has none, and the names of all changed and added files
+location_index = {}
+changed_or_added_files = set()
+def index_locations(line_matching):
+    for filename, new_lines in line_matching['changed_files'].items():
+        for idx, line in enumerate(new_lines, 1):
+            location_index.setdefault((filename, line), set()).add((filename, idx))
+    changed_or_added_files.update(line_matching['changed_files'])
+    changed_or_added_files.update(line_matching['added_files'])
+
+    if 'location_map' in line_matching:
+        for old, new in line_matching['location_map'].items():
+            old_location = (old.split(':')[0], int(old.split(':')[1]))
+            new_location = {(new.split(':')[0], int(new.split(':')[1]))}
+            location_index[old_location] = new_location
 
-location_cache = {}
 def trans_location(location, line_matching):
-    if location in location_cache:
-        return location_cache[location]
-    changed_files = line_matching['changed_files']
-    added_files = line_matching['added_files']
-    filename, line = location[0], location[1]
-    location_set = set()
-    if filename in changed_files:
-        idx = 1
-        for new_line in changed_files[filename]:
-            if line == new_line:
-                location_set.add((filename, idx))
-            idx += 1
-    elif filename not in added_files: # unchanged file
-        location_set.add((filename, line))
-        return location_set
-
-    if len(location_set) > 0:
-        location_cache[location] = location_set
-        return location_set
+    if location in location_index:
+        return location_index[location]
+    elif location[0] not in changed_or_added_files: # unchanged file
+        return {location}
     else:
-        location_cache[location] = None
         return None
 
 # weakest matching: line number and command type
-def match_node(old_cmd, location, info):
-    typ = old_cmd[0] + '-' + str(old_cmd[1]) \
-        if old_cmd[0] == 'assume' else old_cmd[0]
-    if location == info['loc']:
-        cmd = info['cmd']
-        if typ.startswith('assume') and cmd[0] == 'assume':
-            return (typ == cmd[0] + '-' + str(cmd[1]))
-        elif typ == 'call' and cmd[0] == 'call':
-            return (old_cmd[2] == cmd[2])
-        else:
-            return (typ == cmd[0])
+# Two nodes match when they have the same location and the same command type, where the type of an assume includes its
+# polarity, and the type of a call includes its callee.
+def cmd_type(cmd):
+    if cmd[0] == 'assume':
+        return cmd[0] + '-' + str(cmd[1])
+    elif cmd[0] == 'call':
+        return (cmd[0], cmd[2])
     else:
-        return False
-
-def same_function(old_node, new_node):
-    return old_node.split('-')[0] == new_node.split('-')[0]
-
-
-def same_tag(old_node, old_node_info, new_node, new_node_info):
-    old_cmd = old_node_info['nodes'][old_node]['cmd'][0]
-    old_tag = old_node_info['nodes'][old_node]['cmd'][1]
-    new_cmd = new_node_info['nodes'][new_node]['cmd'][0]
-    new_tag = new_node_info['nodes'][new_node]['cmd'][1]
-    return old_cmd == 'skip' and new_cmd == 'skip' and old_tag == new_tag
+        return cmd[0]
+
+# maps each location string and command type to the nodes at that location with that type
+def index_nodes(node_info):
+    node_index = {}
+    for node in node_info['nodes']:
+        key = (node_info['nodes'].loc(node), cmd_type(node_info['nodes'].cmd(node)))
+        if key not in node_index:
+            node_index[key] = []
+        node_index[key].append(node)
+    return node_index
 
 # normalize temp variables
 def normalize_exp(exp):
@@ -139,123 +138,77 @@ def normalize_cmd(cmd):
     else:
         return cmd
 
+def neighbour_cmds(node, node_info, direction, normalize):
+    key = (direction, node, normalize)
+    if key not in node_info['neighbour_cmds']:
+        if direction == 'parents':
+            neighbour_node_ids = node_info['nodes'].parents(node)
+        else:
+            neighbour_node_ids = node_info['nodes'].children(node)
+        if normalize:
+            neighbour_node_cmds = [normalize_cmd(node_info['nodes'].cmd(neighbour)) \
+                                   for neighbour in neighbour_node_ids]
+        else:
+            neighbour_node_cmds = [node_info['nodes'].cmd(neighbour) \
+                                   for neighbour in neighbour_node_ids]
+        node_info['neighbour_cmds'][key] = frozenset(tuple(cmd) for cmd in neighbour_node_cmds)
+    return node_info['neighbour_cmds'][key]
+
 def get_parents(node, node_info, normalize=False):
-    parent_node_ids = [e[0] for e in node_info['edges'] if e[1] == node]
-    parent_node_cmds = [node_info['nodes'][node]['cmd'] for node in parent_node_ids]
-    if normalize:
-        parent_node_cmds = [normalize_cmd(node_info['nodes'][node]['cmd']) \
-                            for node in parent_node_ids]
-    else:
-        parent_node_cmds = [node_info['nodes'][node]['cmd'] \
-                            for node in parent_node_ids]
-    return {tuple(cmd) for cmd in parent_node_cmds}
+    return neighbour_cmds(node, node_info, 'parents', normalize)
 
 def get_children(node, node_info, normalize=False):
-    children_node_ids = [e[1] for e in node_info['edges'] if e[0] == node]
-    children_node_cmds = [node_info['nodes'][node]['cmd'] for node in children_node_ids]
-    logging.debug(children_node_cmds)
-    if normalize:
-        children_node_cmds = [normalize_cmd(node_info['nodes'][node]['cmd']) \
-                              for node in children_node_ids]
-    else:
-        children_node_cmds = [node_info['nodes'][node]['cmd'] \
-                              for node in children_node_ids]
-    return {tuple(cmd) for cmd in children_node_cmds}
-
-
-def same_parents(old_node, old_node_info, new_node, new_node_info, normalize=False):
-    old_parents = get_parents(old_node, old_node_info, normalize=normalize)
-    new_parents = get_parents(new_node, new_node_info, normalize=normalize)
-    return old_parents == new_parents
-
-def same_children(old_node, old_node_info, new_node, new_node_info, normalize=False):
-    old_children = get_children(old_node, old_node_info, normalize=normalize)
-    new_children = get_children(new_node, new_node_info, normalize=normalize)
-    return old_children == new_children
-
-def match_node2(old_node, old_node_info, new_node, new_node_info):
-    if old_node_info['nodes'][old_node]['cmd'][0] == 'skip':
-        return same_tag(old_node, old_node_info, new_node, new_node_info)
-    elif old_node_info['nodes'][old_node]['cmd'][0] == 'set':
-        return normalize_exp(old_node_info['nodes'][old_node]['cmd'][1]) == \
-            normalize_exp(new_node_info['nodes'][new_node]['cmd'][1])
-    else:
-        return True
+    return neighbour_cmds(node, node_info, 'children', normalize)
+
+# The signature of a node, level by level, with which select_node() narrows down the candidates for an old node:
+# 0. the part of its command which identifies it, with expressions normalized, or None if none does,
+# 1. its function,
+# 2. the normalized target of a set,
+# 3. the normalized commands of its parents, and 4. the raw ones,
+# 5. the normalized commands of its children, and 6. the raw ones.
+# Each level is computed at most once per node, so that each expression is normalized once, and the neighbours of a
+# node are only visited if the earlier levels leave it ambiguous.
+NEIGHBOUR_LEVELS = [('parents', True), ('parents', False), ('children', True), ('children', False)]
+SIGNATURE_LEVELS = 3 + len(NEIGHBOUR_LEVELS)
+def node_signature(node, node_info, level):
+    if level >= 3:
+        direction, normalize = NEIGHBOUR_LEVELS[level - 3]
+        return neighbour_cmds(node, node_info, direction, normalize)
+    if node not in node_info['signatures']:
+        cmd = node_info['nodes'].cmd(node)
+        if cmd[0] == 'skip':
+            cmd_key = (cmd[0], cmd[1])
+        elif cmd[0] == 'set' or cmd[0] == 'assume' or cmd[0] == 'call':
+            cmd_key = (cmd[0], normalize_exp(cmd[2]))
+        elif cmd[0] == 'alloc' or cmd[0] == 'salloc' or (cmd[0] == 'return' and cmd[1] is not None):
+            cmd_key = (cmd[0], normalize_exp(cmd[1]))
+        else:
+            cmd_key = None
+        node_info['signatures'][node] = (cmd_key, node_info['nodes'].function(node), \
+                                         normalize_exp(cmd[1]) if cmd[0] == 'set' else None)
+    return node_info['signatures'][node][level]
 
 def node_not_found(old_node):
     logging.warn('Node Not found {}'.format(old_node))
     return (old_node + '-OLD')
 
-def match_exp(exp1, exp2):
-    # normalize temp variables
-    exp1 = normalize_exp(exp1)
-    exp2 = normalize_exp(exp2)
-    return exp1 == exp2
-
 ambiguous = {}
 def select_node(old_node, old_node_info, new_node_info, node_set):
     logging.debug("Ambiguous0: {} -> {}".format(old_node, node_set))
-    old_info = old_node_info['nodes'][old_node]
-    filtered_node_set = set()
-    # stronger matching
-    for candidate in node_set:
-        new_info = new_node_info['nodes'][candidate]
-        old_cmd = old_info['cmd']
-        new_cmd = new_info['cmd']
-        if (old_cmd[0] == 'skip' and old_cmd[1] == new_cmd[1]) \
-                or (old_cmd[0] == 'set' and match_exp(old_cmd[2], new_cmd[2])) \
-                or (old_cmd[0] == 'alloc' and match_exp(old_cmd[1], new_cmd[1])) \
-                or (old_cmd[0] == 'salloc' and match_exp(old_cmd[1], new_cmd[1])) \
-                or (old_cmd[0] == 'assume' and match_exp(old_cmd[2], new_cmd[2])) \
-                or (old_cmd[0] == 'call' and match_exp(old_cmd[2], new_cmd[2])) \
-                or (old_cmd[0] == 'return' and old_cmd[1] is not None \
-                    and new_cmd[1] is not None and match_exp(old_cmd[1], new_cmd[1])):
-            filtered_node_set.add(candidate)
-
-    if len(filtered_node_set) == 0: return node_not_found(old_node)
-
-    # much stronger matching
-    # In Sparrow, the following happens because of inline or other reasons
-    filtered_node_set = {node for node in filtered_node_set if \
-                         same_function(old_node, node)}
-    logging.debug("After filter1 : {} -> {}".format(old_node, filtered_node_set))
-    if len(filtered_node_set) == 1:
-        return filtered_node_set.pop()
-    if len(filtered_node_set) == 0: return node_not_found(old_node)
-
-    filtered_node_set = {node for node in filtered_node_set if \
-                         match_node2(old_node, old_node_info, node, new_node_info)}
-    logging.debug("After filter2 : {} -> {}".format(old_node, filtered_node_set))
-    if len(filtered_node_set) == 1:
-        return filtered_node_set.pop()
-    if len(filtered_node_set) == 0: return node_not_found(old_node)
-
-    filtered_node_set = {node for node in filtered_node_set if \
-                          same_parents(old_node, old_node_info, node, new_node_info, normalize=True)}
-    logging.debug('After filter3: {} -> {}'.format(old_node, filtered_node_set))
-    if len(filtered_node_set) == 1:
-        return filtered_node_set.pop()
-    if len(filtered_node_set) == 0: return node_not_found(old_node)
-
-    filtered_node_set = {node for node in filtered_node_set if \
-                          same_parents(old_node, old_node_info, node, new_node_info, normalize=False)}
-    logging.debug('After filter4: {} -> {}'.format(old_node, filtered_node_set))
-    if len(filtered_node_set) == 1:
-        return filtered_node_set.pop()
-    if len(filtered_node_set) == 0: return node_not_found(old_node)
-
-    filtered_node_set = {node for node in filtered_node_set if \
-                          same_children(old_node, old_node_info, node, new_node_info, normalize=True)}
-    logging.debug('After filter5: {} -> {}'.format(old_node, filtered_node_set))
-    if len(filtered_node_set) == 1:
-        return filtered_node_set.pop()
-    if len(filtered_node_set) == 0: return node_not_found(old_node)
-
-    filtered_node_set = {node for node in filtered_node_set if \
-                          same_children(old_node, old_node_info, node, new_node_info, normalize=False)}
-    logging.debug('After filter6: {} -> {}'.format(old_node, filtered_node_set))
-    if len(filtered_node_set) == 1:
-        return filtered_node_set.pop()
+    if node_signature(old_node, old_node_info, 0) is None: return node_not_found(old_node)
+
+    # Join the candidates with the old node on each successive level of their signatures. From level 1 onwards, a
+    # unique match wins.
+    filtered_node_set = node_set
+    for level in range(SIGNATURE_LEVELS):
+        matches = {}
+        for node in filtered_node_set:
+            matches.setdefault(node_signature(node, new_node_info, level), set()).add(node)
+        filtered_node_set = matches.get(node_signature(old_node, old_node_info, level), set())
+        logging.debug('After filter{}: {} -> {}'.format(level, old_node, filtered_node_set))
+        if level > 0 and len(filtered_node_set) == 1:
+            return filtered_node_set.pop()
+        if len(filtered_node_set) == 0: return node_not_found(old_node)
 
     if tuple(filtered_node_set) in ambiguous:
         ambiguous[tuple(filtered_node_set)].add(old_node)
@@ -266,15 +219,14 @@ def select_node(old_node, old_node_info, new_node_info, node_set):
 
     return node_not_found(old_node)
 
+new_node_index = {}
 def find_node(old_node, old_node_info, locations, new_node_info):
     location_strings = ['{}:{}'.format(location[0], location[1])
                         for location in locations]
-    cmd = old_node_info['nodes'][old_node]['cmd']
+    typ = cmd_type(old_node_info['nodes'].cmd(old_node))
     node_set = set()
-    for target, info in new_node_info['nodes'].items():
-        for location_string in location_strings:
-            if match_node(cmd, location_string, info):
-                node_set.add(target)
+    for location_string in location_strings:
+        node_set.update(new_node_index.get((location_string, typ), []))
     if len(node_set) == 1:
         return node_set.pop()
     elif len(node_set) == 0:
@@ -352,17 +304,19 @@ def trans_cons(cons, old_node_info, new_node_info, line_matching, second=False):
 
 old_cons_all = read_cons(old_cons_file)
 
-old_node_info = read_json(old_node_file)
-new_node_info = read_json(new_node_file)
+old_node_info = read_node_info(old_node_file)
+new_node_info = read_node_info(new_node_file)
+new_node_index.update(index_nodes(new_node_info))
 line_matching = read_json(line_matching_file)
+index_locations(line_matching)
 
 old_alarm_set = read_alarm_set(old_alarm_file)
 new_alarm_set = read_alarm_set(new_alarm_file)
 
 # handle unchanged files and functions
 unchanged_functions = set()
-for node, info in old_node_info['nodes'].items():
-    filename = info['loc'].split(':')[0]
+for node in old_node_info['nodes']:
+    filename = old_node_info['nodes'].loc(node).split(':')[0]
     if node.endswith('ENTRY') \
             and filename in line_matching['unchanged_files'] \
             and filename not in line_matching['changed_files'] \
@@ -373,25 +327,19 @@ if 'unchanged_functions' in line_matching:
         unchanged_functions.add(functionname)
 else: logging.warn('Cannot find field unchanged_functions in line_matching')
 
-if 'location_map' in line_matching:
-    for old, new in line_matching['location_map'].items():
-        old_location = (old.split(':')[0], int(old.split(':')[1]))
-        new_location = {(new.split(':')[0], int(new.split(':')[1]))}
-        location_cache[old_location] = new_location
-
 logging.info('{} unchanged functions {}'.format(len(unchanged_functions), \
                                                 str(unchanged_functions)))
 
 old_unchanged_nodes = {f: [] for f in unchanged_functions}
 new_unchanged_nodes = {f: [] for f in unchanged_functions}
-for node, info in old_node_info['nodes'].items():
+for node in old_node_info['nodes']:
     functionname = node.split('-')[0]
     nodeid = node.split('-')[1]
     if functionname in unchanged_functions \
             and nodeid != 'ENTRY' and nodeid != 'EXIT':
         old_unchanged_nodes[functionname].append(node)
 
-for node, info in new_node_info['nodes'].items():
+for node in new_node_info['nodes']:
     functionname = node.split('-')[0]
     nodeid = node.split('-')[1]
     if functionname in unchanged_functions \
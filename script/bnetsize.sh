@@ -26,13 +26,17 @@ new_programs=(
   "tar-1.28/sparrow-out/interval"
 )
 
+# The sizes are those of the constraints from which build_bnet.py builds the network, after compression and before
+# narrowing, as reported by the last summary in build_bnet.log: "N clauses, M tuples, ...".
+
 echo "Old BNet"
 total_tuples=0
 total_clauses=0
 printf "%-25s: %8s | %8s\n" "Program" "#Tuples" "#Clauses"
 for p in "${old_programs[@]}"; do
-  opt_clauses=$(grep "clauses" benchmark/$p/bnet/cons_all2bnet.log | head -n 1 | cut -f 5 -d ' ')
-  opt_tuples=$(grep "tuples" benchmark/$p/bnet/cons_all2bnet.log | head -n 1 | cut -f 5 -d ' ')
+  summary=$(grep "logSummary" benchmark/$p/bnet/build_bnet.log | tail -n 1)
+  opt_clauses=$(echo "$summary" | cut -f 4 -d ' ')
+  opt_tuples=$(echo "$summary" | cut -f 6 -d ' ')
   total_tuples=$(($total_tuples + $opt_tuples))
   total_clauses=$(($total_clauses + $opt_clauses))
   printf "%-25s: %8s | %8s \n" ${p%%/*} $opt_tuples $opt_clauses
@@ -44,8 +48,9 @@ total_tuples=0
 total_clauses=0
 printf "%-25s: %8s | %8s\n" "Program" "#Tuples" "#Clauses"
 for p in "${new_programs[@]}"; do
-  opt_clauses=$(grep "clauses" benchmark/$p/bnet/cons_all2bnet.log | head -n 1 | cut -f 5 -d ' ')
-  opt_tuples=$(grep "tuples" benchmark/$p/bnet/cons_all2bnet.log | head -n 1 | cut -f 5 -d ' ')
+  summary=$(grep "logSummary" benchmark/$p/bnet/build_bnet.log | tail -n 1)
+  opt_clauses=$(echo "$summary" | cut -f 4 -d ' ')
+  opt_tuples=$(echo "$summary" | cut -f 6 -d ' ')
   total_tuples=$(($total_tuples + $opt_tuples))
   total_clauses=$(($total_clauses + $opt_clauses))
   printf "%-25s: %8s | %8s \n" ${p%%/*} $opt_tuples $opt_clauses
@@ -58,8 +63,9 @@ total_clauses=0
 total_time=0
 printf "%-25s: %8s | %8s | %8s\n" "Program" "#Tuples" "#Clauses" "Time(s)"
 for p in "${new_programs[@]}"; do
-  opt_clauses=$(grep "clauses" benchmark/$p/merged_bnet_0.001/cons_all2bnet.log | head -n 1 | cut -f 5 -d ' ')
-  opt_tuples=$(grep "tuples" benchmark/$p/merged_bnet_0.001/cons_all2bnet.log | head -n 1 | cut -f 5 -d ' ')
+  summary=$(grep "logSummary" benchmark/$p/merged_bnet_0.001/build_bnet.log | tail -n 1)
+  opt_clauses=$(echo "$summary" | cut -f 4 -d ' ')
+  opt_tuples=$(echo "$summary" | cut -f 6 -d ' ')
   interactions=$(tail -n +2 benchmark/$p/bingo_delta_sem-eps_strong_0.001_stats.txt | wc -l | cut -f 1 -d ' ')
   time=$(tail -n +2 benchmark/$p/bingo_delta_sem-eps_strong_0.001_stats.txt | cut -f 9 | paste -sd+ | bc)
   avg=$(($time / $interactions))